@@ -0,0 +1,51 @@
+"""
+Database router sending reads of chosen views to read replicas
+
+Replicas are listed in DATABASE_REPLICAS (configured from DATABASE_REPLICA_HOSTS).
+Reads go to a replica only while "replica_reads" is active - it's entered
+by cats.middleware.ReplicaReadsMiddleware for views in REPLICA_READ_VIEWS.
+Everything else, and all writes, use the primary ("default") database.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = "default"
+# Sessions and users are read right after being written (e.g. on registration
+# and login), replicas may lag behind
+PRIMARY_ONLY_APPS = {"auth", "sessions"}
+
+_read_database = contextvars.ContextVar("read_database", default=None)
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """Sends reads to a replica ("alias" or a random one) inside the block"""
+
+    if alias is None and settings.DATABASE_REPLICAS:
+        alias = random.choice(settings.DATABASE_REPLICAS)
+    token = _read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
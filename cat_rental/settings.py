@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "crispy_forms",
     "widget_tweaks",
     "cats",
@@ -51,10 +52,12 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "cats.middleware.QueryTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "cats.middleware.ReplicaReadsMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -93,6 +96,58 @@ DATABASES = {
     }
 }
 
+# Read replicas of the "default" database, comma separated hosts
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, (os.environ.get("DATABASE_REPLICA_HOSTS") or "").split(",")), start=1
+):
+    alias = f"replica_{number}"
+    DATABASES[alias] = {**DATABASES["default"], "HOST": host.strip()}
+    # Tests use the primary test database instead
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["cat_rental.routers.ReplicaRouter"]
+# Read-only views served from replicas (if any)
+REPLICA_READ_VIEWS = [
+    "cats:species",
+    "cats:explore_list",
+    "cats:async_explore_list",
+    "cats:flexible_list",
+    "cats:cats_list",
+    "cats:async_cats_list",
+    "cats:details",
+    "cats:async_details",
+    "cats:calendar",
+    "cats:calendar_month",
+    "cats:species_availability_api",
+    "cats:rentals_history",
+]
+# Seconds a user's reads stay on the primary after their booking (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS") or 10)
+
+# Threads (each with its own database connection) running async views' work under ASGI
+ASYNC_VIEW_THREADS = int(os.environ.get("ASYNC_VIEW_THREADS") or 16)
+
+# Cache
+# "locmem" keeps cache per process, use "file" (or a shared backend) with many workers
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[os.environ.get("CACHE_BACKEND") or "locmem"],
+        "LOCATION": os.environ.get("CACHE_LOCATION") or str(BASE_DIR / "cache"),
+    }
+}
+# Seconds after which cached species and cats are rebuilt
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT") or 300)
+# Seconds availability search results stay cached
+AVAILABILITY_CACHE_TIMEOUT = int(os.environ.get("AVAILABILITY_CACHE_TIMEOUT") or 300)
+# Search windows of this many days or more aren't cached
+AVAILABILITY_CACHE_MAX_DAYS = int(os.environ.get("AVAILABILITY_CACHE_MAX_DAYS") or 62)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -137,12 +192,57 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Seconds after which the in-process availability index is fully reloaded
+AVAILABILITY_INDEX_TTL = int(os.environ.get("AVAILABILITY_INDEX_TTL", 60))
+# Busy cats passed into a query as ids at most, more are filtered out by a subquery
+AVAILABILITY_MAX_EXCLUDED_IDS = int(os.environ.get("AVAILABILITY_MAX_EXCLUDED_IDS", 1000))
+
+# Number of rows on a single page of cats and rentals lists
+CATS_PAGE_SIZE = int(os.environ.get("CATS_PAGE_SIZE", 50))
+
+# Rows fetched at once from the server-side cursor of availability API
+AVAILABILITY_API_CHUNK_SIZE = 2000
+
+# Admin lists of bigger tables show PostgreSQL's row estimate instead of COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = 10000
+# Rentals updated in a single transaction by admin bulk actions
+ADMIN_BULK_UPDATE_CHUNK_SIZE = 1000
+
+# Most occupied cats listed by the utilization report grouped by cat
+UTILIZATION_REPORT_CATS = 100
+
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
+# Use "django.core.mail.backends.console.EmailBackend" or
+# "django.core.mail.backends.filebased.EmailBackend" to test e-mails locally
+EMAIL_BACKEND = (
+    os.environ.get("EMAIL_BACKEND") or "django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH") or BASE_DIR / "sent_emails"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 465
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = False
 EMAIL_USE_SSL = True
+
+# Longest delay (in seconds) between attempts to send a queued e-mail
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
+
+# Per-request SQL and timing instrumentation (cats.middleware.QueryTimingMiddleware)
+QUERY_TIMING_ENABLED = str(os.environ.get("QUERY_TIMING_ENABLED")) == "1"
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get("SLOW_REQUEST_THRESHOLD_MS") or 500)
+# The same SQL run that many times in one request is reported as repeated (N+1)
+REPEATED_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "cats": {"handlers": ["console"], "level": "INFO"},
+    },
+}
@@ -1,19 +1,107 @@
 """
 Admin for CRUD on objects creating in app
 """
-from django.contrib import admin
+from urllib.parse import urlencode
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .models import ArchivedRental, Cat, Species, Breed, Rental, OutboxEmail
+from .pagination import EstimatedCountPaginator
+from .services import NOT_AVAILABLE, update_rentals_status
+
+# Rentals listed on "update status" confirmation page
+STATUS_UPDATE_PREVIEW = 100
+
+
+def rentals_links(lookup, pk):
+    """
+    Links to live and archived rentals (see "archive_rentals" command) of
+    an object, e.g. of a cat with lookup "cat"
+    """
+
+    if pk is None:
+        return "-"
+    query = urlencode({f"{lookup}__id__exact": pk})
+    return format_html(
+        '<a href="{}?{}">Rentals</a>, <a href="{}?{}">archived rentals</a>',
+        reverse("admin:cats_rental_changelist"),
+        query,
+        reverse("admin:cats_archivedrental_changelist"),
+        query,
+    )
 
-from .models import Cat, Species, Breed, Rental
+
+class CatChangeList(ChangeList):
+    """
+    Cats sorted by a column of their rental summary are joined with it by
+    INNER JOIN, which PostgreSQL can walk in the summary index order. Every
+    cat has a summary, so no cat is left out.
+    """
+
+    # Columns of "CatAdmin.list_display" sorted by a rental summary field
+    summary_columns = {"total_rentals", "next_booked_date"}
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        sorted_by = {self.list_display[index] for index in self.get_ordering_field_columns()}
+        if sorted_by & self.summary_columns:
+            queryset = queryset.filter(rental_summary__isnull=False)
+        return queryset
 
 
 @admin.register(Cat)
 class CatAdmin(admin.ModelAdmin):
     """Register admin for Cats"""
 
-    list_display = ["id", "name", "breed"]
-    search_fields = ["id", "breed"]
+    list_display = ["id", "name", "breed", "total_rentals", "next_booked_date"]
+    # Only shows the search box, see "get_search_results"
+    search_fields = ["=id", "name"]
+    list_select_related = ["breed", "rental_summary"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    readonly_fields = ["rentals"]
+
+    def get_changelist(self, request, **kwargs):
+        return CatChangeList
+
+    @admin.display(description="Rentals")
+    def rentals(self, cat):
+        return rentals_links("cat", cat.pk)
+
+    # Sorted through indexes of the cat's rental summary, see "CatChangeList"
+    @admin.display(description="Rentals", ordering="rental_summary__total_rentals")
+    def total_rentals(self, cat):
+        return cat.rental_summary.total_rentals
+
+    @admin.display(description="Next booked", ordering="rental_summary__next_booked_date")
+    def next_booked_date(self, cat):
+        return cat.rental_summary.next_booked_date
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches cats by id, or by name, breed, species and description
+        through the cat search indexes (see "CatQuerySet.search")
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matching = queryset.search(search_term)
+        if search_term.isdigit():
+            matching |= queryset.filter(pk=search_term)
+        return matching, False
 
 
 @admin.register(Species)
@@ -33,27 +121,166 @@ class BreedAdmin(admin.ModelAdmin):
     list_filter = ["species"]
 
 
+class RentalNotAvailable(Exception):
+    """Rental saved in admin was rejected by "exclude_overlapping_rentals" constraint"""
+
+
+class NotAvailableRentalForm(forms.ModelForm):
+    """Rental form shown again after the database has rejected the rental as overlapping"""
+
+    def clean(self):
+        super().clean()
+        raise ValidationError(NOT_AVAILABLE)
+
+
 @admin.register(Rental)
 class RentalAdmin(admin.ModelAdmin):
-    """Register admin for Rentals"""
+    """
+    Register admin for Rentals
+
+    "Rental.clean" checks the in-process availability index, which can lag
+    writes of other processes. A rental the exclusion constraint rejects
+    anyway is rolled back and its form is shown again with the error.
+    """
+
+    def get_form(self, request, obj=None, change=False, **kwargs):
+        if getattr(request, "rental_not_available", False):
+            kwargs["form"] = NotAvailableRentalForm
+        return super().get_form(request, obj, change, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        try:
+            super().save_model(request, obj, form, change)
+        except IntegrityError as error:
+            if "exclude_overlapping_rentals" not in str(error):
+                raise
+            raise RentalNotAvailable from error
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except RentalNotAvailable:
+            request.rental_not_available = True
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def changelist_view(self, request, extra_context=None):
+        # Archived rentals are searched and filtered the same way
+        query = request.GET.copy()
+        query.pop(PAGE_VAR, None)
+        archived_url = reverse("admin:cats_archivedrental_changelist")
+        return super().changelist_view(
+            request,
+            {
+                "archived_rentals_url": f"{archived_url}?{query.urlencode()}",
+                **(extra_context or {}),
+            },
+        )
 
     @admin.action(description="Update status")
     def update_status(self, request, queryset):
         if "submit" in request.POST:
-            queryset.update(status=request.POST["options"][1])
+            try:
+                status = int(request.POST["status"])
+            except (KeyError, ValueError):
+                status = None
+            if status not in dict(Rental.STATUS):
+                self.message_user(request, "Pick a valid status", messages.ERROR)
+                return HttpResponseRedirect(request.get_full_path())
 
-            self.message_user(request, f"Changed status for {queryset.count()} rentals")
+            updated = 0
+
+            def progress(count):
+                nonlocal updated
+                updated = count
+
+            try:
+                update_rentals_status(
+                    queryset,
+                    status,
+                    chunk_size=settings.ADMIN_BULK_UPDATE_CHUNK_SIZE,
+                    progress=progress,
+                )
+            except IntegrityError:
+                self.message_user(
+                    request,
+                    f"Stopped after {updated} rentals - the rest would overlap other rentals",
+                    messages.ERROR,
+                )
+            else:
+                self.message_user(request, f"Changed status for {updated} rentals")
             return HttpResponseRedirect(request.get_full_path())
 
+        # Only a preview of selected rentals - there may be millions of them
+        preview = list(queryset.select_related("cat")[: STATUS_UPDATE_PREVIEW + 1])
         return render(
             request,
             "admin/action_update_status.html",
-            context={"rentals": queryset, "status_options": Rental.STATUS},
+            context={
+                "rentals": preview[:STATUS_UPDATE_PREVIEW],
+                "more_rentals": len(preview) > STATUS_UPDATE_PREVIEW,
+                "select_across": request.POST.get("select_across") == "1",
+                "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                "status_options": Rental.STATUS,
+            },
         )
 
     list_display = ["id", "user", "cat", "rental_date", "return_date", "status"]
     list_filter = ["status", "rental_date", "return_date"]
     search_fields = ["id", "cat__name", "user__username"]
+    list_select_related = ["user", "cat"]
+    raw_id_fields = ["cat", "user"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = [
         update_status,
     ]
+
+
+@admin.register(ArchivedRental)
+class ArchivedRentalAdmin(admin.ModelAdmin):
+    """
+    Register read-only admin for archived Rentals, see "archive_rentals" command.
+
+    Linked from rentals list (with its search and filters), cats and users.
+    """
+
+    list_display = ["id", "user", "cat", "rental_date", "return_date", "status", "archived_at"]
+    list_filter = ["status", "rental_date", "return_date"]
+    search_fields = ["id", "cat__name", "user__username"]
+    list_select_related = ["user", "cat"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class RenterAdmin(UserAdmin):
+    """Register admin for Users, with links to their rentals"""
+
+    fieldsets = UserAdmin.fieldsets + (("Rentals", {"fields": ["rentals"]}),)
+    readonly_fields = [*UserAdmin.readonly_fields, "rentals"]
+
+    @admin.display(description="Rentals")
+    def rentals(self, user):
+        return rentals_links("user", user.pk)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Register admin for queued e-mails"""
+
+    list_display = ["id", "recipient", "subject", "status", "attempts", "next_attempt_at"]
+    list_filter = ["status"]
+    search_fields = ["recipient"]
+    raw_id_fields = ["rental"]
@@ -9,3 +9,6 @@ class CatsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "cats"
+
+    def ready(self):
+        from cats import signals  # noqa: F401
@@ -0,0 +1,76 @@
+"""
+Async variants of search, detail and booking views, served under ASGI
+
+Django 3.2 has no async ORM, and under ASGI it runs every synchronous view
+(and ORM call wrapped with "sync_to_async") in one shared thread, so a
+worker process serves those requests one by one. These views run the
+synchronous ones in a pool of ASYNC_VIEW_THREADS threads instead. Each
+thread keeps its own database connection, opened and closed as in a
+synchronous request. The event loop is free while a request waits for
+the database, so one worker serves many requests at the same time.
+
+E-mails are not sent by views: booking only queues them in the outbox
+(see cats.outbox), in the same transaction.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from cats.middleware import current_query_stats, track_queries
+from cats.views import CatDetailView, CatFormView, ExploreFormView, RentalFormView
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS, thread_name_prefix="cats-async-view"
+        )
+    return _executor
+
+
+def run_in_thread(func, *args, **kwargs):
+    """
+    Awaits "func" run in the views thread pool, with the caller's context
+    variables (e.g. database replica routing, query timing) and its own
+    database connection.
+    """
+
+    def call():
+        if current_query_stats.get() is not None:
+            track_queries()
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(get_executor(), functools.partial(context.run, call))
+
+
+def async_view(view):
+    """Async view running a synchronous "view" in the views thread pool"""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await run_in_thread(view, request, *args, **kwargs)
+        # Template responses would be rendered by the handler, outside of the pool
+        if hasattr(response, "render") and not response.is_rendered:
+            await run_in_thread(response.render)
+        return response
+
+    return wrapper
+
+
+explore_view = async_view(ExploreFormView.as_view())
+cats_list_view = async_view(CatFormView.as_view())
+cat_details_view = async_view(CatDetailView.as_view())
+rental_form_view = async_view(RentalFormView.as_view())
@@ -0,0 +1,371 @@
+"""
+In-process availability engine for Cats
+
+Keeps, for every cat, its blocking rentals as intervals sorted by start date,
+so questions like "which cats are free between given dates" are answered
+with a binary search per cat instead of scanning the whole rentals table.
+
+Only rentals that still matter (returning today or later) are loaded from the
+database. Entries are invalidated per cat on Rental writes (see cats.signals)
+and the whole index is reloaded after AVAILABILITY_INDEX_TTL seconds, which
+bounds staleness between processes.
+
+Busy cats of recently asked windows are kept as well, so a repeated search
+doesn't go through every cat again - reloaded cats only update their entries.
+"""
+import bisect
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+
+class CatIntervals:
+    """
+    Sorted, closed [start, end] intervals of a single cat.
+
+    ``max_ends[i]`` holds the furthest end date among the first ``i + 1``
+    intervals, so overlap checks stay correct even if historical data
+    contains overlapping rentals. Missing dates mean an unbounded rental,
+    like in the exclusion constraint.
+    """
+
+    __slots__ = ("starts", "ends", "rental_ids", "max_ends")
+
+    def __init__(self, intervals=()):
+        intervals = sorted(
+            (start or datetime.date.min, end or datetime.date.max, rental_id)
+            for start, end, rental_id in intervals
+        )
+        self.starts = [start for start, _end, _rental_id in intervals]
+        self.ends = [end for _start, end, _rental_id in intervals]
+        self.rental_ids = [rental_id for _start, _end, rental_id in intervals]
+        self.max_ends = []
+        furthest = None
+        for end in self.ends:
+            furthest = end if furthest is None or end > furthest else furthest
+            self.max_ends.append(furthest)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping(self, date_from, date_to):
+        """Returns ids of rentals overlapping [date_from, date_to]"""
+
+        # Only intervals starting on or before "date_to" can overlap
+        index = bisect.bisect_right(self.starts, date_to) - 1
+        found = []
+        while index >= 0 and self.max_ends[index] >= date_from:
+            if self.ends[index] >= date_from:
+                found.append(self.rental_ids[index])
+            index -= 1
+        return found
+
+    def overlaps(self, date_from, date_to, exclude_rental=None):
+        """Checks if any rental (other than "exclude_rental") overlaps [date_from, date_to]"""
+
+        index = bisect.bisect_right(self.starts, date_to) - 1
+        if index < 0 or self.max_ends[index] < date_from:
+            return False
+        if exclude_rental is None:
+            return True
+        return any(
+            rental_id != exclude_rental
+            for rental_id in self.overlapping(date_from, date_to)
+        )
+
+
+def find_overlaps(rows):
+    """
+    Sweep-line over rentals sorted by (cat_id, rental_date).
+
+    "rows" are (cat_id, rental_date, return_date, rental_id) tuples, yields
+    (cat_id, rental_id, overlapped_rental_id) for every rental starting before
+    an earlier rental of the same cat has ended. Missing dates mean an
+    unbounded rental, like in the exclusion constraint (rentals without a start
+    date go first). Keeps only one interval in memory, so any number of rows
+    can be streamed through it.
+    """
+
+    current_cat = None
+    furthest_end = furthest_rental = None
+    for cat_id, rental_date, return_date, rental_id in rows:
+        if cat_id != current_cat:
+            current_cat = cat_id
+            furthest_end = furthest_rental = None
+        rental_date = rental_date or datetime.date.min
+        return_date = return_date or datetime.date.max
+        if furthest_end is not None and rental_date <= furthest_end:
+            yield cat_id, rental_id, furthest_rental
+        if furthest_end is None or return_date > furthest_end:
+            furthest_end, furthest_rental = return_date, rental_id
+
+
+def find_gaps(rows, date_from, date_to, duration):
+    """
+    Sweep-line over rentals sorted by (cat_id, rental_date), finding free periods.
+
+    "rows" are (cat_id, rental_date, return_date) tuples, yields
+    (cat_id, gaps) for every cat in them, where "gaps" is a list of free,
+    closed (start, end) periods within [date_from, date_to] at least
+    "duration" days long, earliest first. Missing dates mean an unbounded
+    rental, like in the exclusion constraint.
+    """
+
+    min_length = datetime.timedelta(days=duration - 1)
+    current_cat = None
+    gaps = []
+    # First day not covered by rentals seen so far, None if busy until "date_to"
+    free_from = date_from
+
+    def add_gap(end):
+        if free_from is not None and end - free_from >= min_length:
+            gaps.append((free_from, end))
+
+    for cat_id, rental_date, return_date in rows:
+        if cat_id != current_cat:
+            if current_cat is not None:
+                add_gap(date_to)
+                yield current_cat, gaps
+            current_cat, gaps, free_from = cat_id, [], date_from
+        if free_from is None:
+            continue
+        if rental_date is not None and rental_date > free_from:
+            add_gap(min(rental_date - datetime.timedelta(days=1), date_to))
+        if return_date is None or return_date >= date_to:
+            free_from = None
+        elif return_date >= free_from:
+            free_from = return_date + datetime.timedelta(days=1)
+    if current_cat is not None:
+        add_gap(date_to)
+        yield current_cat, gaps
+
+
+def free_gaps(date_from, date_to, duration):
+    """
+    Returns {cat_id: gaps} (see "find_gaps") for cats with blocking rentals in
+    [date_from, date_to], read in a single query. Cats missing in the result
+    are free in the whole period.
+    """
+    from cats.models import Rental
+
+    rows = (
+        Rental.objects.blocking()
+        .overlapping(date_from, date_to)
+        # Rentals without a start date begin before any other
+        .order_by("cat_id", F("rental_date").asc(nulls_first=True))
+        .values_list("cat_id", "rental_date", "return_date")
+        .iterator()
+    )
+    return dict(find_gaps(rows, date_from, date_to, duration))
+
+
+def double_bookings(since=None, chunk_size=10000):
+    """
+    Yields (cat_id, rental_id, overlapped_rental_id) of blocking rentals
+    overlapping an earlier blocking rental of the same cat (see "find_overlaps").
+
+    Rentals are streamed through a server-side cursor in (cat_id, rental_date)
+    order, so memory use doesn't depend on their number. With "since" date,
+    only overlaps on that day or later are found - both rentals of such an
+    overlap return on that day or later.
+    """
+    from cats.models import Rental
+
+    rentals = Rental.objects.blocking()
+    if since is not None:
+        # Keeps rentals without a return date
+        rentals = rentals.exclude(return_date__lt=since)
+    rows = (
+        rentals.order_by("cat_id", F("rental_date").asc(nulls_first=True), "id")
+        .values_list("cat_id", "rental_date", "return_date", "id")
+        .iterator(chunk_size=chunk_size)
+    )
+    return find_overlaps(rows)
+
+
+def rented_cat_ids(date_from, date_to, species_id=None):
+    """
+    Ids of cats (of a species, if given) with a blocking rental overlapping
+    [date_from, date_to], taken from the availability index. Busy cats of a
+    species are picked out in the database.
+    """
+    from cats.models import Cat
+
+    rented = availability_index.busy_cat_ids(date_from, date_to)
+    if species_id is None or not rented:
+        return rented
+    return frozenset(
+        Cat.objects.using(DEFAULT_DB_ALIAS)
+        .filter(breed__species_id=species_id, pk__in=rented)
+        .values_list("pk", flat=True)
+    )
+
+
+def cached_rented_cat_ids(date_from, date_to, species_id=None):
+    """
+    "rented_cat_ids" through the availability cache (see cats.cache).
+
+    Values are shared between processes but built from the index of one of
+    them, so they are kept no longer than AVAILABILITY_INDEX_TTL, which bounds
+    the index's own staleness.
+    """
+    from cats import cache
+
+    return cache.cached_availability(
+        species_id,
+        date_from,
+        date_to,
+        lambda: rented_cat_ids(date_from, date_to, species_id),
+        timeout=min(settings.AVAILABILITY_CACHE_TIMEOUT, availability_index.ttl),
+    )
+
+
+def invalidate_rented_cat_ids(periods):
+    """
+    Drops cached "rented_cat_ids" of windows overlapping any (cat_id,
+    date_from, date_to) period of a changed blocking rental, for the cat's
+    species and all species
+    """
+    from cats import cache
+    from cats.models import Cat
+
+    periods = list(periods)
+    if not periods:
+        return
+    species = dict(
+        Cat.objects.using(DEFAULT_DB_ALIAS)
+        .filter(pk__in={cat_id for cat_id, _date_from, _date_to in periods})
+        .values_list("pk", "breed__species_id")
+    )
+    cache.invalidate_availability(
+        (species.get(cat_id), date_from, date_to) for cat_id, date_from, date_to in periods
+    )
+
+
+class AvailabilityIndex:
+    """Per-cat interval index of blocking rentals, loaded lazily from the database"""
+
+    # Windows whose busy cats are kept, least recently asked are dropped first
+    max_windows = 256
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._cats = {}
+        self._stale_cats = set()
+        self._windows = OrderedDict()
+        self._loaded_at = None
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "AVAILABILITY_INDEX_TTL", 60)
+
+    @staticmethod
+    def _blocking_rentals(**filters):
+        from cats.models import Rental
+
+        # Always from the primary: entries outlive the request, and a lagging
+        # replica would keep a just booked cat free until the index expires
+        return (
+            Rental.objects.using(DEFAULT_DB_ALIAS)
+            .blocking()
+            .overlapping(datetime.date.today())
+            .filter(**filters)
+            .values_list("cat_id", "rental_date", "return_date", "id")
+        )
+
+    def _build(self, rows):
+        grouped = {}
+        for cat_id, rental_date, return_date, rental_id in rows:
+            grouped.setdefault(cat_id, []).append((rental_date, return_date, rental_id))
+        return {cat_id: CatIntervals(intervals) for cat_id, intervals in grouped.items()}
+
+    def _ensure_loaded(self):
+        with self._lock:
+            expired = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.ttl
+            )
+            if expired:
+                self._cats = self._build(self._blocking_rentals())
+                self._stale_cats = set()
+                self._windows.clear()
+                self._loaded_at = time.monotonic()
+            elif self._stale_cats:
+                stale = self._stale_cats
+                self._stale_cats = set()
+                fresh = self._build(self._blocking_rentals(cat_id__in=stale))
+                for cat_id in stale:
+                    self._set_cat(cat_id, fresh.get(cat_id))
+
+    def _set_cat(self, cat_id, intervals):
+        if intervals:
+            self._cats[cat_id] = intervals
+        else:
+            self._cats.pop(cat_id, None)
+        for (date_from, date_to), busy in self._windows.items():
+            is_busy = bool(intervals) and intervals.overlaps(date_from, date_to)
+            if is_busy != (cat_id in busy):
+                self._windows[date_from, date_to] = busy ^ {cat_id}
+
+    def refresh_cat(self, cat_id):
+        """Reloads intervals of a single cat straight from the database"""
+
+        with self._lock:
+            self._ensure_loaded()
+            fresh = self._build(self._blocking_rentals(cat_id=cat_id))
+            self._set_cat(cat_id, fresh.get(cat_id))
+            self._stale_cats.discard(cat_id)
+
+    def invalidate(self, cat_id=None):
+        """Marks a cat (or the whole index if no cat given) as outdated"""
+
+        with self._lock:
+            if cat_id is None:
+                self._loaded_at = None
+            else:
+                self._stale_cats.add(cat_id)
+
+    def busy_cat_ids(self, date_from, date_to):
+        """
+        Returns ids of cats with a blocking rental overlapping [date_from, date_to].
+
+        Goes through all cats only the first time a window is asked for.
+        """
+
+        window = (date_from, date_to)
+        with self._lock:
+            self._ensure_loaded()
+            busy = self._windows.get(window)
+            if busy is None:
+                busy = frozenset(
+                    cat_id
+                    for cat_id, intervals in self._cats.items()
+                    if intervals.overlaps(date_from, date_to)
+                )
+                self._windows[window] = busy
+                if len(self._windows) > self.max_windows:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(window)
+            return busy
+
+    def is_available(self, cat_id, date_from, date_to, exclude_rental=None):
+        """Checks if a cat is free in [date_from, date_to]"""
+
+        with self._lock:
+            self._ensure_loaded()
+            intervals = self._cats.get(cat_id)
+        if intervals is None:
+            return True
+        return not intervals.overlaps(date_from, date_to, exclude_rental=exclude_rental)
+
+
+availability_index = AvailabilityIndex()
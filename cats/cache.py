@@ -0,0 +1,218 @@
+"""
+Caching of catalogue data (species, breeds and cats)
+
+Keys include a catalogue version, bumped when a Species or Breed changes,
+so every key depending on them is invalidated at once. Cat keys are also
+deleted one by one when that cat or its rentals change (see cats.signals).
+
+Values are stored with a soft expiry. After it passes, only one caller
+(holding a short lock in the cache) rebuilds the value while others keep
+getting the stale one. On a cold miss other callers wait a moment for the
+rebuilt value instead of all hitting the database at once.
+
+Availability search results are cached per species (or all species) and
+window of days. Their keys include a version of every day in the window,
+bumped when a rental covering that day changes, so a rental only
+invalidates the windows it overlaps. Hits and misses are counted.
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "cats:catalog:version"
+LOCK_TIMEOUT = 10
+MISS_WAIT = 1.0
+MISS_POLL_INTERVAL = 0.05
+
+
+def catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    """Invalidates all catalogue keys"""
+
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key expired or was never set - any new version is good
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+
+
+def catalog_key(name):
+    return f"cats:catalog:{catalog_version()}:{name}"
+
+
+def cat_key(cat_id):
+    return catalog_key(f"cat:{cat_id}")
+
+
+def species_list_key():
+    return catalog_key("species")
+
+
+def invalidate_cat(cat_id):
+    cache.delete(cat_key(cat_id))
+
+
+def cached(key, builder, timeout=None):
+    """
+    Returns value cached under "key", building it with "builder()" if needed.
+
+    Exceptions raised by "builder" (e.g. Http404) are never cached.
+    """
+
+    timeout = timeout or settings.CATALOG_CACHE_TIMEOUT
+    lock_key = f"{key}:lock"
+
+    envelope = cache.get(key)
+    if envelope is not None:
+        value, soft_expires_at = envelope
+        if time.time() < soft_expires_at or not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # Someone else is building it - wait for their value
+        deadline = time.monotonic() + MISS_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(MISS_POLL_INTERVAL)
+            envelope = cache.get(key)
+            if envelope is not None:
+                return envelope[0]
+        return builder()
+
+    try:
+        value = builder()
+        # Kept twice as long as its soft expiry, so stale values can be served while rebuilding
+        cache.set(key, (value, time.time() + timeout), timeout * 2)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+ALL_SPECIES = "all"
+AVAILABILITY_STATS = ("hits", "misses")
+
+
+def availability_version_key(scope, name):
+    return f"cats:availability:{scope}:{name}"
+
+
+def availability_stats_key(name):
+    return f"cats:availability:stats:{name}"
+
+
+def _window_days(date_from, date_to):
+    return [date_from + datetime.timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+
+
+def _is_cacheable(date_from, date_to):
+    return (
+        date_from is not None
+        and date_to is not None
+        and (date_to - date_from).days < settings.AVAILABILITY_CACHE_MAX_DAYS
+    )
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Never set or evicted - any new version is good
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            # A new version, not one a lost (evicted) counter could have had
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def _count(name):
+    key = availability_stats_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cached_availability(species_id, date_from, date_to, builder, timeout=None):
+    """
+    Returns availability of a species' cats (all cats if "species_id" is None)
+    in [date_from, date_to], building it with "builder()" if needed.
+
+    Windows of AVAILABILITY_CACHE_MAX_DAYS days or more aren't cached.
+    """
+
+    timeout = timeout or settings.AVAILABILITY_CACHE_TIMEOUT
+
+    if not _is_cacheable(date_from, date_to):
+        return builder()
+
+    scope = ALL_SPECIES if species_id is None else species_id
+    days = _window_days(date_from, date_to)
+    versions = _versions(
+        [availability_version_key(scope, "generation")]
+        + [availability_version_key(scope, day.isoformat()) for day in days]
+    )
+    digest = hashlib.md5(repr(versions).encode()).hexdigest()
+    key = catalog_key(f"availability:{scope}:{date_from}:{date_to}:{digest}")
+
+    value = cache.get(key)
+    if value is not None:
+        _count("hits")
+        return value
+    _count("misses")
+    value = builder()
+    cache.set(key, value, timeout)
+    return value
+
+
+def invalidate_availability(periods):
+    """
+    Invalidates cached availability overlapping any of (species_id, date_from,
+    date_to) periods of changed rentals, for the species and all species.
+    Missing dates mean unbounded.
+    """
+
+    generations = set()
+    days = {}
+    for species_id, date_from, date_to in periods:
+        # Species of a deleted cat is unknown, it isn't listed anyway
+        for scope in {species_id, ALL_SPECIES} - {None}:
+            if _is_cacheable(date_from, date_to):
+                days.setdefault(scope, set()).update(_window_days(date_from, date_to))
+            else:
+                # Covers more days than any cached window - drop all of them
+                generations.add(scope)
+
+    for scope in generations:
+        _bump(availability_version_key(scope, "generation"))
+    for scope, scope_days in days.items():
+        if scope not in generations:
+            for day in scope_days:
+                _bump(availability_version_key(scope, day.isoformat()))
+
+
+def invalidate_species_availability(species_id):
+    """Invalidates all cached availability of a species (e.g. a cat joined it)"""
+
+    _bump(availability_version_key(species_id, "generation"))
+
+
+def availability_stats(reset=False):
+    """Hits and misses of cached availability, as {"hits": ..., "misses": ...}"""
+
+    keys = [availability_stats_key(name) for name in AVAILABILITY_STATS]
+    counts = cache.get_many(keys)
+    if reset:
+        cache.delete_many(keys)
+    return {name: counts.get(key, 0) for name, key in zip(AVAILABILITY_STATS, keys)}
@@ -0,0 +1,68 @@
+"""
+Availability calendars: busy days of cats in a month
+
+Days covered by blocking rentals are kept per cat and year as bitmaps
+("CatAvailabilityYear", see migration 0008). A month of any number of cats
+is read in a fixed number of queries: their bitmaps, and blocking rentals
+missing one of the dates, which bitmaps can't hold.
+"""
+import calendar
+import datetime
+
+from django.db.models import Q
+
+from cats.models import CatAvailabilityYear, Rental
+
+
+def month_bounds(year, month):
+    """First and last day of a month"""
+
+    return (
+        datetime.date(year, month, 1),
+        datetime.date(year, month, calendar.monthrange(year, month)[1]),
+    )
+
+
+def busy_days(cats, year, month):
+    """
+    Busy days of cats (a Cat queryset) in a month, as {cat_id: [busy, ...]}
+    with a bool for every day of the month. Cats free all month are left out.
+    """
+
+    first, last = month_bounds(year, month)
+    offset = (first - datetime.date(year, 1, 1)).days
+    busy = {}
+    bitmaps = CatAvailabilityYear.objects.filter(cat__in=cats, year=year).values_list(
+        "cat_id", "busy_days"
+    )
+    for cat_id, bitmap in bitmaps:
+        days = bitmap[offset : offset + last.day]
+        if "1" in days:
+            busy[cat_id] = [day == "1" for day in days]
+
+    open_ended = (
+        Rental.objects.blocking()
+        .filter(cat__in=cats)
+        .filter(Q(rental_date__isnull=True) | Q(return_date__isnull=True))
+        .overlapping(first, last)
+        .values_list("cat_id", "rental_date", "return_date")
+    )
+    for cat_id, rental_date, return_date in open_ended:
+        days = busy.setdefault(cat_id, [False] * last.day)
+        start = max(rental_date or first, first)
+        end = min(return_date or last, last)
+        for day in range(start.day - 1, end.day):
+            days[day] = True
+    return busy
+
+
+def month_grid(year, month, busy):
+    """
+    Weeks (Monday first) of a month for a calendar, with (date, busy) for
+    every day of the month and None for days of the neighbouring ones
+    """
+
+    return [
+        [(day, busy[day.day - 1]) if day.month == month else None for day in week]
+        for week in calendar.Calendar().monthdatescalendar(year, month)
+    ]
@@ -0,0 +1,405 @@
+"""
+Streaming export and import of the catalogue and rentals history
+
+Every table has its own file in a directory ("species.csv", "breeds.csv",
+"cats.csv" and "rentals.csv", or the same names with ".ndjson"). Rows are
+read and written one at a time and saved in chunks, so file size is not
+limited by memory.
+
+Foreign keys are written as natural keys: species name, breed name with
+species name, and username. Cats have no natural key, so rentals refer
+to a cat by its id in the exported file. The importer maps those ids to
+the cats it creates.
+"""
+
+import csv
+import datetime
+import io
+import json
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection
+
+from cats.availability import find_overlaps
+from cats.models import Breed, Cat, Rental, Species
+
+FORMATS = ("csv", "ndjson")
+
+
+class CatalogImportError(Exception):
+    """Input file can't be imported (bad row, unknown reference or overlapping rentals)"""
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@dataclass(frozen=True)
+class Table:
+    """Exported model: file columns with lookups their values are read from"""
+
+    name: str
+    model: type
+    columns: tuple
+    lookups: tuple
+
+    def filename(self, fmt):
+        return f"{self.name}.{fmt}"
+
+    def queryset(self):
+        return self.model.objects.order_by("pk").values_list(*self.lookups)
+
+
+# In the order they have to be imported
+TABLES = (
+    Table("species", Species, ("name", "description"), ("name", "description")),
+    Table(
+        "breeds",
+        Breed,
+        ("name", "species", "description"),
+        ("name", "species__name", "description"),
+    ),
+    Table(
+        "cats",
+        Cat,
+        ("id", "name", "breed", "species", "description"),
+        ("id", "name", "breed__name", "breed__species__name", "description"),
+    ),
+    Table(
+        "rentals",
+        Rental,
+        ("cat", "user", "rental_date", "return_date", "status"),
+        ("cat_id", "user__username", "rental_date", "return_date", "status"),
+    ),
+)
+
+
+def export_table(table, stream, fmt, chunk_size=5000):
+    """Writes all rows of a table to a text stream, returns number of rows"""
+
+    rows = table.queryset().iterator(chunk_size=chunk_size)
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(table.columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(table.columns, row)), cls=DjangoJSONEncoder))
+            stream.write("\n")
+            count += 1
+    return count
+
+
+def copy_table(table, stream):
+    """
+    Same as CSV "export_table", but rows are formatted by PostgreSQL (COPY ... TO STDOUT).
+    """
+
+    csv.writer(stream).writerow(table.columns)
+    sql, params = table.queryset().query.sql_with_params()
+    with connection.cursor() as cursor:
+        query = cursor.mogrify(sql, params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", stream)
+        return cursor.rowcount
+
+
+def read_rows(stream, fmt):
+    """Yields (line number, row as a dict) from a CSV or NDJSON text stream"""
+
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as error:
+                    raise CatalogImportError(f"line {line_number}: {error}")
+
+
+def parse_date(value):
+    if value in (None, ""):
+        return None
+    return datetime.date.fromisoformat(value)
+
+
+class CatalogImporter:
+    """
+    Saves rows read by "read_rows" in chunks with "bulk_create".
+
+    Species and breeds are matched by natural key with existing ones, so a
+    partner's catalogue merges into ours. Cats are always created. Rentals
+    are checked in batches against each other and against blocking
+    rentals already in the database; the exclusion constraint stays the
+    final guard. With "use_copy" (PostgreSQL only) rentals are written
+    with COPY instead of INSERT.
+
+    Conflicting rentals raise CatalogImportError, or are skipped and
+    collected in "conflicts" when "skip_conflicts" is set.
+    """
+
+    def __init__(self, chunk_size=5000, use_copy=False, create_users=False, skip_conflicts=False):
+        self.chunk_size = chunk_size
+        self.use_copy = use_copy
+        self.create_users = create_users
+        self.skip_conflicts = skip_conflicts
+        self.species_ids = {}
+        self.breed_ids = {}
+        # Cat id in the imported file -> id of the created cat
+        self.cat_ids = {}
+        self.user_ids = {}
+        self.conflicts = []
+
+    def import_table(self, table, rows):
+        """Imports rows of a table, returns number of created objects"""
+
+        return getattr(self, f"import_{table.name}")(rows)
+
+    def import_species(self, rows):
+        created = 0
+        for chunk in chunked(rows, self.chunk_size):
+            self._resolve_species({row["name"] for _line, row in chunk})
+            new_species = {}
+            for _line, row in chunk:
+                if row["name"] not in self.species_ids:
+                    new_species.setdefault(
+                        row["name"],
+                        Species(name=row["name"], description=row.get("description") or ""),
+                    )
+            for species in Species.objects.bulk_create(new_species.values()):
+                self.species_ids[species.name] = species.pk
+            created += len(new_species)
+        return created
+
+    def import_breeds(self, rows):
+        created = 0
+        for chunk in chunked(rows, self.chunk_size):
+            self._resolve_species({row["species"] for _line, row in chunk})
+            self._resolve_breeds({(row["name"], row["species"]) for _line, row in chunk})
+            new_breeds = {}
+            for line, row in chunk:
+                key = (row["name"], row["species"])
+                if key not in self.breed_ids:
+                    new_breeds.setdefault(
+                        key,
+                        Breed(
+                            name=row["name"],
+                            species_id=self._species_id(line, row["species"]),
+                            description=row.get("description") or "",
+                        ),
+                    )
+            for key, breed in zip(new_breeds, Breed.objects.bulk_create(new_breeds.values())):
+                self.breed_ids[key] = breed.pk
+            created += len(new_breeds)
+        return created
+
+    def import_cats(self, rows):
+        created = 0
+        for chunk in chunked(rows, self.chunk_size):
+            self._resolve_breeds({(row["breed"], row["species"]) for _line, row in chunk})
+            references, cats = {}, []
+            for line, row in chunk:
+                reference = str(row["id"])
+                if reference in self.cat_ids or reference in references:
+                    raise CatalogImportError(f"cats line {line}: duplicated cat id {reference}")
+                references[reference] = line
+                cats.append(
+                    Cat(
+                        name=row["name"],
+                        breed_id=self._breed_id(line, row["breed"], row["species"]),
+                        description=row.get("description") or "",
+                    )
+                )
+            for reference, cat in zip(references, Cat.objects.bulk_create(cats)):
+                self.cat_ids[reference] = cat.pk
+            created += len(cats)
+        return created
+
+    def import_rentals(self, rows):
+        created = 0
+        statuses = dict(Rental.STATUS)
+        for chunk in chunked(rows, self.chunk_size):
+            self._resolve_users({row["user"] for _line, row in chunk})
+            rentals = []
+            for line, row in chunk:
+                try:
+                    status = int(row["status"])
+                    rental_date = parse_date(row["rental_date"])
+                    return_date = parse_date(row["return_date"])
+                except (TypeError, ValueError) as error:
+                    raise CatalogImportError(f"rentals line {line}: {error}")
+                if status not in statuses:
+                    raise CatalogImportError(f"rentals line {line}: unknown status {status}")
+                cat_id = self.cat_ids.get(str(row["cat"]))
+                if cat_id is None:
+                    raise CatalogImportError(f"rentals line {line}: unknown cat {row['cat']}")
+                rental = Rental(
+                    cat_id=cat_id,
+                    user_id=self.user_ids[row["user"]],
+                    rental_date=rental_date,
+                    return_date=return_date,
+                    status=status,
+                )
+                rentals.append((line, rental))
+
+            rentals = self._without_overlaps(rentals)
+            try:
+                if self.use_copy:
+                    self._copy_rentals(rentals)
+                else:
+                    Rental.objects.bulk_create(rentals)
+            except IntegrityError as error:
+                # Rentals booked by someone else while importing
+                raise CatalogImportError(f"rentals: {error}")
+            created += len(rentals)
+        return created
+
+    def _resolve_species(self, names):
+        missing = names - self.species_ids.keys()
+        if missing:
+            # The oldest one wins if names repeat
+            for name, pk in (
+                Species.objects.filter(name__in=missing).order_by("-pk").values_list("name", "pk")
+            ):
+                self.species_ids[name] = pk
+
+    def _resolve_breeds(self, keys):
+        missing = keys - self.breed_ids.keys()
+        if missing:
+            for name, species_name, pk in (
+                Breed.objects.filter(
+                    name__in={name for name, _species in missing},
+                    species__name__in={species for _name, species in missing},
+                )
+                .order_by("-pk")
+                .values_list("name", "species__name", "pk")
+            ):
+                if (name, species_name) in missing:
+                    self.breed_ids[name, species_name] = pk
+
+    def _resolve_users(self, usernames):
+        missing = usernames - self.user_ids.keys()
+        if not missing:
+            return
+        self.user_ids.update(
+            User.objects.filter(username__in=missing).values_list("username", "pk")
+        )
+        missing -= self.user_ids.keys()
+        if missing and not self.create_users:
+            raise CatalogImportError(f"rentals: unknown users {', '.join(sorted(missing))}")
+        # Imported users get an unusable password
+        for user in User.objects.bulk_create(
+            User(username=username, password="!") for username in sorted(missing)
+        ):
+            self.user_ids[user.username] = user.pk
+
+    def _species_id(self, line, name):
+        try:
+            return self.species_ids[name]
+        except KeyError:
+            raise CatalogImportError(f"line {line}: unknown species {name}")
+
+    def _breed_id(self, line, name, species_name):
+        try:
+            return self.breed_ids[name, species_name]
+        except KeyError:
+            raise CatalogImportError(f"line {line}: unknown breed {name} ({species_name})")
+
+    def _without_overlaps(self, rentals):
+        """
+        Returns rentals of a chunk, given as (line, Rental) pairs, that don't
+        overlap each other or blocking rentals in the database.
+
+        Both checks are a single sweep with "find_overlaps" over rows sorted
+        by (cat, rental_date). Rentals of the chunk get negative ids there,
+        rentals from the database keep their own ones.
+        """
+
+        lines = {}
+        new_rows = []
+        for number, (line, rental) in enumerate(rentals, start=1):
+            if rental.status in Rental.BLOCKING_STATUSES:
+                lines[-number] = line
+                # Missing dates mean unbounded period, like in the exclusion constraint
+                new_rows.append(
+                    (
+                        rental.cat_id,
+                        rental.rental_date or datetime.date.min,
+                        rental.return_date or datetime.date.max,
+                        -number,
+                    )
+                )
+        if not new_rows:
+            return [rental for _line, rental in rentals]
+
+        rejected = {}
+        for _cat_id, rental_id, overlapped_id in find_overlaps(sorted(new_rows)):
+            rejected[rental_id] = f"overlaps rental from line {lines[overlapped_id]}"
+
+        # Plain date comparisons (NULL-safe with "exclude") instead of "overlapping":
+        # the chunk spans a long period, so the cats are the selective part here
+        existing = (
+            Rental.objects.blocking()
+            .filter(cat_id__in={cat_id for cat_id, _start, _end, _id in new_rows})
+            .exclude(return_date__lt=min(start for _cat, start, _end, _id in new_rows))
+            .exclude(rental_date__gt=max(end for _cat, _start, end, _id in new_rows))
+            .values_list("cat_id", "rental_date", "return_date", "id")
+        )
+        rows = [row for row in new_rows if row[3] not in rejected]
+        rows.extend(
+            (
+                cat_id,
+                rental_date or datetime.date.min,
+                return_date or datetime.date.max,
+                rental_id,
+            )
+            for cat_id, rental_date, return_date, rental_id in existing
+        )
+        for _cat_id, rental_id, overlapped_id in find_overlaps(sorted(rows)):
+            if rental_id < 0 and overlapped_id > 0:
+                rejected[rental_id] = f"overlaps existing rental {overlapped_id}"
+            elif rental_id > 0 and overlapped_id < 0:
+                rejected[overlapped_id] = f"overlaps existing rental {rental_id}"
+
+        if not rejected:
+            return [rental for _line, rental in rentals]
+        conflicts = sorted((lines[rental_id], reason) for rental_id, reason in rejected.items())
+        if not self.skip_conflicts:
+            raise CatalogImportError(
+                "; ".join(f"rentals line {line}: {reason}" for line, reason in conflicts[:10])
+            )
+        self.conflicts.extend(conflicts)
+        rejected_lines = {line for line, _reason in conflicts}
+        return [rental for line, rental in rentals if line not in rejected_lines]
+
+    def _copy_rentals(self, rentals):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (rental.cat_id, rental.user_id, rental.rental_date, rental.return_date, rental.status)
+            for rental in rentals
+        )
+        buffer.seek(0)
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(
+            quote_name(Rental._meta.get_field(name).column)
+            for name in ("cat", "user", "rental_date", "return_date", "status")
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote_name(Rental._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
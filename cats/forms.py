@@ -12,19 +12,23 @@ from cats.models import Rental
 
 
 class RentalForm(forms.ModelForm):
-    """Form used to create a new Rental object"""
+    """
+    Form used to create a new Rental object.
+
+    Cat and user aren't taken from the form, they should be set on the instance passed to it.
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["rental_date"].initial = datetime.date.today()
         self.fields["return_date"].initial = datetime.date.today()
+        self.fields["rental_date"].required = True
+        self.fields["return_date"].required = True
 
     class Meta:
         model = Rental
-        fields = ["cat", "user", "rental_date", "return_date"]
+        fields = ["rental_date", "return_date"]
         widgets = {
-            "cat": forms.HiddenInput,
-            "user": forms.HiddenInput,
             "rental_date": forms.DateInput(
                 attrs={
                     "class": "datepicker",
@@ -46,6 +50,11 @@ class RentalForm(forms.ModelForm):
 class SearchForm(forms.Form):
     """Search form used in Cats lists"""
 
+    query = forms.CharField(
+        label="Name, breed or description",
+        max_length=100,
+        required=False,
+    )
     date_from = forms.DateField(
         widget=forms.DateInput(
             attrs={"class": "datepicker", "type": "date", "placeholder": "DD-MM-YYYY"}
@@ -65,14 +74,21 @@ class SearchForm(forms.Form):
         super().__init__(*args, **kwargs)
         self.helper = FormHelper()
         self.helper.layout = Layout(
-            Row(Column("date_from")), Row(Column("date_to")), Submit("search", "Search")
+            Row(Column("query")),
+            Row(Column("date_from")),
+            Row(Column("date_to")),
+            Submit("search", "Search"),
         )
 
     def clean(self):
         """Cleans the form"""
         cleaned_data = super(SearchForm, self).clean()
-        date_from = cleaned_data["date_from"]
-        date_to = cleaned_data["date_to"]
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+
+        """Missing or invalid dates are already reported by fields"""
+        if date_from is None or date_to is None:
+            return cleaned_data
 
         """Raise error if "date_from" is from the past"""
         if date_from < datetime.date.today():
@@ -83,3 +99,63 @@ class SearchForm(forms.Form):
             raise forms.ValidationError('"Date to" must be further than "date from"')
 
         return cleaned_data
+
+
+class AvailabilityFilterForm(SearchForm):
+    """Filters of the availability API"""
+
+    FORMATS = (("ndjson", "NDJSON"), ("json", "JSON"))
+
+    species = forms.IntegerField(required=False)
+    breed = forms.IntegerField(required=False)
+    format = forms.ChoiceField(choices=FORMATS, required=False)
+
+
+class FlexibleSearchForm(forms.Form):
+    """Search for cats free for a number of days, anytime within a horizon starting today"""
+
+    MODES = (("earliest", "Earliest free window"), ("all", "All free windows"))
+    MAX_HORIZON = 365
+
+    duration = forms.IntegerField(label="Days", min_value=1, initial=7)
+    horizon = forms.IntegerField(
+        label="Within next days", min_value=1, max_value=MAX_HORIZON, initial=60
+    )
+    mode = forms.ChoiceField(choices=MODES, initial="earliest")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        duration = cleaned_data.get("duration")
+        horizon = cleaned_data.get("horizon")
+        if duration is not None and horizon is not None and duration > horizon:
+            raise forms.ValidationError('"Days" can\'t be more than "within next days"')
+        return cleaned_data
+
+    def period(self):
+        """First and last day of the horizon"""
+
+        date_from = datetime.date.today()
+        return date_from, date_from + datetime.timedelta(days=self.cleaned_data["horizon"] - 1)
+
+
+class UtilizationReportForm(forms.Form):
+    """Period and grouping of the utilization report"""
+
+    GROUPS = (("species", "Species"), ("breed", "Breed"), ("cat", "Cat"))
+    MAX_DAYS = 366
+
+    date_from = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+    date_to = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+    group = forms.ChoiceField(choices=GROUPS, initial="species")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from is None or date_to is None:
+            return cleaned_data
+        if date_from > date_to:
+            raise forms.ValidationError('"Date to" must be further than "date from"')
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            raise forms.ValidationError(f"Pick at most {self.MAX_DAYS} days")
+        return cleaned_data
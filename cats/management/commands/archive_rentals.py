@@ -0,0 +1,41 @@
+"""
+Moves long past finished and cancelled rentals to archived rentals
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cats.services import archive_rentals
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives finished and cancelled rentals returned before given day, keeping the "
+        "rentals table to current and future ones. Archived rentals still show in users' "
+        "history and admin. Safe to run alongside live traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=datetime.date.fromisoformat,
+            required=True,
+            help="Archive rentals returned before this day (YYYY-MM-DD), today at the latest",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after that many batches (keeps a single run short)",
+        )
+
+    def handle(self, *args, **options):
+        if options["before"] > datetime.date.today():
+            raise CommandError("Cannot archive rentals returned in the future")
+
+        archived = archive_rentals(
+            options["before"],
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(f"Archived {archived} rentals")
@@ -0,0 +1,25 @@
+"""
+Shows hits and misses of the availability search cache
+"""
+
+from django.core.management.base import BaseCommand
+
+from cats.cache import availability_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows hits and misses of cached availability searches since the last reset, "
+        "e.g. to size the cache (CACHES) and AVAILABILITY_CACHE_TIMEOUT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Start counting anew")
+
+    def handle(self, *args, **options):
+        stats = availability_stats(reset=options["reset"])
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        self.stdout.write(
+            f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1%}"
+        )
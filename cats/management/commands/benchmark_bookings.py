@@ -0,0 +1,141 @@
+"""
+Fires concurrent bookings and reports how the booking path copes with contention
+"""
+import datetime
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+
+from cats.availability import find_overlaps
+from cats.models import Breed, Cat, Rental, Species
+from cats.services import book_cat
+
+BENCHMARK_NAME = "Booking benchmark"
+
+
+def naive_booking(cat_id, user, rental_date, return_date):
+    """Check-then-insert without any lock, as model validation alone would do"""
+
+    with transaction.atomic():
+        if Rental.objects.blocking().overlapping(rental_date, return_date).filter(
+            cat_id=cat_id
+        ).exists():
+            raise ValidationError("Cat is not available in given timeframes")
+        return Rental.objects.create(
+            cat_id=cat_id, user=user, rental_date=rental_date, return_date=return_date
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Books cats from many threads at once and reports throughput, conflicts and "
+        "double-bookings. Creates its own cats, removed afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bookings", type=int, default=400, help="Bookings in total")
+        parser.add_argument(
+            "--cats", type=int, default=4, help="Fewer cats means more contention"
+        )
+        parser.add_argument(
+            "--days", type=int, default=60, help="Bookings are spread over that many days"
+        )
+        parser.add_argument("--length", type=int, default=3, help="Days of a single booking")
+        parser.add_argument(
+            "--mode",
+            choices=["service", "naive"],
+            default="service",
+            help='"service" uses book_cat, "naive" checks and inserts without a lock',
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["bookings"] < 1:
+            raise CommandError("--bookings must be at least 1")
+        species = Species.objects.create(name=BENCHMARK_NAME)
+        breed = Breed.objects.create(name=BENCHMARK_NAME, species=species)
+        cats = Cat.objects.bulk_create(
+            Cat(name=f"Benchmark cat {number}", breed=breed)
+            for number in range(options["cats"])
+        )
+        user, _created = User.objects.get_or_create(username="booking_benchmark")
+        book = book_cat if options["mode"] == "service" else naive_booking
+
+        rng = random.Random(options["seed"])
+        first_day = datetime.date.today() + datetime.timedelta(days=1)
+        requests = []
+        for _ in range(options["bookings"]):
+            rental_date = first_day + datetime.timedelta(days=rng.randrange(options["days"]))
+            return_date = rental_date + datetime.timedelta(days=options["length"] - 1)
+            requests.append((rng.choice(cats).pk, rental_date, return_date))
+
+        results = {"booked": 0, "conflicts": 0, "errors": 0}
+        latencies = []
+        lock = threading.Lock()
+        chunks = [requests[i :: options["threads"]] for i in range(options["threads"])]
+
+        def worker(chunk):
+            try:
+                for cat_id, rental_date, return_date in chunk:
+                    started = time.perf_counter()
+                    try:
+                        book(cat_id, user, rental_date, return_date)
+                        outcome = "booked"
+                    except ValidationError:
+                        outcome = "conflicts"
+                    except IntegrityError:
+                        outcome = "errors"
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        rows = (
+            Rental.objects.blocking()
+            .filter(cat__breed=breed)
+            .order_by("cat_id", "rental_date", "id")
+            .values_list("cat_id", "rental_date", "return_date", "id")
+        )
+        double_bookings = sum(1 for _overlap in find_overlaps(rows.iterator()))
+
+        latencies.sort()
+        self.stdout.write(f"Mode: {options['mode']}, threads: {options['threads']}")
+        self.stdout.write(
+            f"Requests: {len(requests)} in {elapsed:.2f}s "
+            f"({len(requests) / elapsed:.1f} bookings/s)"
+        )
+        self.stdout.write(
+            f"Booked: {results['booked']}, conflicts: {results['conflicts']}, "
+            f"integrity errors: {results['errors']}"
+        )
+        if latencies:
+            self.stdout.write(
+                f"Latency p50: {statistics.median(latencies) * 1000:.1f}ms, "
+                f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+            )
+        else:
+            # Every worker died on an unexpected error
+            self.stdout.write("Latency p50: n/a, p95: n/a")
+        style = self.style.SUCCESS if not double_bookings else self.style.ERROR
+        self.stdout.write(style(f"Double-bookings: {double_bookings}"))
+
+        if not options["keep"]:
+            species.delete()
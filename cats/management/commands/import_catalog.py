@@ -0,0 +1,79 @@
+"""
+Loads species, breeds, cats and rentals from files written by "export_catalog"
+"""
+
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from cats import cache
+from cats.availability import availability_index
+from cats.catalog_io import FORMATS, TABLES, CatalogImporter, CatalogImportError, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the catalogue and rentals history from a directory of CSV or NDJSON files "
+        "(tables without a file are skipped). Everything is imported in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=Path)
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Write rentals with COPY instead of INSERT (PostgreSQL only)",
+        )
+        parser.add_argument(
+            "--create-users",
+            action="store_true",
+            help="Create users missing in the database (with an unusable password)",
+        )
+        parser.add_argument(
+            "--skip-conflicts",
+            action="store_true",
+            help="Skip overlapping rentals instead of aborting the import",
+        )
+
+    def handle(self, *args, **options):
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy works only on PostgreSQL")
+        directory = options["directory"]
+        if not directory.is_dir():
+            raise CommandError(f"{directory} is not a directory")
+
+        started = time.perf_counter()
+        importer = CatalogImporter(
+            chunk_size=options["chunk_size"],
+            use_copy=options["copy"],
+            create_users=options["create_users"],
+            skip_conflicts=options["skip_conflicts"],
+        )
+        try:
+            with transaction.atomic():
+                for table in TABLES:
+                    path = directory / table.filename(options["format"])
+                    if not path.exists():
+                        continue
+                    with open(path, newline="", encoding="utf-8") as stream:
+                        count = importer.import_table(table, read_rows(stream, options["format"]))
+                    self.stdout.write(f"{table.name}: {count} created")
+        except CatalogImportError as error:
+            raise CommandError(f"Nothing imported, {error}")
+        finally:
+            # bulk_create doesn't send signals
+            availability_index.invalidate()
+            cache.bump_catalog_version()
+
+        for line, reason in importer.conflicts:
+            self.stderr.write(f"Skipped rentals line {line}: {reason}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported in {time.perf_counter() - started:.1f}s, "
+                f"{len(importer.conflicts)} conflicting rentals skipped"
+            )
+        )
@@ -0,0 +1,199 @@
+"""
+Compares concurrent requests throughput of WSGI and ASGI under slow database I/O
+"""
+import asyncio
+import datetime
+import io
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from cats.models import Cat
+from cats.pagination import encode_cursor
+from cats.views import CATS_CURSOR_KEY
+
+# Mode: (handler, URL name of the searched page)
+MODES = {
+    "wsgi": ("wsgi", "cats:explore_list"),
+    "asgi-sync": ("asgi", "cats:explore_list"),
+    "asgi-async": ("asgi", "cats:async_explore_list"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends the same cats search from many concurrent clients through the WSGI handler "
+        "(limited to --wsgi-threads, like a threaded WSGI worker) and through the ASGI handler "
+        "to sync and async views, then reports throughput and latencies. "
+        "--latency-ms is added to every SQL query to simulate a remote or busy database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+        parser.add_argument("--wsgi-threads", type=int, default=4)
+        parser.add_argument("--latency-ms", type=float, default=20)
+        parser.add_argument("--host", default="localhost", help="Must be in ALLOWED_HOSTS")
+        parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        if not Cat.objects.exists():
+            raise CommandError('No cats to search, run "seed_catalog" first')
+        self.host = options["host"]
+        today = datetime.date.today().isoformat()
+        # Cursor of a page starting before the first cat, i.e. the first page of a search
+        self.query_string = urlencode(
+            {
+                "cursor": encode_cursor(
+                    CATS_CURSOR_KEY, ("", 0), {"date_from": today, "date_to": today}
+                )
+            }
+        )
+        latency = options["latency_ms"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # Wrappers of a thread's connection survive reconnecting
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        # Connections are per thread, every new one gets the delay
+        connections.close_all()
+        connection_created.connect(add_latency)
+        self.stdout.write(
+            f"{options['requests']} requests from {options['concurrency']} clients, "
+            f"+{options['latency_ms']:g}ms per SQL query"
+        )
+        self.stdout.write(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        try:
+            for mode in options["modes"]:
+                handler, url_name = MODES[mode]
+                path = reverse(url_name)
+                if handler == "wsgi":
+                    run = self.run_wsgi(path, options["wsgi_threads"])
+                else:
+                    run = self.run_asgi(path)
+                # Warm-up fills in-process caches (e.g. availability index)
+                status = run(1, 1)[2][0]
+                if status != 200:
+                    raise CommandError(f"{mode}: GET {path} returned {status}")
+                wall, latencies, statuses = run(options["requests"], options["concurrency"])
+                self.report(mode, wall, latencies, statuses)
+        finally:
+            connection_created.disconnect(add_latency)
+            connections.close_all()
+
+    def report(self, mode, wall, latencies, statuses):
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        errors = sum(status != 200 for status in statuses)
+        self.stdout.write(
+            f"{mode:<12}{len(latencies) / wall:>10.1f}"
+            f"{statistics.median(latencies) * 1000:>10.1f}{p95 * 1000:>10.1f}{errors:>8}"
+        )
+
+    def run_wsgi(self, path, threads):
+        handler = WSGIHandler()
+        # Clients beyond the worker's threads wait for a free one
+        worker_threads = threading.Semaphore(threads)
+
+        def request():
+            status = []
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": self.query_string,
+                "SERVER_NAME": self.host,
+                "SERVER_PORT": "80",
+                "HTTP_HOST": self.host,
+                "wsgi.url_scheme": "http",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": sys.stderr,
+            }
+            with worker_threads:
+                result = handler(environ, lambda line, headers: status.append(line))
+                try:
+                    b"".join(result)
+                finally:
+                    # Sends "request_finished", which closes the thread's connection
+                    result.close()
+            return int(status[0].split()[0])
+
+        def run(requests, concurrency):
+            with ThreadPoolExecutor(concurrency) as clients:
+                return self.measure(
+                    lambda: list(clients.map(lambda _: timed(request), range(requests)))
+                )
+
+        return run
+
+    def run_asgi(self, path):
+        handler = ASGIHandler()
+
+        async def request():
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": path,
+                "query_string": self.query_string.encode(),
+                "headers": [(b"host", self.host.encode())],
+                "server": (self.host, 80),
+                "client": ("127.0.0.1", 0),
+            }
+            messages = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                messages.append(message)
+
+            await handler(scope, receive, send)
+            return messages[0]["status"]
+
+        async def clients(requests, concurrency):
+            results = []
+            remaining = iter(range(requests))
+
+            async def client():
+                for _ in remaining:
+                    started = time.perf_counter()
+                    status = await request()
+                    results.append((time.perf_counter() - started, status))
+
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return results
+
+        def run(requests, concurrency):
+            return self.measure(lambda: asyncio.run(clients(requests, concurrency)))
+
+        return run
+
+    @staticmethod
+    def measure(send_requests):
+        """Runs requests, returns (wall time, latencies, response statuses)"""
+
+        started = time.perf_counter()
+        results = send_requests()
+        wall = time.perf_counter() - started
+        latencies, statuses = zip(*results)
+        return wall, latencies, statuses
+
+
+def timed(request):
+    started = time.perf_counter()
+    status = request()
+    return time.perf_counter() - started, status
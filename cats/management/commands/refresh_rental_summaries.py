@@ -0,0 +1,45 @@
+"""
+Refreshes and checks rental summaries of cats
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cats.summaries import out_of_date_summaries, refresh_rental_summaries
+
+# Cat ids listed by "--check"
+CHECK_REPORT_LIMIT = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes rental summaries of cats whose next booked date has passed (run daily). "
+        "Rentals' triggers keep everything else up to date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute summaries of all cats, creating missing ones (backfill)",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare summaries with rentals, fail if any is out of date",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            cat_ids = list(out_of_date_summaries(options["batch_size"]))
+            if cat_ids:
+                listed = ", ".join(str(cat_id) for cat_id in cat_ids[:CHECK_REPORT_LIMIT])
+                raise CommandError(
+                    f"{len(cat_ids)} summaries out of date, of cats: {listed}"
+                    + (", ..." if len(cat_ids) > CHECK_REPORT_LIMIT else "")
+                )
+            self.stdout.write(self.style.SUCCESS("All summaries are up to date"))
+            return
+
+        refreshed = refresh_rental_summaries(options["all"], options["batch_size"])
+        self.stdout.write(f"Refreshed {refreshed} summaries")
@@ -0,0 +1,35 @@
+"""
+Applies rental changes to daily utilization rollups
+"""
+from django.core.management.base import BaseCommand
+
+from cats.utilization import queue_all_rentals, refresh_utilization
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes daily utilization rollups for cats' days changed since the last run. "
+        "Safe to run every few minutes alongside live traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after that many batches (keeps a single run short)",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop all rollups and rebuild them from all rentals",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            queued = queue_all_rentals()
+            self.stdout.write(f"Queued rentals of {queued} cats")
+        applied = refresh_utilization(
+            batch_size=options["batch_size"], max_batches=options["max_batches"]
+        )
+        self.stdout.write(f"Applied {applied} changes")
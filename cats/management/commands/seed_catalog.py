@@ -0,0 +1,167 @@
+"""
+Generates a big synthetic catalogue with rentals history
+"""
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from faker import Faker
+
+from cats import cache
+from cats.availability import availability_index
+from cats.catalog_io import chunked
+from cats.models import Breed, Cat, Rental, Species
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic species, breeds, cats, users and rentals. "
+        "Every cat gets a non-overlapping rentals timeline, output is deterministic for a given --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--species", type=int, default=5)
+        parser.add_argument("--breeds-per-species", type=int, default=4)
+        parser.add_argument("--cats", type=int, default=1000)
+        parser.add_argument("--rentals", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--history-days",
+            type=int,
+            default=3 * 365,
+            help="Timelines of cats start that many days ago",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["rentals"] and not (options["users"] and options["cats"]):
+            raise CommandError("Rentals need at least one cat and one user")
+        if options["cats"] and not (options["species"] and options["breeds_per_species"]):
+            raise CommandError("Cats need at least one species and breed")
+        started = time.perf_counter()
+        self.rng = random.Random(options["seed"])
+        self.faker = Faker()
+        self.faker.seed_instance(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        self.today = datetime.date.today()
+        self.prefix = f"seed{options['seed']}"
+
+        breed_ids = self.create_catalog(options["species"], options["breeds_per_species"])
+        user_ids = self.create_users(options["users"])
+        cats, rentals = self.create_cats_and_rentals(
+            breed_ids,
+            user_ids,
+            options["cats"],
+            options["rentals"],
+            options["history_days"],
+        )
+
+        # bulk_create doesn't send signals
+        availability_index.invalidate()
+        cache.bump_catalog_version()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(breed_ids)} breeds, {len(user_ids)} users, {cats} cats "
+                f"and {rentals} rentals in {time.perf_counter() - started:.1f}s"
+            )
+        )
+
+    def create_catalog(self, species_number, breeds_per_species):
+        species = Species.objects.bulk_create(
+            Species(
+                name=f"{self.faker.word().capitalize()} {number}",
+                description=self.faker.sentence(),
+            )
+            for number in range(species_number)
+        )
+        breeds = Breed.objects.bulk_create(
+            Breed(
+                name=f"{self.faker.word().capitalize()} {one_species.pk}-{number}",
+                description=self.faker.sentence(),
+                species=one_species,
+            )
+            for one_species in species
+            for number in range(breeds_per_species)
+        )
+        return [breed.pk for breed in breeds]
+
+    def create_users(self, users_number):
+        usernames = [f"{self.prefix}_user_{number}" for number in range(users_number)]
+        existing = set(
+            User.objects.filter(username__in=usernames).values_list("username", flat=True)
+        )
+        # Password hashing is slow - seeded users get an unusable password
+        User.objects.bulk_create(
+            (
+                User(username=username, email=f"{username}@example.com", password="!")
+                for username in usernames
+                if username not in existing
+            ),
+            batch_size=self.chunk_size,
+        )
+        return list(
+            User.objects.filter(username__in=usernames)
+            .order_by("username")
+            .values_list("id", flat=True)
+        )
+
+    def create_cats_and_rentals(
+        self, breed_ids, user_ids, cats_number, rentals_number, history_days
+    ):
+        rentals_per_cat, extra_rentals = divmod(rentals_number, max(cats_number, 1))
+        first_day = self.today - datetime.timedelta(days=history_days)
+        cats_created = rentals_created = 0
+
+        for numbers in chunked(range(cats_number), self.chunk_size):
+            cats = Cat.objects.bulk_create(
+                Cat(
+                    name=self.faker.first_name(),
+                    breed_id=self.rng.choice(breed_ids),
+                    description=self.faker.sentence(),
+                )
+                for _number in numbers
+            )
+            cats_created += len(cats)
+
+            rentals = (
+                rental
+                for number, cat in zip(numbers, cats)
+                for rental in self.timeline(
+                    cat.pk,
+                    user_ids,
+                    rentals_per_cat + (number < extra_rentals),
+                    first_day,
+                )
+            )
+            for rentals_chunk in chunked(rentals, self.chunk_size):
+                Rental.objects.bulk_create(rentals_chunk)
+                rentals_created += len(rentals_chunk)
+            self.stdout.write(f"{cats_created} cats, {rentals_created} rentals...")
+        return cats_created, rentals_created
+
+    def timeline(self, cat_id, user_ids, rentals_number, day):
+        """Yields rentals of a cat one after another, with random gaps between them"""
+
+        for _number in range(rentals_number):
+            rental_date = day + datetime.timedelta(days=self.rng.randint(0, 10))
+            return_date = rental_date + datetime.timedelta(days=self.rng.randint(0, 13))
+            day = return_date + datetime.timedelta(days=1)
+            yield Rental(
+                cat_id=cat_id,
+                user_id=self.rng.choice(user_ids),
+                rental_date=rental_date,
+                return_date=return_date,
+                status=self.status(rental_date, return_date),
+            )
+
+    def status(self, rental_date, return_date):
+        if self.rng.random() < 0.05:
+            return Rental.CANCELLED
+        if return_date < self.today:
+            return Rental.FINISHED
+        if rental_date <= self.today:
+            return Rental.ACTIVE
+        return self.rng.choice((Rental.PENDING, Rental.ACTIVE))
@@ -0,0 +1,48 @@
+"""
+Sends e-mails queued in the outbox
+"""
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from cats.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Sends queued e-mails in batches over a single mail server connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Mark an e-mail as failed after that many unsuccessful attempts",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting when it's empty",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5, help="Seconds between polls in --loop mode"
+        )
+        parser.add_argument(
+            "--backend",
+            help='E-mail backend to use instead of EMAIL_BACKEND, e.g. "django.core.mail.backends.console.EmailBackend"',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            connection = get_connection(options["backend"])
+            sent, failed = drain(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                connection=connection,
+            )
+            if sent or failed or not options["loop"]:
+                self.stdout.write(f"Sent {sent} e-mails, {failed} failed")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
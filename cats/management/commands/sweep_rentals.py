@@ -0,0 +1,44 @@
+"""
+Moves rentals to their next status once their dates have passed
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from cats.models import Rental
+from cats.services import sweep_rentals
+
+TRANSITIONS = (
+    # Returned cats
+    (Rental.ACTIVE, Rental.FINISHED),
+    # Never confirmed, and the whole rental period is already gone
+    (Rental.PENDING, Rental.CANCELLED),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Finishes active rentals and cancels pending rentals whose return date has passed. "
+        "Safe to run every minute alongside live traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after that many batches per transition (keeps a single run short)",
+        )
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        statuses = dict(Rental.STATUS)
+        for status, new_status in TRANSITIONS:
+            moved = sweep_rentals(
+                status,
+                new_status,
+                before=today,
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+            )
+            self.stdout.write(f"{statuses[status]} -> {statuses[new_status]}: {moved} rentals")
@@ -0,0 +1,229 @@
+"""
+Middlewares used in cats app
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from cat_rental.routers import replica_reads
+
+logger = logging.getLogger("cats.performance")
+
+PRIMARY_PIN_COOKIE = "primary_pinned"
+
+
+def pin_primary(request):
+    """Keeps reads of the user's next requests on the primary for REPLICA_PIN_SECONDS"""
+
+    request.pin_primary = True
+
+
+class QueryStats:
+    """
+    Database execute wrapper counting queries and their time.
+
+    SQL reaching the wrapper is still parametrized, so the same statement text
+    run many times in one request is a repeated query shape (likely N+1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold):
+        """Query shapes run at least "threshold" times, most frequent first"""
+
+        return [
+            (sql, count) for sql, count in self.shapes.most_common() if count >= threshold
+        ]
+
+
+# Stats of the request being served, seen by threads running its code with
+# a copy of its context (sync_to_async, cats.async_views)
+current_query_stats = contextvars.ContextVar("current_query_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding queries to the current request's stats, if any"""
+
+    stats = current_query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def track_queries():
+    """
+    Adds "record_query" wrapper to database connections of the calling thread.
+
+    Connections (and their wrappers) are per thread, so every thread running
+    a timed request's queries calls it once. Wrappers survive reconnecting.
+    """
+
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+class QueryTimingMiddleware:
+    """
+    Opt-in (QUERY_TIMING_ENABLED) per-request SQL and timing instrumentation.
+
+    Adds "Server-Timing" header with total, SQL and application time, number
+    of queries and repeated query shapes, and logs requests slower than
+    SLOW_REQUEST_THRESHOLD_MS to "cats.performance" logger.
+
+    Works in both sync and async middleware chains. Under ASGI queries run
+    in other threads, which count them through "current_query_stats" copied
+    with the request's context: Django's thread of synchronous code is set up
+    here, threads of async views (cats.async_views) by themselves.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Makes Django treat this instance as an async middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        track_queries()
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        return self.report(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        await sync_to_async(track_queries)()
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        return self.report(request, response, stats, time.perf_counter() - started)
+
+    def report(self, request, response, stats, total):
+        """Adds Server-Timing header to the response and logs the request if slow"""
+
+        repeated = stats.repeated(settings.REPEATED_QUERY_THRESHOLD)
+        response["Server-Timing"] = ", ".join(
+            [
+                f"total;dur={total * 1000:.1f}",
+                f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                f"app;dur={(total - stats.duration) * 1000:.1f}",
+                f'n1;desc="{len(repeated)} repeated query shapes"',
+            ]
+        )
+
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            resolver_match = request.resolver_match
+            logger.warning(
+                "Slow request %s",
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": resolver_match.view_name if resolver_match else None,
+                        "status": response.status_code,
+                        "total_ms": round(total * 1000, 1),
+                        "db_ms": round(stats.duration * 1000, 1),
+                        "queries": stats.count,
+                        "repeated_queries": [
+                            {"sql": sql[:200], "count": count} for sql, count in repeated
+                        ],
+                    }
+                ),
+            )
+        return response
+
+
+class ReplicaReadsMiddleware:
+    """
+    Sends database reads of REPLICA_READ_VIEWS to a read replica (one per request).
+
+    Users who have just booked a cat (see "pin_primary") get a short-lived
+    cookie and keep reading from the primary, so they see their own writes
+    despite replica lag. Not used when no replicas are configured.
+
+    Works in both sync and async middleware chains, so async views stay async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Makes Django treat this instance as an async middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.use_replica(request):
+            with replica_reads():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if self.use_replica(request):
+            with replica_reads():
+                response = await self.get_response(request)
+        else:
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def use_replica(self, request):
+        if PRIMARY_PIN_COOKIE in request.COOKIES:
+            return False
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return False
+        return view_name in settings.REPLICA_READ_VIEWS
+
+    def process_response(self, request, response):
+        if getattr(request, "pin_primary", False):
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
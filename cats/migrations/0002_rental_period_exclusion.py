@@ -0,0 +1,40 @@
+# Generated by Django 3.2.7 on 2026-10-18 10:32
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+import cats.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cats", "0001_initial"),
+    ]
+
+    operations = [
+        # Needed for "cat_id WITH =" inside a GiST exclusion constraint
+        BtreeGistExtension(),
+        migrations.AddConstraint(
+            model_name="rental",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("status__in", (1, 2, 3))),
+                expressions=[
+                    (
+                        cats.models.DateRangeFunc(
+                            "rental_date",
+                            "return_date",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(
+                                inclusive_lower=True, inclusive_upper=True
+                            ),
+                        ),
+                        "&&",
+                    ),
+                    ("cat", "="),
+                ],
+                name="exclude_overlapping_rentals",
+            ),
+        ),
+    ]
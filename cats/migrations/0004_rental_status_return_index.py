@@ -0,0 +1,23 @@
+# Generated by Django 3.2.7 on 2026-10-18 10:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Building the index concurrently doesn't block writes to a big table
+    atomic = False
+
+    dependencies = [
+        ("cats", "0003_outboxemail"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="rental",
+            index=models.Index(
+                fields=["status", "return_date"], name="rental_status_return_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 3.2.7 on 2026-10-18 10:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Building the indexes concurrently doesn't block writes to a big table
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("cats", "0004_rental_status_return_index"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="rental",
+            index=models.Index(
+                fields=["status", "rental_date"], name="rental_status_rental_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="rental",
+            index=models.Index(fields=["cat", "id"], name="rental_cat_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="rental",
+            index=models.Index(
+                condition=models.Q(("status__in", (1, 2, 3))),
+                fields=["cat", "return_date"],
+                name="rental_cat_blocking_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="rental",
+            index=models.Index(
+                models.F("user"),
+                models.OrderBy(
+                    models.F("rental_date"), descending=True, nulls_last=True
+                ),
+                models.OrderBy(models.F("id"), descending=True),
+                name="rental_user_history_idx",
+            ),
+        ),
+        # Plain foreign key indexes are dropped once the composite ones covering
+        # them exist. AlterField would drop and re-validate foreign key constraints,
+        # so only the state is altered and the indexes are dropped concurrently.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="rental",
+                    name="cat",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rentals",
+                        to="cats.cat",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="rental",
+                    name="user",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rentals",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "cats_rental_cat_id_4fc0ea77"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS "cats_rental_cat_id_4fc0ea77" ON "cats_rental" ("cat_id")',
+                ),
+                migrations.RunSQL(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "cats_rental_user_id_e697de6d"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS "cats_rental_user_id_e697de6d" ON "cats_rental" ("user_id")',
+                ),
+            ],
+        ),
+    ]
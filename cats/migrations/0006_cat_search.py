@@ -0,0 +1,102 @@
+# Generated by Django 3.2.7 on 2026-10-18 11:24
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+# Cat's search vector: name (weight A), breed and species names (B), description (C).
+# A generated column can't read other tables, so it's kept by triggers; these
+# also cover bulk inserts, COPY and raw SQL. Config matches cats.models.SEARCH_CONFIG.
+SEARCH_TRIGGERS = """
+CREATE FUNCTION cats_cat_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT b.name || ' ' || s.name
+            FROM cats_breed b JOIN cats_species s ON s.id = b.species_id
+            WHERE b.id = NEW.breed_id
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_cat_search_vector
+BEFORE INSERT OR UPDATE OF name, description, breed_id ON cats_cat
+FOR EACH ROW EXECUTE FUNCTION cats_cat_search_vector();
+
+-- Renamed breeds and species refresh vectors of their cats
+CREATE FUNCTION cats_breed_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE cats_cat SET breed_id = breed_id WHERE breed_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_breed_search_vector
+AFTER UPDATE OF name, species_id ON cats_breed
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.species_id <> NEW.species_id)
+EXECUTE FUNCTION cats_breed_search_vector();
+
+CREATE FUNCTION cats_species_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE cats_cat SET breed_id = breed_id
+    WHERE breed_id IN (SELECT id FROM cats_breed WHERE species_id = NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_species_search_vector
+AFTER UPDATE OF name ON cats_species
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION cats_species_search_vector();
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP TRIGGER cats_species_search_vector ON cats_species;
+DROP FUNCTION cats_species_search_vector();
+DROP TRIGGER cats_breed_search_vector ON cats_breed;
+DROP FUNCTION cats_breed_search_vector();
+DROP TRIGGER cats_cat_search_vector ON cats_cat;
+DROP FUNCTION cats_cat_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # Building the indexes concurrently doesn't block writes to a big table
+    atomic = False
+
+    dependencies = [
+        ("cats", "0005_rental_access_path_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="cat",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGERS, DROP_SEARCH_TRIGGERS),
+        # Fills vectors of existing cats through the trigger
+        migrations.RunSQL(
+            "UPDATE cats_cat SET breed_id = breed_id", migrations.RunSQL.noop
+        ),
+        AddIndexConcurrently(
+            model_name="cat",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="cat_search_vector_idx"
+            ),
+        ),
+        # Serves "name__icontains", i.e. UPPER("name"::text) LIKE UPPER('%...%')
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY "cat_name_trgm_idx" ON "cats_cat" '
+            'USING gin ((UPPER("name"::text)) gin_trgm_ops)',
+            'DROP INDEX CONCURRENTLY IF EXISTS "cat_name_trgm_idx"',
+        ),
+    ]
@@ -0,0 +1,224 @@
+# Generated by Django 3.2.7 on 2026-10-18 11:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Logs periods of cats' days touched by each statement changing rentals,
+# with the cat's breed. Statement triggers with transition tables write one
+# row per cat and statement, so bulk updates and COPY imports don't double
+# their writes. Updates not changing cat, dates or status are skipped.
+CHANGE_TRIGGERS = """
+CREATE FUNCTION cats_rental_utilization_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM new_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM old_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSE
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM (
+            SELECT old_rental.cat_id, old_rental.rental_date, old_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+            UNION ALL
+            SELECT new_rental.cat_id, new_rental.rental_date, new_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+        ) rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_rental_utilization_insert
+AFTER INSERT ON cats_rental REFERENCING NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_utilization_change();
+
+CREATE TRIGGER cats_rental_utilization_update
+AFTER UPDATE ON cats_rental REFERENCING OLD TABLE AS old_rentals NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_utilization_change();
+
+CREATE TRIGGER cats_rental_utilization_delete
+AFTER DELETE ON cats_rental REFERENCING OLD TABLE AS old_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_utilization_change();
+
+-- A cat moved to another breed changes rollups of both breeds
+CREATE FUNCTION cats_cat_utilization_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+    SELECT NEW.id, breeds.breed_id, min(rental.rental_date), max(rental.return_date)
+    FROM cats_rental rental, (VALUES (OLD.breed_id), (NEW.breed_id)) AS breeds (breed_id)
+    WHERE rental.cat_id = NEW.id
+    AND rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+    GROUP BY breeds.breed_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_cat_utilization_change
+AFTER UPDATE OF breed_id ON cats_cat
+FOR EACH ROW WHEN (OLD.breed_id <> NEW.breed_id)
+EXECUTE FUNCTION cats_cat_utilization_change();
+"""
+
+DROP_CHANGE_TRIGGERS = """
+DROP TRIGGER cats_cat_utilization_change ON cats_cat;
+DROP FUNCTION cats_cat_utilization_change();
+DROP TRIGGER cats_rental_utilization_delete ON cats_rental;
+DROP TRIGGER cats_rental_utilization_update ON cats_rental;
+DROP TRIGGER cats_rental_utilization_insert ON cats_rental;
+DROP FUNCTION cats_rental_utilization_change();
+"""
+
+# Existing rentals are rolled up by the first "refresh_utilization" run
+QUEUE_EXISTING_RENTALS = """
+INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+FROM cats_rental rental
+JOIN cats_cat cat ON cat.id = rental.cat_id
+WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+GROUP BY rental.cat_id, cat.breed_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cats", "0006_cat_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UtilizationChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cat_id", models.BigIntegerField()),
+                ("breed_id", models.BigIntegerField(null=True)),
+                ("date_from", models.DateField()),
+                ("date_to", models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CatDayUtilization",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Not activate (draft)"),
+                            (1, "Pending (@)"),
+                            (2, "Active"),
+                            (3, "Finished"),
+                            (4, "Cancelled"),
+                        ]
+                    ),
+                ),
+                ("rentals", models.PositiveIntegerField()),
+                (
+                    "cat",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cats.cat",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BreedDayUtilization",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Not activate (draft)"),
+                            (1, "Pending (@)"),
+                            (2, "Active"),
+                            (3, "Finished"),
+                            (4, "Cancelled"),
+                        ]
+                    ),
+                ),
+                ("cats", models.PositiveIntegerField()),
+                ("rentals", models.PositiveIntegerField()),
+                (
+                    "breed",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cats.breed",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="catdayutilization",
+            index=models.Index(fields=["day", "status"], name="utilization_day_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="catdayutilization",
+            constraint=models.UniqueConstraint(
+                fields=("cat", "day", "status"), name="cat_day_utilization_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="breeddayutilization",
+            index=models.Index(
+                fields=["day", "status"], name="breed_utilization_day_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="breeddayutilization",
+            constraint=models.UniqueConstraint(
+                fields=("breed", "day", "status"), name="breed_day_utilization_unique"
+            ),
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+        migrations.RunSQL(QUEUE_EXISTING_RENTALS, migrations.RunSQL.noop),
+    ]
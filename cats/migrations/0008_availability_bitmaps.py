@@ -0,0 +1,178 @@
+# Generated by Django 3.2.7 on 2026-10-18 11:40
+
+import cats.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Recounts bitmaps of given (cat, year) pairs from the cats' blocking rentals
+# (Rental.BLOCKING_STATUSES: 1, 2, 3), dropping those left without busy days.
+# Locks the cats first: a transaction changing the same cats' rentals
+# concurrently commits before the recount, which then sees its rentals.
+REFRESH_FUNCTION = """
+CREATE FUNCTION cats_refresh_availability(cat_ids bigint[], years integer[]) RETURNS void AS $$
+BEGIN
+    IF cat_ids IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM FROM cats_cat WHERE id = ANY(cat_ids) ORDER BY id FOR NO KEY UPDATE;
+
+    WITH touched AS (
+        SELECT DISTINCT cat_id, year FROM unnest(cat_ids, years) AS touched (cat_id, year)
+    ), fresh AS (
+        SELECT touched.cat_id, touched.year,
+            bit_or(B'1'::bit(366) >> (day::date - make_date(touched.year, 1, 1))) AS busy_days
+        FROM touched
+        JOIN cats_rental rental
+            ON rental.cat_id = touched.cat_id
+            AND rental.status IN (1, 2, 3)
+            AND rental.rental_date <= make_date(touched.year, 12, 31)
+            AND rental.return_date >= make_date(touched.year, 1, 1)
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(rental.rental_date, make_date(touched.year, 1, 1)),
+            LEAST(rental.return_date, make_date(touched.year, 12, 31)),
+            interval '1 day'
+        ) AS day
+        GROUP BY touched.cat_id, touched.year
+    ), cleared AS (
+        DELETE FROM cats_catavailabilityyear availability
+        USING touched
+        WHERE availability.cat_id = touched.cat_id AND availability.year = touched.year
+        AND NOT EXISTS (
+            SELECT FROM fresh WHERE fresh.cat_id = touched.cat_id AND fresh.year = touched.year
+        )
+    )
+    INSERT INTO cats_catavailabilityyear (cat_id, year, busy_days)
+    SELECT cat_id, year, busy_days FROM fresh
+    ON CONFLICT (cat_id, year) DO UPDATE SET busy_days = EXCLUDED.busy_days;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Statement triggers with transition tables, like the utilization ones
+# (migration 0007): bulk updates and COPY imports recount each touched cat's
+# year once. Updates not changing cat, dates or blocking status are skipped.
+CHANGE_TRIGGERS = """
+CREATE FUNCTION cats_rental_availability_change() RETURNS trigger AS $$
+DECLARE
+    cat_ids bigint[];
+    years integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(rental.cat_id), array_agg(year) INTO cat_ids, years
+        FROM new_rentals rental
+        CROSS JOIN LATERAL generate_series(
+            extract(year FROM rental.rental_date)::integer,
+            extract(year FROM rental.return_date)::integer
+        ) AS year
+        WHERE rental.status IN (1, 2, 3);
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(rental.cat_id), array_agg(year) INTO cat_ids, years
+        FROM old_rentals rental
+        CROSS JOIN LATERAL generate_series(
+            extract(year FROM rental.rental_date)::integer,
+            extract(year FROM rental.return_date)::integer
+        ) AS year
+        WHERE rental.status IN (1, 2, 3);
+    ELSE
+        SELECT array_agg(rental.cat_id), array_agg(year) INTO cat_ids, years
+        FROM (
+            SELECT old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status IN (1, 2, 3))
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status IN (1, 2, 3))
+            UNION ALL
+            SELECT new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status IN (1, 2, 3))
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status IN (1, 2, 3))
+        ) rental
+        CROSS JOIN LATERAL generate_series(
+            extract(year FROM rental.rental_date)::integer,
+            extract(year FROM rental.return_date)::integer
+        ) AS year
+        WHERE rental.status IN (1, 2, 3);
+    END IF;
+    PERFORM cats_refresh_availability(cat_ids, years);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_rental_availability_insert
+AFTER INSERT ON cats_rental REFERENCING NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_availability_change();
+
+CREATE TRIGGER cats_rental_availability_update
+AFTER UPDATE ON cats_rental REFERENCING OLD TABLE AS old_rentals NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_availability_change();
+
+CREATE TRIGGER cats_rental_availability_delete
+AFTER DELETE ON cats_rental REFERENCING OLD TABLE AS old_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_availability_change();
+"""
+
+DROP_CHANGE_TRIGGERS = """
+DROP TRIGGER cats_rental_availability_delete ON cats_rental;
+DROP TRIGGER cats_rental_availability_update ON cats_rental;
+DROP TRIGGER cats_rental_availability_insert ON cats_rental;
+DROP FUNCTION cats_rental_availability_change();
+"""
+
+FILL_EXISTING_RENTALS = """
+SELECT cats_refresh_availability(array_agg(cat_id), array_agg(year))
+FROM (
+    SELECT DISTINCT rental.cat_id, year
+    FROM cats_rental rental
+    CROSS JOIN LATERAL generate_series(
+        extract(year FROM rental.rental_date)::integer,
+        extract(year FROM rental.return_date)::integer
+    ) AS year
+    WHERE rental.status IN (1, 2, 3)
+) touched
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cats", "0007_utilization_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatAvailabilityYear",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                ("busy_days", cats.models.DayBitmapField()),
+                (
+                    "cat",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cats.cat",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="catavailabilityyear",
+            constraint=models.UniqueConstraint(
+                fields=("cat", "year"), name="cat_availability_year_unique"
+            ),
+        ),
+        migrations.RunSQL(
+            REFRESH_FUNCTION,
+            "DROP FUNCTION cats_refresh_availability(bigint[], integer[])",
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+        migrations.RunSQL(FILL_EXISTING_RENTALS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 3.2.7 on 2026-10-18 11:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Fresh summaries of given cats, computed from their rentals. "next_booked_date":
+# first day from today covered by a blocking rental (Rental.BLOCKING_STATUSES:
+# 1, 2, 3), "active_rentals": rentals in ACTIVE (2) status.
+SUMMARY_FUNCTIONS = """
+CREATE FUNCTION cats_compute_rental_summaries(cat_ids bigint[])
+RETURNS TABLE (
+    cat_id bigint,
+    total_rentals integer,
+    active_rentals integer,
+    last_rental_date date,
+    last_return_date date,
+    next_booked_date date
+) AS $$
+    SELECT
+        cat.id,
+        count(rental.id)::integer,
+        (count(rental.id) FILTER (WHERE rental.status = 2))::integer,
+        (array_agg(rental.rental_date ORDER BY rental.id DESC))[1],
+        (array_agg(rental.return_date ORDER BY rental.id DESC))[1],
+        min(GREATEST(rental.rental_date, CURRENT_DATE)) FILTER (
+            WHERE rental.status IN (1, 2, 3)
+            AND (rental.return_date IS NULL OR rental.return_date >= CURRENT_DATE)
+        )
+    FROM cats_cat cat
+    LEFT JOIN cats_rental rental ON rental.cat_id = cat.id
+    WHERE cat.id = ANY(cat_ids)
+    GROUP BY cat.id
+$$ LANGUAGE sql STABLE;
+
+-- Updates summaries of given cats, returns the number of changed ones. Locks
+-- the cats first: a transaction changing the same cats' rentals concurrently
+-- commits before the summaries are computed, which then see its rentals.
+-- Summaries are only updated, never created: a cat being deleted keeps none.
+CREATE FUNCTION cats_refresh_rental_summaries(cat_ids bigint[]) RETURNS integer AS $$
+DECLARE
+    refreshed integer;
+BEGIN
+    PERFORM FROM cats_cat WHERE id = ANY(cat_ids) ORDER BY id FOR NO KEY UPDATE;
+    UPDATE cats_catrentalsummary summary SET
+        total_rentals = fresh.total_rentals,
+        active_rentals = fresh.active_rentals,
+        last_rental_date = fresh.last_rental_date,
+        last_return_date = fresh.last_return_date,
+        next_booked_date = fresh.next_booked_date
+    FROM cats_compute_rental_summaries(cat_ids) fresh
+    WHERE summary.cat_id = fresh.cat_id
+    AND (
+        summary.total_rentals, summary.active_rentals, summary.last_rental_date,
+        summary.last_return_date, summary.next_booked_date
+    ) IS DISTINCT FROM (
+        fresh.total_rentals, fresh.active_rentals, fresh.last_rental_date,
+        fresh.last_return_date, fresh.next_booked_date
+    );
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_SUMMARY_FUNCTIONS = """
+DROP FUNCTION cats_refresh_rental_summaries(bigint[]);
+DROP FUNCTION cats_compute_rental_summaries(bigint[]);
+"""
+
+# Statement triggers with transition tables, like the utilization ones
+# (migration 0007). Updates not changing cat, dates or status are skipped.
+SUMMARY_TRIGGERS = """
+CREATE FUNCTION cats_rental_summary_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM cats_refresh_rental_summaries(ARRAY(SELECT DISTINCT cat_id FROM new_rentals));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM cats_refresh_rental_summaries(ARRAY(SELECT DISTINCT cat_id FROM old_rentals));
+    ELSE
+        PERFORM cats_refresh_rental_summaries(ARRAY(
+            SELECT DISTINCT changed.cat_id
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id,
+            LATERAL (VALUES (old_rental.cat_id), (new_rental.cat_id)) AS changed (cat_id)
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+        ));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_rental_summary_insert
+AFTER INSERT ON cats_rental REFERENCING NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_summary_change();
+
+CREATE TRIGGER cats_rental_summary_update
+AFTER UPDATE ON cats_rental REFERENCING OLD TABLE AS old_rentals NEW TABLE AS new_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_summary_change();
+
+CREATE TRIGGER cats_rental_summary_delete
+AFTER DELETE ON cats_rental REFERENCING OLD TABLE AS old_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_rental_summary_change();
+
+-- Every cat has a summary, also before its first rental
+CREATE FUNCTION cats_cat_summary_create() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cats_catrentalsummary (cat_id, total_rentals, active_rentals)
+    SELECT id, 0, 0 FROM new_cats;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_cat_summary_create
+AFTER INSERT ON cats_cat REFERENCING NEW TABLE AS new_cats
+FOR EACH STATEMENT EXECUTE FUNCTION cats_cat_summary_create();
+"""
+
+DROP_SUMMARY_TRIGGERS = """
+DROP TRIGGER cats_cat_summary_create ON cats_cat;
+DROP FUNCTION cats_cat_summary_create();
+DROP TRIGGER cats_rental_summary_delete ON cats_rental;
+DROP TRIGGER cats_rental_summary_update ON cats_rental;
+DROP TRIGGER cats_rental_summary_insert ON cats_rental;
+DROP FUNCTION cats_rental_summary_change();
+"""
+
+FILL_EXISTING_CATS = """
+INSERT INTO cats_catrentalsummary (
+    cat_id, total_rentals, active_rentals, last_rental_date, last_return_date, next_booked_date
+)
+SELECT * FROM cats_compute_rental_summaries(ARRAY(SELECT id FROM cats_cat))
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cats", "0008_availability_bitmaps"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatRentalSummary",
+            fields=[
+                (
+                    "cat",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rental_summary",
+                        serialize=False,
+                        to="cats.cat",
+                    ),
+                ),
+                ("total_rentals", models.PositiveIntegerField(default=0)),
+                ("active_rentals", models.PositiveIntegerField(default=0)),
+                ("last_rental_date", models.DateField(null=True)),
+                ("last_return_date", models.DateField(null=True)),
+                ("next_booked_date", models.DateField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="catrentalsummary",
+            index=models.Index(
+                fields=["total_rentals", "cat"], name="cat_summary_popularity_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="catrentalsummary",
+            index=models.Index(
+                fields=["next_booked_date", "cat"], name="cat_summary_next_booked_idx"
+            ),
+        ),
+        migrations.RunSQL(SUMMARY_FUNCTIONS, DROP_SUMMARY_FUNCTIONS),
+        migrations.RunSQL(SUMMARY_TRIGGERS, DROP_SUMMARY_TRIGGERS),
+        migrations.RunSQL(FILL_EXISTING_CATS, migrations.RunSQL.noop),
+    ]
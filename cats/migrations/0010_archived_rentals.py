@@ -0,0 +1,324 @@
+# Generated by Django 3.2.7 on 2026-10-18 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+# Live and archived rentals, for everything reading rentals' history
+HISTORY_VIEW = """
+CREATE VIEW cats_rental_history AS
+SELECT id, cat_id, user_id, rental_date, return_date, status FROM cats_rental
+UNION ALL
+SELECT id, cat_id, user_id, rental_date, return_date, status FROM cats_archivedrental
+"""
+
+# Functions of migrations 0007-0009 reading the history view instead of live
+# rentals, so archiving changes none of the summaries, rollups and bitmaps.
+# Archiving doesn't queue utilization changes either, which would only
+# recompute the same rollups.
+HISTORY_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION cats_rental_utilization_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM new_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM old_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        -- Archived rentals are still rolled up, their days don't change
+        AND NOT EXISTS (SELECT FROM cats_archivedrental archived WHERE archived.id = rental.id)
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSE
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM (
+            SELECT old_rental.cat_id, old_rental.rental_date, old_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+            UNION ALL
+            SELECT new_rental.cat_id, new_rental.rental_date, new_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+        ) rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_cat_utilization_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+    SELECT NEW.id, breeds.breed_id, min(rental.rental_date), max(rental.return_date)
+    FROM cats_rental_history rental, (VALUES (OLD.breed_id), (NEW.breed_id)) AS breeds (breed_id)
+    WHERE rental.cat_id = NEW.id
+    AND rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+    GROUP BY breeds.breed_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_refresh_availability(cat_ids bigint[], years integer[]) RETURNS void AS $$
+BEGIN
+    IF cat_ids IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM FROM cats_cat WHERE id = ANY(cat_ids) ORDER BY id FOR NO KEY UPDATE;
+
+    WITH touched AS (
+        SELECT DISTINCT cat_id, year FROM unnest(cat_ids, years) AS touched (cat_id, year)
+    ), fresh AS (
+        SELECT touched.cat_id, touched.year,
+            bit_or(B'1'::bit(366) >> (day::date - make_date(touched.year, 1, 1))) AS busy_days
+        FROM touched
+        JOIN cats_rental_history rental
+            ON rental.cat_id = touched.cat_id
+            AND rental.status IN (1, 2, 3)
+            AND rental.rental_date <= make_date(touched.year, 12, 31)
+            AND rental.return_date >= make_date(touched.year, 1, 1)
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(rental.rental_date, make_date(touched.year, 1, 1)),
+            LEAST(rental.return_date, make_date(touched.year, 12, 31)),
+            interval '1 day'
+        ) AS day
+        GROUP BY touched.cat_id, touched.year
+    ), cleared AS (
+        DELETE FROM cats_catavailabilityyear availability
+        USING touched
+        WHERE availability.cat_id = touched.cat_id AND availability.year = touched.year
+        AND NOT EXISTS (
+            SELECT FROM fresh WHERE fresh.cat_id = touched.cat_id AND fresh.year = touched.year
+        )
+    )
+    INSERT INTO cats_catavailabilityyear (cat_id, year, busy_days)
+    SELECT cat_id, year, busy_days FROM fresh
+    ON CONFLICT (cat_id, year) DO UPDATE SET busy_days = EXCLUDED.busy_days;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_compute_rental_summaries(cat_ids bigint[])
+RETURNS TABLE (
+    cat_id bigint,
+    total_rentals integer,
+    active_rentals integer,
+    last_rental_date date,
+    last_return_date date,
+    next_booked_date date
+) AS $$
+    SELECT
+        cat.id,
+        count(rental.id)::integer,
+        (count(rental.id) FILTER (WHERE rental.status = 2))::integer,
+        (array_agg(rental.rental_date ORDER BY rental.id DESC))[1],
+        (array_agg(rental.return_date ORDER BY rental.id DESC))[1],
+        min(GREATEST(rental.rental_date, CURRENT_DATE)) FILTER (
+            WHERE rental.status IN (1, 2, 3)
+            AND (rental.return_date IS NULL OR rental.return_date >= CURRENT_DATE)
+        )
+    FROM cats_cat cat
+    LEFT JOIN cats_rental_history rental ON rental.cat_id = cat.id
+    WHERE cat.id = ANY(cat_ids)
+    GROUP BY cat.id
+$$ LANGUAGE sql STABLE;
+"""
+
+# Functions of migrations 0007-0009 as they were, restored when unapplying
+LIVE_RENTALS_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION cats_rental_utilization_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM new_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM old_rentals rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    ELSE
+        INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+        SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+        FROM (
+            SELECT old_rental.cat_id, old_rental.rental_date, old_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+            UNION ALL
+            SELECT new_rental.cat_id, new_rental.rental_date, new_rental.return_date
+            FROM old_rentals old_rental JOIN new_rentals new_rental ON new_rental.id = old_rental.id
+            WHERE (old_rental.cat_id, old_rental.rental_date, old_rental.return_date, old_rental.status)
+                IS DISTINCT FROM (new_rental.cat_id, new_rental.rental_date, new_rental.return_date, new_rental.status)
+        ) rental
+        LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+        WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+        GROUP BY rental.cat_id, cat.breed_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_cat_utilization_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+    SELECT NEW.id, breeds.breed_id, min(rental.rental_date), max(rental.return_date)
+    FROM cats_rental rental, (VALUES (OLD.breed_id), (NEW.breed_id)) AS breeds (breed_id)
+    WHERE rental.cat_id = NEW.id
+    AND rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+    GROUP BY breeds.breed_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_refresh_availability(cat_ids bigint[], years integer[]) RETURNS void AS $$
+BEGIN
+    IF cat_ids IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM FROM cats_cat WHERE id = ANY(cat_ids) ORDER BY id FOR NO KEY UPDATE;
+
+    WITH touched AS (
+        SELECT DISTINCT cat_id, year FROM unnest(cat_ids, years) AS touched (cat_id, year)
+    ), fresh AS (
+        SELECT touched.cat_id, touched.year,
+            bit_or(B'1'::bit(366) >> (day::date - make_date(touched.year, 1, 1))) AS busy_days
+        FROM touched
+        JOIN cats_rental rental
+            ON rental.cat_id = touched.cat_id
+            AND rental.status IN (1, 2, 3)
+            AND rental.rental_date <= make_date(touched.year, 12, 31)
+            AND rental.return_date >= make_date(touched.year, 1, 1)
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(rental.rental_date, make_date(touched.year, 1, 1)),
+            LEAST(rental.return_date, make_date(touched.year, 12, 31)),
+            interval '1 day'
+        ) AS day
+        GROUP BY touched.cat_id, touched.year
+    ), cleared AS (
+        DELETE FROM cats_catavailabilityyear availability
+        USING touched
+        WHERE availability.cat_id = touched.cat_id AND availability.year = touched.year
+        AND NOT EXISTS (
+            SELECT FROM fresh WHERE fresh.cat_id = touched.cat_id AND fresh.year = touched.year
+        )
+    )
+    INSERT INTO cats_catavailabilityyear (cat_id, year, busy_days)
+    SELECT cat_id, year, busy_days FROM fresh
+    ON CONFLICT (cat_id, year) DO UPDATE SET busy_days = EXCLUDED.busy_days;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cats_compute_rental_summaries(cat_ids bigint[])
+RETURNS TABLE (
+    cat_id bigint,
+    total_rentals integer,
+    active_rentals integer,
+    last_rental_date date,
+    last_return_date date,
+    next_booked_date date
+) AS $$
+    SELECT
+        cat.id,
+        count(rental.id)::integer,
+        (count(rental.id) FILTER (WHERE rental.status = 2))::integer,
+        (array_agg(rental.rental_date ORDER BY rental.id DESC))[1],
+        (array_agg(rental.return_date ORDER BY rental.id DESC))[1],
+        min(GREATEST(rental.rental_date, CURRENT_DATE)) FILTER (
+            WHERE rental.status IN (1, 2, 3)
+            AND (rental.return_date IS NULL OR rental.return_date >= CURRENT_DATE)
+        )
+    FROM cats_cat cat
+    LEFT JOIN cats_rental rental ON rental.cat_id = cat.id
+    WHERE cat.id = ANY(cat_ids)
+    GROUP BY cat.id
+$$ LANGUAGE sql STABLE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("cats", "0009_cat_rental_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRental",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("rental_date", models.DateField(blank=True, null=True)),
+                ("return_date", models.DateField(blank=True, null=True)),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Not activate (draft)"),
+                            (1, "Pending (@)"),
+                            (2, "Active"),
+                            (3, "Finished"),
+                            (4, "Cancelled"),
+                        ]
+                    ),
+                ),
+                ("archived_at", models.DateTimeField()),
+                (
+                    "cat",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_rentals",
+                        to="cats.cat",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_rentals",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="archivedrental",
+            index=models.Index(
+                fields=["cat", "rental_date"], name="archived_rental_cat_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedrental",
+            index=models.Index(
+                django.db.models.expressions.F("user"),
+                django.db.models.expressions.OrderBy(
+                    django.db.models.expressions.F("rental_date"),
+                    descending=True,
+                    nulls_last=True,
+                ),
+                django.db.models.expressions.OrderBy(
+                    django.db.models.expressions.F("id"), descending=True
+                ),
+                name="archived_user_history_idx",
+            ),
+        ),
+        migrations.RunSQL(HISTORY_VIEW, "DROP VIEW cats_rental_history"),
+        migrations.RunSQL(HISTORY_FUNCTIONS, LIVE_RENTALS_FUNCTIONS),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:05
+
+from django.db import migrations
+
+# Archived rentals count in summaries, bitmaps and rollups (migration 0010),
+# so deleting them, e.g. with their cat or user, updates these like deleting
+# live rentals does. Archiving itself only inserts archived rentals.
+ARCHIVED_DELETE_TRIGGER = """
+CREATE FUNCTION cats_archived_rental_delete() RETURNS trigger AS $$
+DECLARE
+    cat_ids bigint[];
+    years integer[];
+BEGIN
+    PERFORM cats_refresh_rental_summaries(ARRAY(SELECT DISTINCT cat_id FROM old_rentals));
+
+    SELECT array_agg(rental.cat_id), array_agg(year) INTO cat_ids, years
+    FROM old_rentals rental
+    CROSS JOIN LATERAL generate_series(
+        extract(year FROM rental.rental_date)::integer,
+        extract(year FROM rental.return_date)::integer
+    ) AS year
+    WHERE rental.status IN (1, 2, 3);
+    PERFORM cats_refresh_availability(cat_ids, years);
+
+    INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+    SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+    FROM old_rentals rental
+    LEFT JOIN cats_cat cat ON cat.id = rental.cat_id
+    WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+    GROUP BY rental.cat_id, cat.breed_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cats_archived_rental_delete
+AFTER DELETE ON cats_archivedrental REFERENCING OLD TABLE AS old_rentals
+FOR EACH STATEMENT EXECUTE FUNCTION cats_archived_rental_delete();
+"""
+
+DROP_ARCHIVED_DELETE_TRIGGER = """
+DROP TRIGGER cats_archived_rental_delete ON cats_archivedrental;
+DROP FUNCTION cats_archived_rental_delete();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cats", "0010_archived_rentals"),
+    ]
+
+    operations = [
+        migrations.RunSQL(ARCHIVED_DELETE_TRIGGER, DROP_ARCHIVED_DELETE_TRIGGER),
+    ]
@@ -3,22 +3,118 @@ Models used in app
 """
 import datetime
 
+from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeBoundary, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+from psycopg2.extras import DateRange
+
+
+class DateRangeFunc(models.Func):
+    """PostgreSQL "daterange(lower, upper, bounds)" function"""
+
+    function = "DATERANGE"
+    output_field = DateRangeField()
+
+
+def rental_period():
+    """Closed [rental_date, return_date] period of a Rental, as used by its exclusion constraint"""
+
+    return DateRangeFunc(
+        "rental_date",
+        "return_date",
+        RangeBoundary(inclusive_lower=True, inclusive_upper=True),
+    )
+
+
+# Text search configuration of "cats_cat_search_vector" trigger (migration 0006)
+SEARCH_CONFIG = "english"
 
 
 class CatQuerySet(models.QuerySet):
-    def get_available_cats(self, rental_date, return_date):
+    def get_available_cats(self, rental_date, return_date, species_id=None):
         """
         Method in Cat QuerySet to filter out rented cats.
 
         Returns a list of cats available between given dates.
+        Any blocking rental overlapping the timeframe makes a cat unavailable,
+        busy cats are taken from the in-process availability index, through
+        the availability cache. Busy cats looked up can be narrowed down to a
+        species (the queryset should only hold its cats then). If there are
+        more than AVAILABILITY_MAX_EXCLUDED_IDS of them, they are filtered out
+        in the database instead (see "exclude_rented").
+        """
+        from cats.availability import cached_rented_cat_ids
+
+        busy_cat_ids = cached_rented_cat_ids(rental_date, return_date, species_id)
+        if len(busy_cat_ids) > settings.AVAILABILITY_MAX_EXCLUDED_IDS:
+            return self.exclude_rented(rental_date, return_date)
+        return self.exclude(pk__in=busy_cat_ids)
+
+    def exclude_rented(self, rental_date, return_date):
+        """
+        Filters out cats rented between given dates, checked in the database.
+
+        Same result as "get_available_cats", but done with NOT EXISTS on
+        overlapping rentals, so it fits querysets too big to pass busy cats ids
+        into the query (e.g. streaming the whole inventory).
         """
 
         return self.exclude(
-            rentals__rental_date__gte=rental_date, rentals__return_date__lte=return_date
+            models.Exists(
+                Rental.objects.blocking()
+                .overlapping(rental_date, return_date)
+                .filter(cat=models.OuterRef("pk"))
+            )
         )
 
+    def with_rental_summary(self):
+        """
+        Joins breed and species, and annotates dates of the cat's last rental
+        ("last_rental_date", "last_return_date"), so lists of cats are rendered
+        without additional queries per row.
+
+        Dates are taken from the cat's "CatRentalSummary", rentals aren't read.
+        """
+
+        return self.select_related("breed__species").annotate(
+            last_rental_date=models.F("rental_summary__last_rental_date"),
+            last_return_date=models.F("rental_summary__last_return_date"),
+        )
+
+    def search(self, phrase):
+        """
+        Filters cats by a search phrase typed in by a user.
+
+        Matches words of the cat's name, breed, species and description
+        (full-text, "web search" syntax) or any part of the name (e.g. "fluf"),
+        served by "cat_search_vector_idx" and "cat_name_trgm_idx" indexes.
+        An empty phrase leaves the queryset as it is.
+        """
+
+        phrase = phrase.strip()
+        if not phrase:
+            return self
+        return self.filter(
+            models.Q(
+                search_vector=SearchQuery(
+                    phrase, config=SEARCH_CONFIG, search_type="websearch"
+                )
+            )
+            | models.Q(name__icontains=phrase)
+        )
+
+
+class CatManager(models.Manager.from_queryset(CatQuerySet)):
+    def get_queryset(self):
+        # Only searched in the database, loading it would make every cat (and
+        # every cached one) carry its whole text search vector
+        return super().get_queryset().defer("search_vector")
+
 
 class Cat(models.Model):
     """Basic class for Cat objects"""
@@ -26,13 +122,28 @@ class Cat(models.Model):
     name = models.CharField(max_length=50)
     breed = models.ForeignKey("cats.Breed", on_delete=models.CASCADE)
     description = models.TextField(blank=True)
+    # Kept by a database trigger from name, description, breed and species names
+    search_vector = SearchVectorField(null=True, editable=False)
 
-    objects = CatQuerySet.as_manager()
+    objects = CatManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="cat_search_vector_idx"),
+            # "cat_name_trgm_idx" trigram index on UPPER(name), for "name__icontains",
+            # is created by migration 0006 - an index on an expression can't have
+            # an operator class here
+        ]
 
     def __str__(self):
         return f"{self.name} (ID: {self.id})"
 
 
+class BreedManager(models.Manager):
+    def get_by_natural_key(self, name, species_name):
+        return self.get(name=name, species__name=species_name)
+
+
 class Breed(models.Model):
     """Basic class for Breed objects"""
 
@@ -40,9 +151,21 @@ class Breed(models.Model):
     description = models.TextField(blank=True)
     species = models.ForeignKey("cats.Species", on_delete=models.CASCADE)
 
+    objects = BreedManager()
+
     def __str__(self):
         return self.name
 
+    def natural_key(self):
+        return (self.name,) + self.species.natural_key()
+
+    natural_key.dependencies = ["cats.species"]
+
+
+class SpeciesManager(models.Manager):
+    def get_by_natural_key(self, name):
+        return self.get(name=name)
+
 
 class Species(models.Model):
     """Basic class for Species objects"""
@@ -50,12 +173,36 @@ class Species(models.Model):
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
 
+    objects = SpeciesManager()
+
     class Meta:
         verbose_name_plural = "Species"
 
     def __str__(self):
         return self.name
 
+    def natural_key(self):
+        return (self.name,)
+
+
+class RentalQuerySet(models.QuerySet):
+    def blocking(self):
+        """Rentals which make a cat unavailable in their timeframes"""
+
+        return self.filter(status__in=Rental.BLOCKING_STATUSES)
+
+    def overlapping(self, date_from, date_to=None):
+        """
+        Rentals with period overlapping [date_from, date_to] ("date_to=None" means unbounded).
+
+        Uses "&&" on the same expression the exclusion constraint is built on,
+        so blocking rentals are looked up through its GiST index.
+        """
+
+        return self.annotate(period=rental_period()).filter(
+            period__overlap=DateRange(date_from, date_to, "[]")
+        )
+
 
 class Rental(models.Model):
     """Basic class for Rental objects"""
@@ -72,9 +219,13 @@ class Rental(models.Model):
         (FINISHED, "Finished"),
         (CANCELLED, "Cancelled"),
     )
-    cat = models.ForeignKey("Cat", on_delete=models.CASCADE, related_name="rentals")
+    BLOCKING_STATUSES = (PENDING, ACTIVE, FINISHED)
+    # Both foreign keys are indexed by composite indexes in Meta
+    cat = models.ForeignKey(
+        "Cat", on_delete=models.CASCADE, related_name="rentals", db_index=False
+    )
     user = models.ForeignKey(
-        "auth.User", on_delete=models.CASCADE, related_name="rentals"
+        "auth.User", on_delete=models.CASCADE, related_name="rentals", db_index=False
     )
     rental_date = models.DateField(null=True, blank=True)
     return_date = models.DateField(null=True, blank=True)
@@ -83,6 +234,44 @@ class Rental(models.Model):
         default=ACTIVE,
     )
 
+    objects = RentalQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Walked by "sweep_rentals" command, admin filters by status and dates
+            models.Index(fields=["status", "return_date"], name="rental_status_return_idx"),
+            models.Index(fields=["status", "rental_date"], name="rental_status_rental_idx"),
+            # Rentals of a cat and its last rental; replaces the plain "cat" foreign key index
+            models.Index(fields=["cat", "id"], name="rental_cat_id_idx"),
+            # Upcoming blocking rentals of a cat (availability checks)
+            models.Index(
+                fields=["cat", "return_date"],
+                name="rental_cat_blocking_idx",
+                # Rental.BLOCKING_STATUSES
+                condition=models.Q(status__in=(1, 2, 3)),
+            ),
+            # User's rentals history, in the order of its keyset pagination;
+            # replaces the plain "user" foreign key index
+            models.Index(
+                models.F("user"),
+                models.F("rental_date").desc(nulls_last=True),
+                models.F("id").desc(),
+                name="rental_user_history_idx",
+            ),
+        ]
+        constraints = [
+            # Database guarantees there are no double-bookings of a cat
+            ExclusionConstraint(
+                name="exclude_overlapping_rentals",
+                expressions=[
+                    (rental_period(), RangeOperators.OVERLAPS),
+                    ("cat", RangeOperators.EQUAL),
+                ],
+                # Rental.BLOCKING_STATUSES: PENDING, ACTIVE, FINISHED
+                condition=models.Q(status__in=(1, 2, 3)),
+            ),
+        ]
+
     def clean(self):
         super().clean()
         if self.rental_date < datetime.date.today():
@@ -90,11 +279,241 @@ class Rental(models.Model):
         if self.rental_date > self.return_date:
             raise ValidationError('"Return date" must be further than "return from"')
 
-        # If cat won't be found in available cats queryset - raise error
-        if not Cat.objects.get_available_cats(
-            self.rental_date, self.return_date
-        ).filter(pk=self.cat.pk):
+        # If any other rental of the cat overlaps given dates - raise error.
+        # Checked against the in-process index, "exclude_overlapping_rentals"
+        # constraint stays the final guard against concurrent bookings.
+        from cats.availability import availability_index
+
+        if self.status in self.BLOCKING_STATUSES and not availability_index.is_available(
+            self.cat_id, self.rental_date, self.return_date, exclude_rental=self.pk
+        ):
             raise ValidationError("Cat is not available in given timeframes")
 
     def __str__(self):
         return f"Rental {self.id} ({self.cat.name})"
+
+
+class ArchivedRental(models.Model):
+    """
+    Rental in a terminal status (finished, cancelled), moved out of the
+    rentals table by "archive_rentals" command once it's long past.
+
+    Keeps the rental's id. Booking-time queries read only live rentals,
+    rentals' history (user's rentals, summaries, utilization, calendars)
+    reads both tables, the database through "cats_rental_history" view
+    (see migration 0010).
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    # Both foreign keys are indexed by composite indexes in Meta
+    cat = models.ForeignKey(
+        "Cat", on_delete=models.CASCADE, related_name="archived_rentals", db_index=False
+    )
+    user = models.ForeignKey(
+        "auth.User",
+        on_delete=models.CASCADE,
+        related_name="archived_rentals",
+        db_index=False,
+    )
+    rental_date = models.DateField(null=True, blank=True)
+    return_date = models.DateField(null=True, blank=True)
+    status = models.PositiveSmallIntegerField(choices=Rental.STATUS)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Rentals of a cat in a period (summaries, rollups, calendars)
+            models.Index(fields=["cat", "rental_date"], name="archived_rental_cat_idx"),
+            # User's rentals history, merged with live rentals in the same order
+            models.Index(
+                models.F("user"),
+                models.F("rental_date").desc(nulls_last=True),
+                models.F("id").desc(),
+                name="archived_user_history_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived rental {self.id} ({self.cat.name})"
+
+
+class OutboxEmail(models.Model):
+    """
+    E-mail queued to be sent by "send_outbox" command.
+
+    Written in the same transaction as the object it's about, so a mail is
+    queued if and only if that transaction commits.
+    """
+
+    PENDING = 0
+    SENT = 1
+    FAILED = 2
+    STATUS = (
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.EmailField()
+    rental = models.ForeignKey(
+        "Rental", on_delete=models.SET_NULL, null=True, blank=True, related_name="emails"
+    )
+    status = models.PositiveSmallIntegerField(choices=STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"E-mail {self.id} to {self.recipient} ({self.get_status_display()})"
+
+
+class UtilizationChange(models.Model):
+    """
+    Period of a cat's days whose utilization rollups are out of date.
+
+    Written by triggers on every statement inserting, updating or deleting
+    rentals and on cats moved to another breed (one row per cat, breed and
+    statement, see migration 0007), consumed by "refresh_utilization" command.
+    """
+
+    # Not foreign keys - the cat may be deleted in the meantime. Breed of the
+    # cat when it changed, its rollups are out of date too.
+    cat_id = models.BigIntegerField()
+    breed_id = models.BigIntegerField(null=True)
+    date_from = models.DateField()
+    date_to = models.DateField()
+
+
+class CatDayUtilization(models.Model):
+    """
+    Daily rollup of rentals: number of a cat's rentals in a status on a day.
+
+    Rentals without both dates aren't counted. Reports read this table
+    instead of expanding rentals into days (see cats.utilization).
+    """
+
+    # Indexed by the unique constraint
+    cat = models.ForeignKey(
+        "Cat", on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    day = models.DateField()
+    status = models.PositiveSmallIntegerField(choices=Rental.STATUS)
+    rentals = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cat", "day", "status"], name="cat_day_utilization_unique"
+            ),
+        ]
+        indexes = [
+            # Reports over a period
+            models.Index(fields=["day", "status"], name="utilization_day_idx"),
+        ]
+
+
+class BreedDayUtilization(models.Model):
+    """
+    Daily rollup of "CatDayUtilization" per breed: number of the breed's cats
+    with rentals in a status on a day, and the number of those rentals.
+    """
+
+    # Indexed by the unique constraint
+    breed = models.ForeignKey(
+        "Breed", on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    day = models.DateField()
+    status = models.PositiveSmallIntegerField(choices=Rental.STATUS)
+    cats = models.PositiveIntegerField()
+    rentals = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["breed", "day", "status"], name="breed_day_utilization_unique"
+            ),
+        ]
+        indexes = [
+            # Reports over a period
+            models.Index(fields=["day", "status"], name="breed_utilization_day_idx"),
+        ]
+
+
+class DayBitmapField(models.Field):
+    """
+    Days of a year as PostgreSQL "bit(366)", a string of "0" and "1" in Python.
+
+    Day "n" of the year (January 1st is 0) is the n-th character.
+    """
+
+    def db_type(self, connection):
+        return "bit(366)"
+
+
+class CatAvailabilityYear(models.Model):
+    """
+    Busy days of a cat in a year: "1" on days covered by its blocking rentals.
+
+    Kept by triggers on rentals (see migration 0008), years without blocking
+    rentals have no row. Rentals without both dates aren't included.
+    Calendars read months of any number of cats from it (see cats.calendars).
+    """
+
+    # Indexed by the unique constraint
+    cat = models.ForeignKey(
+        "Cat", on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    year = models.PositiveSmallIntegerField()
+    busy_days = DayBitmapField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cat", "year"], name="cat_availability_year_unique"
+            ),
+        ]
+
+
+class CatRentalSummary(models.Model):
+    """
+    Rentals of a cat summed up, so lists of cats are sorted and rendered
+    without reading rentals.
+
+    Created with the cat and kept by triggers on rentals in the same
+    transaction (see migration 0009). "last_*" dates are of the latest rental.
+    "next_booked_date" is the first day from today the cat is booked (today
+    means rented now); it goes out of date as days pass, so passed ones are
+    refreshed daily by "refresh_rental_summaries" command.
+    """
+
+    cat = models.OneToOneField(
+        "Cat",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rental_summary",
+    )
+    total_rentals = models.PositiveIntegerField(default=0)
+    active_rentals = models.PositiveIntegerField(default=0)
+    last_rental_date = models.DateField(null=True)
+    last_return_date = models.DateField(null=True)
+    next_booked_date = models.DateField(null=True)
+
+    class Meta:
+        indexes = [
+            # Cats by popularity and by availability
+            models.Index(
+                fields=["total_rentals", "cat"], name="cat_summary_popularity_idx"
+            ),
+            models.Index(
+                fields=["next_booked_date", "cat"], name="cat_summary_next_booked_idx"
+            ),
+        ]
@@ -0,0 +1,158 @@
+"""
+Database-backed e-mail outbox
+
+Views only queue e-mails (cheap INSERT in their own transaction),
+"send_outbox" management command delivers them in batches.
+"""
+import datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from cats.models import OutboxEmail
+
+
+def queue_email(subject, body, recipient, rental=None):
+    """Adds an e-mail to the outbox, nothing is sent here"""
+
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient=recipient,
+        rental=rental,
+    )
+
+
+def queue_rental_confirmation(rental):
+    """Queues "cat rented" confirmation for the user who rented the cat"""
+
+    if not rental.user.email:
+        return None
+    body = render_to_string(
+        "cats/congrats_mail_template.html", {"cat": rental.cat, "rental": rental}
+    )
+    return queue_email("Congrats, cat rented!", body, rental.user.email, rental=rental)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 1, 2, 4, ... minutes, capped by OUTBOX_MAX_RETRY_DELAY seconds"""
+
+    seconds = min(60 * 2 ** (attempts - 1), settings.OUTBOX_MAX_RETRY_DELAY)
+    return datetime.timedelta(seconds=seconds)
+
+
+def due_batch(batch_size):
+    """Locks a batch of due e-mails, skipping ones locked by other workers"""
+
+    return list(
+        OutboxEmail.objects.select_for_update(skip_locked=True)
+        .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now())
+        .order_by("next_attempt_at", "pk")[:batch_size]
+    )
+
+
+def record_failure(email, error, max_attempts):
+    """Postpones an e-mail after an unsuccessful attempt, or gives it up after "max_attempts" """
+
+    email.last_error = repr(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+
+def save_attempt(email):
+    """Saves fields changed by a delivery attempt"""
+
+    email.save(update_fields=["status", "attempts", "next_attempt_at", "last_error", "sent_at"])
+
+
+def fail_batch(error, batch_size, max_attempts):
+    """
+    Records an unsuccessful attempt for a batch of due e-mails which can't be
+    sent at all (e.g. the mail server is unreachable). Returns (0, failed)
+    numbers, like "send_batch".
+    """
+
+    with transaction.atomic():
+        emails = due_batch(batch_size)
+        for email in emails:
+            email.attempts += 1
+            record_failure(email, error, max_attempts)
+            save_attempt(email)
+    return 0, len(emails)
+
+
+def send_batch(connection, batch_size, max_attempts):
+    """
+    Sends a batch of due e-mails through an already opened connection.
+
+    Rows are locked with SKIP LOCKED, so several workers may drain the outbox.
+    Returns (sent, failed) numbers.
+    """
+
+    sent = failed = 0
+    with transaction.atomic():
+        emails = due_batch(batch_size)
+        for email in emails:
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                email.from_email or None,
+                [email.recipient],
+                connection=connection,
+            )
+            email.attempts += 1
+            try:
+                message.send()
+            except Exception as error:  # any backend error means "try again later"
+                failed += 1
+                record_failure(email, error, max_attempts)
+                # Connection may be broken now, reopen it for the next messages.
+                # If it can't be opened, sending the next message reports it.
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception:
+                    pass
+            else:
+                sent += 1
+                email.status = OutboxEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ""
+            save_attempt(email)
+    return sent, failed
+
+
+def drain(batch_size=100, max_attempts=5, connection=None):
+    """Sends all due e-mails in batches over a single connection"""
+
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now()
+    )
+    if not due.exists():
+        return 0, 0
+
+    connection = connection or get_connection()
+    total_sent = total_failed = 0
+    try:
+        connection.open()
+        send = partial(send_batch, connection)
+    except Exception as error:  # e.g. mail server unreachable
+        # Nothing can be sent, all due e-mails get a failed attempt and back off
+        send = partial(fail_batch, error)
+    try:
+        while True:
+            sent, failed = send(batch_size, max_attempts)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                break
+    finally:
+        connection.close()
+    return total_sent, total_failed
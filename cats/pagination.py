@@ -0,0 +1,189 @@
+"""
+Keyset (cursor) pagination used in cats and rentals lists
+
+Pages are fetched with "WHERE (key, id) > (last_key, last_id)" instead of
+OFFSET, so every page costs the same no matter how deep it is. Position of
+the last row, together with any state needed to rebuild the list (e.g. POSTed
+search dates), is kept in a signed, opaque cursor token. Tokens are signed
+per key, so a cursor of one list isn't accepted by a list sorted by another
+key.
+"""
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = "cats.pagination.cursor"
+
+
+class InvalidCursor(Exception):
+    """Cursor token was tampered with or is malformed"""
+
+
+def encode_cursor(key, position, state=None):
+    """Packs last row position in a list sorted by "key" and list state into an opaque token"""
+
+    return signing.dumps(
+        {"p": [serialize_value(value) for value in position], "s": state or {}},
+        salt=f"{CURSOR_SALT}:{key}",
+        compress=True,
+    )
+
+
+def decode_cursor(key, token):
+    """Returns (position, state) stored in a token created by "encode_cursor" for "key" """
+
+    try:
+        payload = signing.loads(token, salt=f"{CURSOR_SALT}:{key}")
+        return payload["p"], payload["s"]
+    except (signing.BadSignature, KeyError, TypeError) as error:
+        raise InvalidCursor(str(error)) from error
+
+
+def serialize_value(value):
+    """Dates are stored as ISO strings, Django converts them back in lookups and forms"""
+
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def form_state(form):
+    """Cleaned data of a valid form, in a shape which can be kept in a cursor"""
+
+    return {
+        name: serialize_value(value)
+        for name, value in form.cleaned_data.items()
+        if value is not None
+    }
+
+
+@dataclass
+class KeysetPage:
+    """Single page of objects with a token pointing to the next one"""
+
+    object_list: list
+    next_cursor: str = None
+    state: dict = field(default_factory=dict)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset ordered by ("key", "pk").
+
+    NULL keys are always sorted last, in both directions.
+    """
+
+    def __init__(self, queryset, key, per_page, descending=False):
+        self.queryset = queryset
+        self.key = key
+        self.per_page = per_page
+        self.descending = descending
+
+    def _ordered(self, queryset=None):
+        queryset = self.queryset if queryset is None else queryset
+        key = F(self.key)
+        if self.descending:
+            return queryset.order_by(key.desc(nulls_last=True), "-pk")
+        return queryset.order_by(key.asc(nulls_last=True), "pk")
+
+    def _after(self, position):
+        last_key, last_pk = position
+        direction = "lt" if self.descending else "gt"
+        next_pk = Q(**{f"pk__{direction}": last_pk})
+        if last_key is None:
+            return Q(**{f"{self.key}__isnull": True}) & next_pk
+        return (
+            Q(**{f"{self.key}__{direction}": last_key})
+            | (Q(**{self.key: last_key}) & next_pk)
+            | Q(**{f"{self.key}__isnull": True})
+        )
+
+    def _rows(self, queryset, position):
+        """Rows of the page, and one additional row to know if there's a next page"""
+
+        queryset = self._ordered(queryset)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        return list(queryset[: self.per_page + 1])
+
+    def _page(self, object_list, state):
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[: self.per_page]
+            last = object_list[-1]
+            next_cursor = encode_cursor(
+                self.key, (getattr(last, self.key), last.pk), state=state
+            )
+        return KeysetPage(object_list, next_cursor, state or {})
+
+    def page(self, position=None, state=None):
+        """Returns the page which starts right after given position"""
+
+        return self._page(self._rows(self.queryset, position), state)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """
+    Paginates several querysets (e.g. rentals and archived rentals) as a
+    single list ordered by ("key", "pk"). Primary keys must be unique across
+    all of them.
+
+    Every queryset is read with its own keyset query, the page is merged
+    from their rows.
+    """
+
+    def __init__(self, querysets, key, per_page, descending=False):
+        super().__init__(None, key, per_page, descending)
+        self.querysets = querysets
+
+    def page(self, position=None, state=None):
+        """Returns the page which starts right after given position"""
+
+        rows = [row for queryset in self.querysets for row in self._rows(queryset, position)]
+        keyed = [row for row in rows if getattr(row, self.key) is not None]
+        nulls = [row for row in rows if getattr(row, self.key) is None]
+        # NULL keys last, like in "_ordered"
+        object_list = sorted(
+            keyed, key=lambda row: (getattr(row, self.key), row.pk), reverse=self.descending
+        ) + sorted(nulls, key=lambda row: row.pk, reverse=self.descending)
+        return self._page(object_list[: self.per_page + 1], state)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for huge tables, counting rows from PostgreSQL statistics.
+
+    An exact COUNT(*) of millions of rows reads the whole table, so for
+    unfiltered querysets the planner's estimate (pg_class.reltuples) is used
+    when it's over ESTIMATED_COUNT_THRESHOLD. Filtered querysets, small tables
+    and other databases are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+            # Tables never analyzed report -1
+            if row and row[0] > settings.ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
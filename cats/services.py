@@ -0,0 +1,194 @@
+"""
+Business operations on Rentals
+"""
+import logging
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef
+
+from cats import cache
+from cats.availability import availability_index, invalidate_rented_cat_ids
+from cats.models import Cat, OutboxEmail, Rental
+from cats.outbox import queue_rental_confirmation
+
+logger = logging.getLogger(__name__)
+
+NOT_AVAILABLE = "Cat is not available in given timeframes"
+
+# Moved in one statement: rental triggers (summaries, bitmaps, utilization)
+# fire at its end and find the rentals in "cats_rental_history" unchanged
+ARCHIVE_SQL = """
+WITH moved AS (
+    DELETE FROM cats_rental WHERE id = ANY(%s)
+    RETURNING id, cat_id, user_id, rental_date, return_date, status
+)
+INSERT INTO cats_archivedrental
+    (id, cat_id, user_id, rental_date, return_date, status, archived_at)
+SELECT id, cat_id, user_id, rental_date, return_date, status, now() FROM moved
+"""
+
+ARCHIVED_STATUSES = (Rental.FINISHED, Rental.CANCELLED)
+
+
+def book_cat(cat_id, user, rental_date, return_date, status=Rental.ACTIVE):
+    """
+    Rents a cat for the user, safe against concurrent bookings.
+
+    The cat row is locked (SELECT ... FOR UPDATE) and checked for overlapping
+    rentals in the same query, then the rental and its confirmation e-mail are
+    inserted - all in one transaction. Concurrent bookings of the same cat wait
+    for each other instead of both passing the check.
+
+    Raises Cat.DoesNotExist for unknown cats and ValidationError if the cat is
+    already rented in given timeframes.
+    """
+
+    overlapping = (
+        Rental.objects.blocking()
+        .overlapping(rental_date, return_date)
+        .filter(cat=OuterRef("pk"))
+    )
+    try:
+        with transaction.atomic():
+            cat = (
+                Cat.objects.select_for_update(of=("self",))
+                .annotate(is_rented=Exists(overlapping))
+                .get(pk=cat_id)
+            )
+            if cat.is_rented and status in Rental.BLOCKING_STATUSES:
+                raise ValidationError(NOT_AVAILABLE)
+
+            rental = Rental.objects.create(
+                cat=cat,
+                user=user,
+                rental_date=rental_date,
+                return_date=return_date,
+                status=status,
+            )
+            queue_rental_confirmation(rental)
+    except IntegrityError as error:
+        # Overlapping rental written by someone not taking the lock (e.g. admin)
+        if "exclude_overlapping_rentals" not in str(error):
+            raise
+        raise ValidationError(NOT_AVAILABLE) from error
+    return rental
+
+
+def update_rentals_status(queryset, status, chunk_size=1000, progress=None):
+    """
+    Sets status of all rentals in the queryset, in chunks of "chunk_size" rows.
+
+    Each chunk is a separate short transaction, so a huge update never locks
+    the whole table for long. "progress(updated)" is called after every chunk.
+    Returns the number of updated rentals. IntegrityError (e.g. restoring
+    overlapping cancelled rentals) stops the update, previous chunks stay updated.
+    """
+
+    updated = 0
+    chunk = []
+
+    def flush():
+        nonlocal updated
+        pks = [pk for pk, *_rental in chunk]
+        with transaction.atomic():
+            updated += Rental.objects.filter(pk__in=pks).update(status=status)
+        # update() sends no signals - drop derived data of affected cats here
+        for cat_id in {cat_id for _pk, cat_id, *_rental in chunk}:
+            availability_index.invalidate(cat_id)
+            transaction.on_commit(partial(availability_index.invalidate, cat_id))
+            transaction.on_commit(partial(cache.invalidate_cat, cat_id))
+        # Only rentals which started or stopped blocking their cat
+        periods = [
+            (cat_id, rental_date, return_date)
+            for _pk, cat_id, rental_date, return_date, old_status in chunk
+            if (old_status in Rental.BLOCKING_STATUSES) != (status in Rental.BLOCKING_STATUSES)
+        ]
+        transaction.on_commit(partial(invalidate_rented_cat_ids, periods))
+        chunk.clear()
+        logger.info("Updated status of %s rentals", updated)
+        if progress:
+            progress(updated)
+
+    rows = (
+        queryset.order_by("pk")
+        .values_list("pk", "cat_id", "rental_date", "return_date", "status")
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return updated
+
+
+def sweep_rentals(status, new_status, before, batch_size=1000, max_batches=None):
+    """
+    Moves rentals with "status" and return date before "before" to "new_status".
+
+    Walks (status, return_date) index in batches, each in its own short
+    transaction. Rows locked by someone else are skipped (SKIP LOCKED) and
+    picked up by a later run, so it never waits for live traffic.
+    Returns the number of moved rentals.
+    """
+
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                Rental.objects.select_for_update(skip_locked=True)
+                .filter(status=status, return_date__lt=before)
+                .order_by("return_date")
+                .values_list("pk", "cat_id", "rental_date", "return_date")[:batch_size]
+            )
+            if not rows:
+                break
+            moved += Rental.objects.filter(pk__in=[pk for pk, *_rental in rows]).update(
+                status=new_status
+            )
+        batches += 1
+        for cat_id in {cat_id for _pk, cat_id, *_dates in rows}:
+            availability_index.invalidate(cat_id)
+            transaction.on_commit(partial(availability_index.invalidate, cat_id))
+            transaction.on_commit(partial(cache.invalidate_cat, cat_id))
+        if (status in Rental.BLOCKING_STATUSES) != (new_status in Rental.BLOCKING_STATUSES):
+            periods = [tuple(rental) for _pk, *rental in rows]
+            transaction.on_commit(partial(invalidate_rented_cat_ids, periods))
+        if len(rows) < batch_size:
+            break
+    return moved
+
+
+def archive_rentals(before, batch_size=1000, max_batches=None):
+    """
+    Moves finished and cancelled rentals returned before "before" to archived
+    rentals, leaving the rentals table with current and future ones.
+
+    Batches are walked and locked like in "sweep_rentals". Archived rentals
+    are past, so there is nothing to invalidate: availability of today and
+    later doesn't change. Returns the number of archived rentals.
+    """
+
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            ids = list(
+                Rental.objects.select_for_update(skip_locked=True)
+                .filter(status__in=ARCHIVED_STATUSES, return_date__lt=before)
+                .order_by("return_date")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Foreign key is SET_NULL on Django's side only
+            OutboxEmail.objects.filter(rental_id__in=ids).update(rental=None)
+            with connection.cursor() as cursor:
+                cursor.execute(ARCHIVE_SQL, [ids])
+                archived += cursor.rowcount
+        batches += 1
+        if len(ids) < batch_size:
+            break
+    return archived
@@ -0,0 +1,111 @@
+"""
+Signal handlers keeping derived data in sync with Rentals
+
+Shared caches are invalidated once the change commits: invalidated any
+earlier, a concurrent request (or a lagging replica) could cache the old
+data again before the commit.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from cats import cache
+from cats.availability import availability_index, invalidate_rented_cat_ids
+from cats.models import Breed, Cat, Rental, Species
+
+
+@receiver([post_save, post_delete], sender=Rental)
+def invalidate_cat_availability(sender, instance, **kwargs):
+    """
+    Rental changed - cat's intervals in the availability index are outdated.
+
+    Invalidated again on commit: reloaded in between (e.g. by another thread),
+    the cat's intervals would miss the uncommitted change until the index expires.
+    """
+
+    availability_index.invalidate(instance.cat_id)
+    transaction.on_commit(partial(availability_index.invalidate, instance.cat_id))
+
+
+@receiver([post_save, post_delete], sender=Species)
+@receiver([post_save, post_delete], sender=Breed)
+def invalidate_catalog(sender, instance, **kwargs):
+    """Species and breeds are shown along with every cat - whole catalogue cache is outdated"""
+
+    transaction.on_commit(cache.bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Cat)
+def invalidate_cached_cat(sender, instance, **kwargs):
+    transaction.on_commit(partial(cache.invalidate_cat, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Rental)
+def invalidate_cached_rental_cat(sender, instance, **kwargs):
+    transaction.on_commit(partial(cache.invalidate_cat, instance.cat_id))
+
+
+RENTAL_PERIOD_FIELDS = ("cat_id", "rental_date", "return_date", "status")
+
+
+def blocking_period(instance_values):
+    """(cat_id, rental_date, return_date) of a blocking rental, None for others"""
+
+    cat_id, rental_date, return_date, status = instance_values
+    if status not in Rental.BLOCKING_STATUSES:
+        return None
+    return cat_id, rental_date, return_date
+
+
+def rental_period(rental):
+    # Read from __dict__, deferred fields would be fetched one by one
+    return blocking_period(tuple(rental.__dict__.get(field) for field in RENTAL_PERIOD_FIELDS))
+
+
+def invalidate_rented_cats_on_commit(periods):
+    periods = [period for period in set(periods) if period is not None]
+    if periods:
+        transaction.on_commit(lambda: invalidate_rented_cat_ids(periods))
+
+
+@receiver(post_init, sender=Rental)
+def remember_rental_period(sender, instance, **kwargs):
+    instance._loaded_period = rental_period(instance)
+
+
+@receiver(post_save, sender=Rental)
+def invalidate_saved_rental_availability(sender, instance, created, **kwargs):
+    """Cached availability of windows overlapping rental's old or new period is outdated"""
+
+    period = rental_period(instance)
+    if created:
+        invalidate_rented_cats_on_commit([period])
+    elif period != instance._loaded_period:
+        invalidate_rented_cats_on_commit([period, instance._loaded_period])
+    instance._loaded_period = period
+
+
+@receiver(post_delete, sender=Rental)
+def invalidate_deleted_rental_availability(sender, instance, **kwargs):
+    invalidate_rented_cats_on_commit([rental_period(instance)])
+
+
+@receiver(post_init, sender=Cat)
+def remember_cat_breed(sender, instance, **kwargs):
+    instance._loaded_breed_id = instance.__dict__.get("breed_id")
+
+
+@receiver(post_save, sender=Cat)
+def invalidate_moved_cat_availability(sender, instance, created, **kwargs):
+    """Cached availability of the species a cat moved to doesn't know its rentals"""
+
+    if created or instance._loaded_breed_id == instance.breed_id:
+        return
+    instance._loaded_breed_id = instance.breed_id
+    species_id = (
+        Breed.objects.filter(pk=instance.breed_id).values_list("species_id", flat=True).first()
+    )
+    if species_id is not None:
+        transaction.on_commit(partial(cache.invalidate_species_availability, species_id))
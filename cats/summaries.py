@@ -0,0 +1,90 @@
+"""
+Rental summaries of cats ("CatRentalSummary")
+
+Triggers keep summaries up to date in the transaction writing rentals,
+computing them with "cats_compute_rental_summaries" SQL function (see
+migration 0009). Here summaries are refreshed in batches - the daily refresh
+of passed "next_booked_date" and full rebuilds - and checked against
+rentals with the same function.
+"""
+import datetime
+
+from django.db import connection, transaction
+
+from cats.models import Cat
+
+SUMMARY_COLUMNS = (
+    "total_rentals",
+    "active_rentals",
+    "last_rental_date",
+    "last_return_date",
+    "next_booked_date",
+)
+
+CREATE_MISSING_SQL = f"""
+INSERT INTO cats_catrentalsummary (cat_id, {", ".join(SUMMARY_COLUMNS)})
+SELECT * FROM cats_compute_rental_summaries(%s::bigint[])
+ON CONFLICT (cat_id) DO NOTHING
+"""
+
+REFRESH_SQL = "SELECT cats_refresh_rental_summaries(%s::bigint[])"
+
+OUT_OF_DATE_SQL = f"""
+SELECT fresh.cat_id
+FROM cats_compute_rental_summaries(%s::bigint[]) fresh
+LEFT JOIN cats_catrentalsummary summary ON summary.cat_id = fresh.cat_id
+WHERE summary.cat_id IS NULL
+OR ({", ".join(f"summary.{column}" for column in SUMMARY_COLUMNS)})
+    IS DISTINCT FROM ({", ".join(f"fresh.{column}" for column in SUMMARY_COLUMNS)})
+ORDER BY fresh.cat_id
+"""
+
+
+def cat_id_batches(queryset, batch_size):
+    """Lists of cat ids of the queryset, walked by primary key"""
+
+    last = None
+    while True:
+        batch = queryset.order_by("pk")
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        ids = list(batch.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def refresh_rental_summaries(all_cats=False, batch_size=1000):
+    """
+    Recomputes summaries with a passed "next_booked_date", or of all cats
+    (creating missing ones) if "all_cats" is set.
+
+    Each batch of "batch_size" cats is refreshed in its own short transaction.
+    Returns the number of changed summaries.
+    """
+
+    if all_cats:
+        cats = Cat.objects.all()
+    else:
+        cats = Cat.objects.filter(rental_summary__next_booked_date__lt=datetime.date.today())
+
+    refreshed = 0
+    for cat_ids in cat_id_batches(cats, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if all_cats:
+                cursor.execute(CREATE_MISSING_SQL, [cat_ids])
+                refreshed += cursor.rowcount
+            cursor.execute(REFRESH_SQL, [cat_ids])
+            refreshed += cursor.fetchone()[0]
+    return refreshed
+
+
+def out_of_date_summaries(batch_size=1000):
+    """Yields ids of cats whose summary is missing or doesn't match their rentals"""
+
+    for cat_ids in cat_id_batches(Cat.objects.all(), batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(OUT_OF_DATE_SQL, [cat_ids])
+            for (cat_id,) in cursor.fetchall():
+                yield cat_id
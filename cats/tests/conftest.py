@@ -1,8 +1,37 @@
 import pytest
+from django.core.cache import cache
 
+from cats.availability import availability_index
 from cats.tests.factories import RentalFactory
 
 
+@pytest.fixture(autouse=True)
+def fresh_availability_index():
+    """
+    Forgets in-process availability data between tests (rolled back rentals don't send signals)
+    """
+    availability_index.invalidate()
+    yield
+    availability_index.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """
+    Cached catalogue would outlive rolled back test data
+    """
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def primary_reads_only(settings):
+    """
+    Replicas mirror the test database through other connections, which don't
+    see data of a test's transaction - routing tests enable them explicitly
+    """
+    settings.DATABASE_REPLICAS = []
+
+
 @pytest.fixture()
 def rental_factory_fixture(db):
     """
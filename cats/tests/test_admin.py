@@ -0,0 +1,204 @@
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+
+from cats.availability import availability_index
+from cats.models import Rental
+from cats.pagination import EstimatedCountPaginator
+from cats.services import archive_rentals
+from cats.tests.factories import BreedFactory, CatFactory, RentalFactory
+
+
+@pytest.fixture()
+def admin_client(client, db):
+    user = User.objects.create_superuser("admin", "admin@example.com", "password")
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.django_db
+def test_update_status_action_in_chunks(admin_client, settings):
+    """
+    Test if "update status" action updates all selected rentals, chunk by chunk
+    """
+    settings.ADMIN_BULK_UPDATE_CHUNK_SIZE = 2
+    rentals = [RentalFactory(status=Rental.ACTIVE) for _ in range(5)]
+    untouched = RentalFactory(status=Rental.ACTIVE)
+    url = reverse("admin:cats_rental_changelist")
+    data = {
+        "action": "update_status",
+        "_selected_action": [rental.pk for rental in rentals],
+    }
+
+    response = admin_client.post(url, data)
+    assert response.status_code == 200
+    assert len(response.context["rentals"]) == 5
+
+    response = admin_client.post(
+        url, {**data, "submit": "1", "status": Rental.FINISHED}, follow=True
+    )
+
+    assert "Changed status for 5 rentals" in response.content.decode()
+    assert set(Rental.objects.filter(status=Rental.FINISHED)) == set(rentals)
+    assert Rental.objects.get(pk=untouched.pk).status == Rental.ACTIVE
+
+
+@pytest.mark.django_db
+def test_update_status_rejects_unknown_status(admin_client):
+    """
+    Test if statuses out of Rental.STATUS are rejected
+    """
+    rental = RentalFactory(status=Rental.ACTIVE)
+
+    admin_client.post(
+        reverse("admin:cats_rental_changelist"),
+        {
+            "action": "update_status",
+            "_selected_action": [rental.pk],
+            "submit": "1",
+            "status": "9",
+        },
+    )
+
+    assert Rental.objects.get(pk=rental.pk).status == Rental.ACTIVE
+
+
+@pytest.mark.django_db
+def test_rental_rejected_by_database_is_shown_again(admin_client):
+    """
+    Test if a rental overlapping one the availability index doesn't know yet
+    (e.g. booked by another process) gets a form error instead of a server error
+    """
+    cat = CatFactory()
+    today = datetime.date.today()
+    assert availability_index.is_available(cat.pk, today, today)
+    Rental.objects.bulk_create(
+        [Rental(cat=cat, user=User.objects.get(), rental_date=today, status=Rental.ACTIVE)]
+    )
+
+    response = admin_client.post(
+        reverse("admin:cats_rental_add"),
+        {
+            "cat": cat.pk,
+            "user": User.objects.get().pk,
+            "rental_date": today + datetime.timedelta(days=7),
+            "return_date": today + datetime.timedelta(days=8),
+            "status": Rental.PENDING,
+        },
+    )
+
+    assert response.status_code == 200
+    assert "Cat is not available in given timeframes" in response.content.decode()
+    assert Rental.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_rental_changelist_queries_dont_depend_on_rows(
+    admin_client, django_assert_max_num_queries
+):
+    """
+    Test if users and cats of listed rentals are joined, not queried row by row
+    """
+    for _ in range(20):
+        RentalFactory()
+
+    with django_assert_max_num_queries(10):
+        response = admin_client.get(reverse("admin:cats_rental_changelist"))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_estimated_count_for_big_unfiltered_tables(settings):
+    """
+    Test if planner's estimate is used for unfiltered querysets over the threshold only
+    """
+    settings.ESTIMATED_COUNT_THRESHOLD = 2
+    for _ in range(3):
+        RentalFactory()
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE cats_rental")
+
+    assert EstimatedCountPaginator(Rental.objects.order_by("pk"), 10).count == 3
+    assert EstimatedCountPaginator(Rental.objects.filter(pk=0).order_by("pk"), 10).count == 0
+
+    settings.ESTIMATED_COUNT_THRESHOLD = 100
+    RentalFactory()
+    assert EstimatedCountPaginator(Rental.objects.order_by("pk"), 10).count == 4
+
+
+@pytest.mark.django_db
+def test_cats_changelist_search(admin_client):
+    """
+    Test if admin searches cats by id, or by breed through the cat search
+    """
+    cat = CatFactory(breed=BreedFactory(name="Bengal"))
+    other = CatFactory()
+    url = reverse("admin:cats_cat_changelist")
+
+    response = admin_client.get(url, {"q": "bengal"})
+    assert list(response.context["cl"].result_list) == [cat]
+
+    response = admin_client.get(url, {"q": str(other.pk)})
+    assert other in response.context["cl"].result_list
+
+
+@pytest.mark.django_db
+def test_cats_changelist_sorted_by_rentals(admin_client):
+    """
+    Test if cats sorted by their number of rentals are all listed, most rented first
+    """
+    today, yesterday = datetime.date.today(), datetime.date.today() - datetime.timedelta(days=1)
+    popular = RentalFactory(rental_date=today, return_date=today).cat
+    RentalFactory(cat=popular, rental_date=yesterday, return_date=yesterday)
+    rented, never_rented = RentalFactory().cat, CatFactory()
+    url = reverse("admin:cats_cat_changelist")
+
+    # Column 4 of "list_display"
+    response = admin_client.get(url, {"o": "-4"})
+
+    assert list(response.context["cl"].result_list) == [popular, rented, never_rented]
+    # Walkable in "cat_summary_popularity_idx" order, see "CatChangeList"
+    assert 'INNER JOIN "cats_catrentalsummary"' in str(response.context["cl"].queryset.query)
+
+
+@pytest.mark.django_db
+def test_archived_rentals_changelist(admin_client):
+    """
+    Test if archived rentals are listed and searched in admin, but can't be changed
+    """
+    rental = RentalFactory(status=Rental.FINISHED)
+    archive_rentals(rental.return_date + datetime.timedelta(days=1))
+    url = reverse("admin:cats_archivedrental_changelist")
+
+    response = admin_client.get(url, {"q": rental.cat.name})
+
+    assert [archived.pk for archived in response.context["cl"].result_list] == [rental.pk]
+    assert not response.context["has_add_permission"]
+    response = admin_client.get(reverse("admin:cats_archivedrental_change", args=[rental.pk]))
+    assert response.context["has_change_permission"] is False
+
+
+@pytest.mark.django_db
+def test_archived_rentals_are_linked(admin_client):
+    """
+    Test if rentals list links to archived rentals with its search, and cats
+    and users link to their archived rentals
+    """
+    rental = RentalFactory(status=Rental.FINISHED)
+    archive_rentals(rental.return_date + datetime.timedelta(days=1))
+
+    response = admin_client.get(reverse("admin:cats_rental_changelist"), {"q": rental.cat.name})
+    response = admin_client.get(response.context["archived_rentals_url"])
+    assert [archived.pk for archived in response.context["cl"].result_list] == [rental.pk]
+
+    for view, lookup, pk in [
+        ("admin:cats_cat_change", "cat", rental.cat_id),
+        ("admin:auth_user_change", "user", rental.user_id),
+    ]:
+        archived_url = f'{reverse("admin:cats_archivedrental_changelist")}?{lookup}__id__exact={pk}'
+        assert archived_url in admin_client.get(reverse(view, args=[pk])).content.decode()
+        response = admin_client.get(archived_url)
+        assert [archived.pk for archived in response.context["cl"].result_list] == [rental.pk]
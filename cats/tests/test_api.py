@@ -0,0 +1,72 @@
+import datetime
+import json
+
+import pytest
+from django.urls import reverse
+
+from cats.models import Rental
+from cats.tests.factories import BreedFactory, CatFactory, RentalFactory
+
+TODAY = datetime.date.today()
+
+
+def get_stream(client, **params):
+    params.setdefault("date_from", TODAY.isoformat())
+    params.setdefault("date_to", (TODAY + datetime.timedelta(days=3)).isoformat())
+    response = client.get(reverse("cats:availability_api"), params)
+    assert response.status_code == 200
+    return response, b"".join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_availability_api_streams_ndjson(client):
+    """
+    Test if available cats are streamed one JSON object per line, filtered by species and breed
+    """
+    breed = BreedFactory()
+    cats = [CatFactory(breed=breed) for _ in range(3)]
+    RentalFactory(cat=cats[1], rental_date=TODAY, status=Rental.ACTIVE)
+    other_breed_cat = CatFactory(breed=BreedFactory(species=breed.species))
+    CatFactory()
+
+    response, content = get_stream(client, species=breed.species_id)
+    rows = [json.loads(line) for line in content.splitlines()]
+
+    assert response["Content-Type"] == "application/x-ndjson"
+    assert [row["id"] for row in rows] == [cats[0].id, cats[2].id, other_breed_cat.id]
+    assert rows[0]["breed"] == {"id": breed.id, "name": breed.name}
+    assert rows[0]["species"]["id"] == breed.species_id
+
+    _response, content = get_stream(client, breed=breed.id)
+    assert len(content.splitlines()) == 2
+
+
+@pytest.mark.django_db
+def test_availability_api_streams_json_array(client):
+    """
+    Test if "format=json" returns a single JSON array
+    """
+    cat = CatFactory()
+
+    response, content = get_stream(client, format="json")
+
+    assert response["Content-Type"] == "application/json"
+    assert [row["id"] for row in json.loads(content)] == [cat.id]
+
+
+@pytest.mark.django_db
+def test_availability_api_validates_dates(client):
+    """
+    Test if missing or backward dates are reported as bad request
+    """
+    url = reverse("cats:availability_api")
+
+    assert client.get(url).status_code == 400
+    response = client.get(
+        url,
+        {
+            "date_from": (TODAY + datetime.timedelta(days=2)).isoformat(),
+            "date_to": TODAY.isoformat(),
+        },
+    )
+    assert response.status_code == 400
@@ -0,0 +1,114 @@
+import datetime
+import io
+import re
+from urllib.parse import urlencode
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import AsyncClient
+from django.urls import reverse
+
+from cats.models import Rental
+from cats.tests.factories import CatFactory, UserFactory
+
+# Views run in a thread pool with their own database connections,
+# which don't see data of a test's transaction
+pytestmark = pytest.mark.django_db(transaction=True)
+
+TODAY = datetime.date.today()
+
+
+def post(client, url, data):
+    # Django 3.2 AsyncClient's multipart payload can't be read by chunks,
+    # a url-encoded one is read at once
+    return async_to_sync(client.post)(
+        url, urlencode(data), content_type="application/x-www-form-urlencoded"
+    )
+
+
+def test_async_details():
+    """
+    Test if async cat details view renders the cat
+    """
+    cat = CatFactory()
+
+    response = async_to_sync(AsyncClient().get)(reverse("cats:async_details", args=[cat.pk]))
+
+    assert response.status_code == 200
+    assert cat.name in response.content.decode()
+
+
+def test_async_details_queries_are_timed(settings):
+    """
+    Test if queries run in the views thread pool are counted in Server-Timing
+    """
+    settings.QUERY_TIMING_ENABLED = True
+    cat = CatFactory()
+
+    response = async_to_sync(AsyncClient().get)(reverse("cats:async_details", args=[cat.pk]))
+
+    queries = int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+    assert queries > 0
+
+
+def test_async_search():
+    """
+    Test if async search lists cats available in given dates
+    """
+    free = CatFactory()
+    busy = Rental.objects.create(
+        cat=CatFactory(), user=UserFactory(), rental_date=TODAY, return_date=TODAY
+    ).cat
+
+    response = post(
+        AsyncClient(),
+        reverse("cats:async_explore_list"),
+        {"date_from": TODAY.isoformat(), "date_to": TODAY.isoformat()},
+    )
+
+    assert response.status_code == 200
+    assert list(response.context["cats_filtered"]) == [free]
+    assert busy.name not in response.content.decode()
+
+
+def test_async_booking():
+    """
+    Test if a cat is booked through async view, only by logged in users
+    """
+    cat = CatFactory()
+    client = AsyncClient()
+    url = reverse("cats:async_rental_dates", args=[cat.pk])
+    data = {"rental_date": TODAY.isoformat(), "return_date": TODAY.isoformat()}
+
+    assert post(client, url, data).status_code == 302
+    assert not Rental.objects.exists()
+
+    user = UserFactory()
+    client.force_login(user)
+    response = post(client, url, data)
+
+    assert response.status_code == 302
+    assert response.url == reverse("cats:congrats_mail", args=[cat.pk])
+    assert Rental.objects.get().user == user
+
+
+def test_loadtest_views_reports_every_mode():
+    """
+    Test if the load test compares WSGI and both ASGI paths
+    """
+    CatFactory()
+    output = io.StringIO()
+
+    call_command(
+        "loadtest_views",
+        requests=4,
+        concurrency=2,
+        latency_ms=1,
+        host="testserver",
+        stdout=output,
+    )
+
+    rows = {line.split()[0]: line.split() for line in output.getvalue().splitlines()[2:]}
+    assert set(rows) == {"wsgi", "asgi-sync", "asgi-async"}
+    assert all(row[-1] == "0" for row in rows.values())
@@ -0,0 +1,177 @@
+import datetime
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+
+from cats.availability import CatIntervals, availability_index, find_gaps, find_overlaps
+from cats.models import Cat, Rental
+from cats.tests.factories import CatFactory, RentalFactory
+
+TODAY = datetime.date.today()
+
+
+def days(offset):
+    return TODAY + datetime.timedelta(days=offset)
+
+
+def test_intervals_detect_partial_overlaps():
+    """
+    Test if rentals sticking out of the searched timeframe are treated as overlapping
+    """
+    intervals = CatIntervals([(days(5), days(10), 1), (days(20), days(25), 2)])
+
+    assert intervals.overlaps(days(8), days(15))
+    assert intervals.overlaps(days(0), days(5))
+    assert intervals.overlaps(days(25), days(30))
+    assert intervals.overlapping(days(0), days(30)) == [2, 1]
+    assert not intervals.overlaps(days(11), days(19))
+    assert not intervals.overlaps(days(8), days(12), exclude_rental=1)
+
+
+def test_intervals_handle_overlapping_history():
+    """
+    Test if a long rental hidden behind a shorter later one is still found
+    """
+    intervals = CatIntervals([(days(0), days(30), 1), (days(2), days(3), 2)])
+
+    assert intervals.overlapping(days(10), days(12)) == [1]
+
+
+def test_find_overlaps_with_unbounded_rentals():
+    """
+    Test if rentals without dates overlap everything before or after them
+    """
+    rows = [
+        (1, None, days(0), 1),
+        (1, days(0), days(2), 2),
+        (1, days(5), None, 3),
+        (1, days(100), days(101), 4),
+        (2, days(0), days(1), 5),
+        (2, days(2), days(3), 6),
+    ]
+
+    assert list(find_overlaps(rows)) == [(1, 2, 1), (1, 4, 3)]
+
+
+def test_find_gaps_within_horizon():
+    """
+    Test if free gaps long enough are found between, before and after rentals of each cat
+    """
+    rows = [
+        # Rental sticking out of the horizon, then a 2-day gap and an open end
+        (1, days(-3), days(1)),
+        (1, days(4), days(5)),
+        # A long rental hiding a shorter one, busy until the horizon ends
+        (2, days(3), days(30)),
+        (2, days(5), days(6)),
+        # Rental without dates blocks the whole horizon
+        (3, None, None),
+    ]
+
+    assert dict(find_gaps(rows, days(0), days(9), 2)) == {
+        1: [(days(2), days(3)), (days(6), days(9))],
+        2: [(days(0), days(2))],
+        3: [],
+    }
+    assert dict(find_gaps(rows[:2], days(0), days(9), 3)) == {1: [(days(6), days(9))]}
+
+
+@pytest.mark.django_db
+def test_get_available_cats_excludes_partially_overlapping_rentals():
+    """
+    Test if cats rented only partially within given dates are filtered out
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=days(10), status=Rental.ACTIVE)
+    cancelled = RentalFactory(
+        rental_date=days(5), return_date=days(10), status=Rental.CANCELLED
+    )
+    free_cat = CatFactory()
+
+    available = set(Cat.objects.get_available_cats(days(8), days(15)))
+
+    assert rental.cat not in available
+    assert cancelled.cat in available
+    assert free_cat in available
+
+
+@pytest.mark.django_db
+def test_open_ended_rentals_make_cats_unavailable():
+    """
+    Test if rentals without a return date block their cat from the start date
+    on, like in the exclusion constraint
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=None, status=Rental.ACTIVE)
+
+    assert rental.cat not in Cat.objects.get_available_cats(days(100), days(101))
+    assert rental.cat in Cat.objects.get_available_cats(days(0), days(4))
+    with pytest.raises(ValidationError):
+        Rental(cat=rental.cat, user=rental.user, rental_date=days(30), return_date=days(31)).clean()
+
+
+@pytest.mark.django_db
+def test_busy_cats_of_a_window_follow_rental_changes(settings):
+    """
+    Test if busy cats kept for a window are updated by changed rentals, and
+    too many of them are filtered out in the database
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=days(10), status=Rental.ACTIVE)
+    free_cat = CatFactory()
+    assert availability_index.busy_cat_ids(days(8), days(15)) == {rental.cat_id}
+
+    booked = RentalFactory(
+        cat=free_cat, rental_date=days(15), return_date=days(16), status=Rental.PENDING
+    )
+    rental.status = Rental.CANCELLED
+    rental.save()
+
+    assert availability_index.busy_cat_ids(days(8), days(15)) == {free_cat.pk}
+    settings.AVAILABILITY_MAX_EXCLUDED_IDS = 0
+    available = Cat.objects.get_available_cats(days(8), days(15))
+    assert "NOT (EXISTS" in str(available.query)
+    assert set(available) == {rental.cat}
+    assert booked.cat not in available
+
+
+@pytest.mark.django_db
+def test_rental_clean_rejects_overlapping_rental():
+    """
+    Test if model validation refuses a rental overlapping an existing one, but not itself
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=days(10), status=Rental.ACTIVE)
+    rental.clean()
+
+    overlapping = Rental(
+        cat=rental.cat, user=rental.user, rental_date=days(9), return_date=days(12)
+    )
+    with pytest.raises(ValidationError):
+        overlapping.clean()
+
+
+@pytest.mark.django_db
+def test_database_rejects_double_booking():
+    """
+    Test if the exclusion constraint refuses overlapping blocking rentals of the same cat
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=days(10), status=Rental.ACTIVE)
+    RentalFactory(
+        cat=rental.cat, rental_date=days(5), return_date=days(10), status=Rental.CANCELLED
+    )
+    RentalFactory(rental_date=days(5), return_date=days(10), status=Rental.ACTIVE)
+
+    with pytest.raises(IntegrityError):
+        RentalFactory(
+            cat=rental.cat, rental_date=days(10), return_date=days(12), status=Rental.PENDING
+        )
+
+
+@pytest.mark.django_db
+def test_overlapping_lookup():
+    """
+    Test if "overlapping" finds rentals sharing at least one day with given period
+    """
+    rental = RentalFactory(rental_date=days(5), return_date=days(10))
+
+    assert rental in Rental.objects.overlapping(days(10), days(20))
+    assert rental in Rental.objects.overlapping(days(0))
+    assert rental not in Rental.objects.overlapping(days(11), days(20))
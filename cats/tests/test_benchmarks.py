@@ -0,0 +1,237 @@
+"""
+View-level performance benchmarks
+
+Seeds a synthetic dataset once (size scaled with CATS_BENCHMARK_SCALE env variable),
+requests every route of cats app through the test client and:
+- fails when a view runs more SQL queries than its declared budget,
+- writes wall times and query counts as JSON to CATS_BENCHMARK_OUTPUT
+  (default "cats_benchmark_results.json" in the temporary directory), so results
+  can be compared between releases.
+
+Benchmarks are left out of plain "pytest" runs, run them with: pytest -m benchmark
+"""
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import django
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cats.models import Cat, Species
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.django_db]
+
+SCALE = float(os.environ.get("CATS_BENCHMARK_SCALE", 1))
+OUTPUT = os.environ.get(
+    "CATS_BENCHMARK_OUTPUT", os.path.join(tempfile.gettempdir(), "cats_benchmark_results.json")
+)
+REPEAT = int(os.environ.get("CATS_BENCHMARK_REPEAT", 5))
+SEED = 2022
+
+TODAY = datetime.date.today()
+RESULTS = []
+
+
+@dataclass
+class Scenario:
+    """Single request to benchmark, "budget" is the maximum number of SQL queries allowed"""
+
+    name: str
+    url: Callable
+    budget: int
+    method: str = "get"
+    data: Optional[Callable] = None
+
+
+def search_dates(_dataset, _repetition):
+    return {
+        "date_from": TODAY.isoformat(),
+        "date_to": (TODAY + datetime.timedelta(days=7)).isoformat(),
+    }
+
+
+def booking_dates(_dataset, repetition):
+    # Far in the future, so every repetition books a free period
+    rental_date = TODAY + datetime.timedelta(days=10 * 365 + 10 * repetition)
+    return {
+        "rental_date": rental_date.isoformat(),
+        "return_date": rental_date.isoformat(),
+    }
+
+
+# Logged in requests always cost 2 queries: session and user
+SCENARIOS = [
+    Scenario("index", lambda d: reverse("cats:index"), budget=2),
+    Scenario("species", lambda d: reverse("cats:species"), budget=2),
+    Scenario("explore_list form", lambda d: reverse("cats:explore_list"), budget=2),
+    Scenario(
+        "explore_list search",
+        lambda d: reverse("cats:explore_list"),
+        budget=4,
+        method="post",
+        data=search_dates,
+    ),
+    Scenario(
+        "explore_list name search",
+        lambda d: reverse("cats:explore_list"),
+        budget=4,
+        method="post",
+        data=lambda dataset, repetition: {
+            **search_dates(dataset, repetition),
+            "query": dataset["cat_name"][:4],
+        },
+    ),
+    Scenario(
+        "flexible_list search",
+        lambda d: reverse("cats:flexible_list"),
+        budget=4,
+        method="post",
+        data=lambda _dataset, _repetition: {"duration": 7, "horizon": 60, "mode": "all"},
+    ),
+    Scenario(
+        "cats_list form",
+        lambda d: reverse("cats:cats_list", args=[d["species_id"]]),
+        budget=3,
+    ),
+    Scenario(
+        "cats_list search",
+        lambda d: reverse("cats:cats_list", args=[d["species_id"]]),
+        budget=6,
+        method="post",
+        data=search_dates,
+    ),
+    Scenario(
+        "details", lambda d: reverse("cats:details", args=[d["cat_id"]]), budget=2
+    ),
+    Scenario(
+        "rental_dates form",
+        lambda d: reverse("cats:rental_dates", args=[d["cat_id"]]),
+        budget=3,
+    ),
+    Scenario(
+        "rental_dates booking",
+        lambda d: reverse("cats:rental_dates", args=[d["cat_id"]]),
+        # Includes SAVEPOINT and RELEASE of booking transaction run inside a test
+        budget=9,
+        method="post",
+        data=booking_dates,
+    ),
+    Scenario(
+        "congrats_mail",
+        lambda d: reverse("cats:congrats_mail", args=[d["cat_id"]]),
+        budget=3,
+    ),
+    Scenario(
+        "rentals_history",
+        lambda d: reverse("cats:rentals_history"),
+        # Rentals and archived rentals pages are read separately
+        budget=4,
+    ),
+    Scenario(
+        "availability_api",
+        lambda d: reverse("cats:availability_api"),
+        # Doesn't touch the session
+        budget=1,
+        data=search_dates,
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def dataset(django_db_setup, django_db_blocker):
+    """Seeds the benchmark dataset once for the whole module and removes it afterwards"""
+
+    with django_db_blocker.unblock():
+        call_command(
+            "seed_catalog",
+            species=3,
+            cats=int(200 * SCALE),
+            rentals=int(2000 * SCALE),
+            users=int(20 * SCALE) or 1,
+            seed=SEED,
+            stdout=io.StringIO(),
+        )
+        # The user with the longest rentals history
+        user = (
+            User.objects.filter(username__startswith=f"seed{SEED}_")
+            .annotate(rentals_count=Count("rentals"))
+            .order_by("-rentals_count")[0]
+        )
+        species = Species.objects.order_by("id").first()
+        cat = Cat.objects.order_by("id").first()
+        yield {"species_id": species.id, "cat_id": cat.id, "cat_name": cat.name, "user": user}
+        Species.objects.all().delete()
+        User.objects.filter(username__startswith=f"seed{SEED}_").delete()
+
+    write_results()
+
+
+def write_results():
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "scale": SCALE,
+        "repeat": REPEAT,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "results": RESULTS,
+    }
+    with open(OUTPUT, "w") as output:
+        json.dump(report, output, indent=2)
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.name)
+def test_view_performance(dataset, scenario):
+    """
+    Test if a view stays within its SQL queries budget, records its timings
+    """
+    client = Client()
+    client.force_login(dataset["user"])
+    url = scenario.url(dataset)
+    request = getattr(client, scenario.method)
+
+    def run(repetition):
+        data = scenario.data(dataset, repetition) if scenario.data else None
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request(url, data)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        assert response.status_code in (200, 302), response.status_code
+        return elapsed, len(queries)
+
+    # Warm-up request fills in-process caches (e.g. availability index)
+    run(0)
+    timings, query_counts = zip(
+        *(run(repetition) for repetition in range(1, REPEAT + 1))
+    )
+
+    RESULTS.append(
+        {
+            "name": scenario.name,
+            "method": scenario.method.upper(),
+            "url": url,
+            "queries": max(query_counts),
+            "budget": scenario.budget,
+            "wall_ms_median": round(statistics.median(timings) * 1000, 3),
+            "wall_ms_max": round(max(timings) * 1000, 3),
+        }
+    )
+    assert (
+        max(query_counts) <= scenario.budget
+    ), f"{scenario.name} ran {max(query_counts)} queries, budget is {scenario.budget}"
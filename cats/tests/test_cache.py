@@ -0,0 +1,211 @@
+import datetime
+import io
+import time
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cats import cache
+from cats.availability import availability_index, cached_rented_cat_ids
+from cats.models import Rental
+from cats.services import update_rentals_status
+from cats.tests.factories import BreedFactory, CatFactory, RentalFactory, SpeciesFactory
+
+
+@pytest.mark.django_db
+def test_species_list_is_cached_until_species_change(
+    client, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    """
+    Test if species list is served from cache and rebuilt once a species change commits
+    """
+    species = SpeciesFactory()
+    client.get(reverse("cats:species"))
+
+    with django_assert_num_queries(0):
+        response = client.get(reverse("cats:species"))
+    assert list(response.context["species_list"]) == [species]
+
+    species.name = "Renamed"
+    with django_capture_on_commit_callbacks(execute=True):
+        species.save()
+        with django_assert_num_queries(0):
+            client.get(reverse("cats:species"))
+    response = client.get(reverse("cats:species"))
+    assert response.context["species_list"][0].name == "Renamed"
+
+
+@pytest.mark.django_db
+def test_cat_details_are_cached_until_cat_or_breed_change(
+    client, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    """
+    Test if cat details are served from cache and invalidated by cat, rental and breed changes
+    """
+    cat = CatFactory()
+    url = reverse("cats:details", args=[cat.id])
+    client.get(url)
+
+    with django_assert_num_queries(0):
+        client.get(url)
+
+    cat.name = "New name"
+    with django_capture_on_commit_callbacks(execute=True):
+        cat.save()
+    assert client.get(url).context["cat"].name == "New name"
+
+    cat.breed.name = "New breed"
+    with django_capture_on_commit_callbacks(execute=True):
+        cat.breed.save()
+    assert client.get(url).context["cat"].breed.name == "New breed"
+
+    client.get(url)
+    with django_capture_on_commit_callbacks(execute=True):
+        RentalFactory(cat=cat)
+    with django_assert_num_queries(1):
+        client.get(url)
+
+
+@pytest.mark.django_db
+def test_missing_cat_is_not_cached(client):
+    """
+    Test if 404 for a cat isn't cached
+    """
+    response = client.get(reverse("cats:details", args=[0]))
+
+    assert response.status_code == 404
+    assert django_cache.get(cache.cat_key(0)) is None
+
+
+@pytest.mark.django_db
+def test_cached_catalogue_is_built_from_primary(client, settings):
+    """
+    Test if cached species and cats are read from the primary in views reading from replicas
+    """
+    settings.DATABASE_REPLICAS = ["replica_unreachable"]
+    cat = CatFactory()
+
+    assert client.get(reverse("cats:species")).status_code == 200
+    assert client.get(reverse("cats:details", args=[cat.pk])).context["cat"] == cat
+
+
+def test_stale_value_is_served_while_someone_rebuilds():
+    """
+    Test if after soft expiry only the lock holder rebuilds the value
+    """
+    django_cache.set("key", ("stale", time.time() - 1), 60)
+    django_cache.add("key:lock", 1)
+
+    assert cache.cached("key", lambda: "fresh") == "stale"
+
+    django_cache.delete("key:lock")
+    assert cache.cached("key", lambda: "fresh") == "fresh"
+    assert cache.cached("key", lambda: "newer") == "fresh"
+
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+
+def cached_windows(species, windows):
+    """Looks up rented cats of (date_from, date_to) windows, returns which of them hit the cache"""
+
+    hits = []
+    for date_from, date_to in windows:
+        before = cache.availability_stats()["hits"]
+        cached_rented_cat_ids(date_from, date_to, species.pk)
+        hits.append(cache.availability_stats()["hits"] > before)
+    return hits
+
+
+@pytest.mark.django_db
+def test_species_search_is_cached(client):
+    """
+    Test if a repeated species search reads rented cats from cache, built
+    from the availability index
+    """
+    rental = RentalFactory(rental_date=day(5), return_date=day(6), status=Rental.ACTIVE)
+    url = reverse("cats:cats_list", args=[rental.cat.breed.species_id])
+    data = {"date_from": day(5).isoformat(), "date_to": day(7).isoformat()}
+    availability_index.busy_cat_ids(day(5), day(7))
+    with CaptureQueriesContext(connection) as missed:
+        client.post(url, data)
+
+    with CaptureQueriesContext(connection) as hit:
+        response = client.post(url, data)
+
+    assert len(hit) < len(missed)
+    assert not any('FROM "cats_rental"' in query["sql"] for query in missed)
+
+    assert list(response.context["cats_filtered"]) == []
+    assert cache.availability_stats() == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.django_db
+def test_rental_invalidates_only_overlapping_windows(django_capture_on_commit_callbacks):
+    """
+    Test if a rental invalidates cached windows it overlaps, of its species and all species
+    """
+    cat, other_cat = CatFactory(), CatFactory()
+    windows = [(day(1), day(3)), (day(3), day(4)), (day(10), day(12))]
+    cached_windows(cat.breed.species, windows)
+    cached_windows(other_cat.breed.species, windows)
+    cached_rented_cat_ids(day(1), day(2))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rental = RentalFactory(
+            cat=cat, rental_date=day(2), return_date=day(3), status=Rental.PENDING
+        )
+
+    assert cached_windows(cat.breed.species, windows) == [False, False, True]
+    assert cached_windows(other_cat.breed.species, windows) == [True, True, True]
+    assert cached_rented_cat_ids(day(1), day(2)) == {cat.pk}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rental.return_date = day(11)
+        rental.save()
+    assert cached_windows(cat.breed.species, windows) == [False, False, False]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        update_rentals_status(Rental.objects.filter(pk=rental.pk), Rental.ACTIVE)
+    assert cached_windows(cat.breed.species, windows) == [True, True, True]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        update_rentals_status(Rental.objects.filter(pk=rental.pk), Rental.CANCELLED)
+    assert cached_windows(cat.breed.species, windows) == [False, False, False]
+    assert cached_rented_cat_ids(day(1), day(2)) == set()
+
+
+@pytest.mark.django_db
+def test_moved_cat_invalidates_its_new_species(django_capture_on_commit_callbacks):
+    """
+    Test if a cat moved to another species drops cached windows of that species
+    """
+    rental = RentalFactory(rental_date=day(1), return_date=day(2), status=Rental.ACTIVE)
+    breed = BreedFactory()
+    assert cached_rented_cat_ids(day(1), day(1), breed.species_id) == set()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rental.cat.breed = breed
+        rental.cat.save()
+
+    assert cached_rented_cat_ids(day(1), day(1), breed.species_id) == {rental.cat.pk}
+
+
+@pytest.mark.django_db
+def test_availability_cache_stats_command():
+    """
+    Test if the command shows hit ratio and resets the counters
+    """
+    for _ in range(4):
+        cached_rented_cat_ids(day(1), day(2))
+    output = io.StringIO()
+
+    call_command("availability_cache_stats", reset=True, stdout=output)
+
+    assert output.getvalue() == "Hits: 3, misses: 1, hit ratio: 75.0%\n"
+    assert cache.availability_stats() == {"hits": 0, "misses": 0}
@@ -0,0 +1,154 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cats.calendars import busy_days, month_grid
+from cats.models import Cat, CatAvailabilityYear, Rental
+from cats.services import update_rentals_status
+from cats.tests.factories import CatFactory, RentalFactory, SpeciesFactory
+
+YEAR = datetime.date.today().year + 1
+
+
+def day(month, number, year=YEAR):
+    return datetime.date(year, month, number)
+
+
+def bitmap_days(cat, year=YEAR):
+    """Busy days of cat's year bitmap, as (month, day) pairs"""
+
+    availability = CatAvailabilityYear.objects.filter(cat=cat, year=year).first()
+    if availability is None:
+        return []
+    days = [
+        datetime.date(year, 1, 1) + datetime.timedelta(days=offset)
+        for offset, bit in enumerate(availability.busy_days)
+        if bit == "1"
+    ]
+    return [(busy.month, busy.day) for busy in days]
+
+
+@pytest.mark.django_db
+def test_bitmaps_follow_rental_changes():
+    """
+    Test if inserted, updated and deleted blocking rentals are kept in cat's bitmaps
+    """
+    rental = RentalFactory(rental_date=day(3, 1), return_date=day(3, 3), status=Rental.ACTIVE)
+    RentalFactory(
+        cat=rental.cat, rental_date=day(3, 5), return_date=day(3, 5), status=Rental.CANCELLED
+    )
+    assert bitmap_days(rental.cat) == [(3, 1), (3, 2), (3, 3)]
+
+    Rental.objects.filter(pk=rental.pk).update(return_date=day(3, 1))
+    assert bitmap_days(rental.cat) == [(3, 1)]
+
+    update_rentals_status(Rental.objects.filter(pk=rental.pk), Rental.CANCELLED)
+    assert not CatAvailabilityYear.objects.filter(cat=rental.cat).exists()
+
+    Rental.objects.filter(pk=rental.pk).update(status=Rental.PENDING)
+    rental.delete()
+    assert not CatAvailabilityYear.objects.filter(cat=rental.cat).exists()
+
+
+@pytest.mark.django_db
+def test_bitmaps_of_rentals_across_years():
+    """
+    Test if a rental over New Year and a leap day fills bitmaps of both years
+    """
+    rental = RentalFactory(
+        rental_date=datetime.date(2027, 12, 31),
+        return_date=datetime.date(2028, 3, 1),
+        status=Rental.PENDING,
+    )
+
+    assert bitmap_days(rental.cat, 2027) == [(12, 31)]
+    assert len(bitmap_days(rental.cat, 2028)) == 31 + 29 + 1
+    assert bitmap_days(rental.cat, 2028)[-2:] == [(2, 29), (3, 1)]
+
+
+@pytest.mark.django_db
+def test_busy_days_of_open_ended_rentals():
+    """
+    Test if rentals without a return date, which bitmaps don't hold, are read from rentals
+    """
+    cat = CatFactory()
+    RentalFactory(cat=cat, rental_date=day(4, 28), return_date=None, status=Rental.ACTIVE)
+
+    busy = busy_days(Cat.objects.filter(pk=cat.pk), YEAR, 5)
+
+    assert busy == {cat.pk: [True] * 31}
+    assert busy_days(Cat.objects.filter(pk=cat.pk), YEAR, 3) == {}
+
+
+def test_month_grid():
+    """
+    Test if a month is laid out in weeks from Monday, with days of other months left empty
+    """
+    busy = [day == 2 for day in range(1, 32)]
+
+    weeks = month_grid(2026, 12, busy)
+
+    # December 1st, 2026 is a Tuesday
+    assert weeks[0][:3] == [
+        None,
+        (datetime.date(2026, 12, 1), False),
+        (datetime.date(2026, 12, 2), True),
+    ]
+    assert weeks[-1][-1] is None
+    assert sum(day is not None for week in weeks for day in week) == 31
+
+
+@pytest.mark.django_db
+def test_cat_calendar_view(client):
+    """
+    Test if cat's calendar marks its busy days and 404s on invalid months
+    """
+    rental = RentalFactory(rental_date=day(6, 9), return_date=day(6, 10), status=Rental.ACTIVE)
+
+    response = client.get(reverse("cats:calendar_month", args=[rental.cat.pk, YEAR, 6]))
+
+    assert response.status_code == 200
+    busy = [cell[0].day for week in response.context["weeks"] for cell in week if cell and cell[1]]
+    assert busy == [9, 10]
+    assert response.context["next_month"] == day(7, 1)
+    for year, month in [(YEAR, 13), (1, 1), (9999, 12)]:
+        url = reverse("cats:calendar_month", args=[rental.cat.pk, year, month])
+        assert client.get(url).status_code == 404, (year, month)
+    assert client.get(reverse("cats:calendar", args=[rental.cat.pk])).status_code == 200
+
+
+@pytest.mark.django_db
+def test_species_heatmap_queries_dont_depend_on_cats_number(client, django_assert_num_queries):
+    """
+    Test if species heatmap lists all its cats in a constant number of queries
+    """
+    species = SpeciesFactory()
+    url = reverse("cats:species_availability_api", args=[species.pk, YEAR, 2])
+
+    def add_cats(number):
+        for _ in range(number):
+            RentalFactory(
+                cat=CatFactory(breed__species=species),
+                rental_date=day(2, 1),
+                return_date=day(2, 2),
+                status=Rental.ACTIVE,
+            )
+
+    add_cats(2)
+    with CaptureQueriesContext(connection) as captured:
+        client.get(url)
+    add_cats(4)
+    CatFactory(breed__species=species)
+
+    with django_assert_num_queries(len(captured)):
+        response = client.get(url)
+
+    heatmap = response.json()
+    assert heatmap["month"] == f"{YEAR}-02"
+    assert heatmap["busy_cats"][:3] == [6, 6, 0]
+    assert len(heatmap["busy_cats"]) == len(heatmap["cats"][0]["busy_days"])
+    assert len(heatmap["cats"]) == 7
+    assert heatmap["cats"][-1]["busy_days"] == "0" * len(heatmap["busy_cats"])
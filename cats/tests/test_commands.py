@@ -0,0 +1,434 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from cats.availability import find_overlaps
+from cats.models import (
+    ArchivedRental,
+    Breed,
+    Cat,
+    CatAvailabilityYear,
+    CatRentalSummary,
+    Rental,
+    Species,
+    UtilizationChange,
+)
+from cats.outbox import queue_email
+from cats.services import archive_rentals, sweep_rentals
+from cats.tests.factories import CatFactory, RentalFactory, SpeciesFactory, UserFactory
+
+
+def rental_rows():
+    return (
+        Rental.objects.order_by("cat_id", "rental_date", "id")
+        .values_list("cat_id", "rental_date", "return_date", "id")
+        .iterator()
+    )
+
+
+@pytest.mark.django_db
+def test_seed_catalog_creates_non_overlapping_timelines():
+    """
+    Test if "seed_catalog" creates requested numbers of objects without double-bookings
+    """
+    call_command(
+        "seed_catalog",
+        species=2,
+        breeds_per_species=3,
+        cats=30,
+        rentals=250,
+        users=5,
+        chunk_size=40,
+        stdout=io.StringIO(),
+    )
+
+    assert Species.objects.count() == 2
+    assert Breed.objects.count() == 6
+    assert Cat.objects.count() == 30
+    assert Rental.objects.count() == 250
+    assert list(find_overlaps(rental_rows())) == []
+
+
+@pytest.mark.django_db
+def test_seed_catalog_is_deterministic():
+    """
+    Test if the same seed generates the same rentals timelines
+    """
+    def timelines():
+        return [
+            (rental.cat.name, rental.rental_date, rental.return_date, rental.status)
+            for rental in Rental.objects.select_related("cat").order_by("id")
+        ]
+
+    call_command("seed_catalog", cats=5, rentals=20, users=2, seed=7, stdout=io.StringIO())
+    first = timelines()
+    Species.objects.all().delete()
+    call_command("seed_catalog", cats=5, rentals=20, users=2, seed=7, stdout=io.StringIO())
+
+    assert timelines() == first
+
+
+@pytest.mark.django_db
+def test_sweep_rentals_moves_expired_rentals_in_batches():
+    """
+    Test if expired active rentals are finished and expired pending ones cancelled
+    """
+    past = datetime.date.today() - datetime.timedelta(days=5)
+    expired_active = [
+        RentalFactory(rental_date=past, return_date=past, status=Rental.ACTIVE)
+        for _ in range(5)
+    ]
+    expired_pending = RentalFactory(rental_date=past, return_date=past, status=Rental.PENDING)
+    current = RentalFactory(
+        rental_date=past, return_date=datetime.date.today(), status=Rental.ACTIVE
+    )
+
+    output = io.StringIO()
+    call_command("sweep_rentals", batch_size=2, stdout=output)
+
+    assert "Active -> Finished: 5 rentals" in output.getvalue()
+    for rental in expired_active:
+        rental.refresh_from_db()
+        assert rental.status == Rental.FINISHED
+    expired_pending.refresh_from_db()
+    assert expired_pending.status == Rental.CANCELLED
+    current.refresh_from_db()
+    assert current.status == Rental.ACTIVE
+
+
+@pytest.mark.django_db
+def test_sweep_rentals_max_batches():
+    """
+    Test if a single run can be limited to a number of batches
+    """
+    past = datetime.date.today() - datetime.timedelta(days=5)
+    for _ in range(5):
+        RentalFactory(rental_date=past, return_date=past, status=Rental.ACTIVE)
+
+    assert sweep_rentals(Rental.ACTIVE, Rental.FINISHED, datetime.date.today(), 2, 2) == 4
+
+
+def days_ago(days):
+    return datetime.date.today() - datetime.timedelta(days=days)
+
+
+@pytest.mark.django_db
+def test_archive_rentals_moves_old_terminal_rentals():
+    """
+    Test if old finished and cancelled rentals are archived in batches, keeping cat's history
+    """
+    cat = CatFactory()
+    old = [
+        RentalFactory(
+            cat=cat, rental_date=days_ago(days + 1), return_date=days_ago(days), status=status
+        )
+        for days, status in [(40, Rental.FINISHED), (50, Rental.CANCELLED), (60, Rental.FINISHED)]
+    ]
+    email = queue_email("Rented", "", "user@example.com", rental=old[0])
+    recent = RentalFactory(
+        cat=cat, rental_date=days_ago(3), return_date=days_ago(2), status=Rental.FINISHED
+    )
+    active = RentalFactory(
+        rental_date=days_ago(90), return_date=days_ago(80), status=Rental.ACTIVE
+    )
+    summary = CatRentalSummary.objects.values().get(cat=cat)
+    bitmaps = list(CatAvailabilityYear.objects.filter(cat=cat).values_list("year", "busy_days"))
+    output = io.StringIO()
+
+    call_command(
+        "archive_rentals", f"--before={days_ago(30)}", "--batch-size=2", stdout=output
+    )
+
+    assert output.getvalue() == "Archived 3 rentals\n"
+    assert set(Rental.objects.values_list("pk", flat=True)) == {recent.pk, active.pk}
+    archived = ArchivedRental.objects.in_bulk()
+    assert set(archived) == {rental.pk for rental in old}
+    assert archived[old[1].pk].status == Rental.CANCELLED
+    assert archived[old[1].pk].return_date == old[1].return_date
+    email.refresh_from_db()
+    assert email.rental is None
+    assert CatRentalSummary.objects.values().get(cat=cat) == summary
+    assert (
+        list(CatAvailabilityYear.objects.filter(cat=cat).values_list("year", "busy_days"))
+        == bitmaps
+    )
+
+
+@pytest.mark.django_db
+def test_archive_rentals_max_batches():
+    """
+    Test if a single run can be limited to a number of batches, and only past days are accepted
+    """
+    for _ in range(5):
+        RentalFactory(rental_date=days_ago(5), return_date=days_ago(5), status=Rental.FINISHED)
+
+    assert archive_rentals(datetime.date.today(), 2, 2) == 4
+    with pytest.raises(CommandError, match="returned in the future"):
+        call_command("archive_rentals", f"--before={days_ago(-1)}")
+
+
+@pytest.mark.django_db
+def test_deleted_user_leaves_cats_history():
+    """
+    Test if deleting a user's archived rentals updates summaries, bitmaps and rollups of cats
+    """
+    cat = CatFactory()
+    RentalFactory(
+        cat=cat, rental_date=days_ago(3), return_date=days_ago(2), status=Rental.FINISHED
+    )
+    summary = CatRentalSummary.objects.values().get(cat=cat)
+    bitmaps = list(CatAvailabilityYear.objects.filter(cat=cat).values_list("year", "busy_days"))
+    old = RentalFactory(
+        cat=cat,
+        user=UserFactory(),
+        rental_date=days_ago(41),
+        return_date=days_ago(40),
+        status=Rental.FINISHED,
+    )
+    archive_rentals(days_ago(30))
+    UtilizationChange.objects.all().delete()
+
+    old.user.delete()
+
+    assert not ArchivedRental.objects.exists()
+    assert CatRentalSummary.objects.values().get(cat=cat) == summary
+    assert (
+        list(CatAvailabilityYear.objects.filter(cat=cat).values_list("year", "busy_days"))
+        == bitmaps
+    )
+    assert list(UtilizationChange.objects.values_list("cat_id", "date_from", "date_to")) == [
+        (cat.pk, old.rental_date, old.return_date)
+    ]
+
+
+def catalog_snapshot():
+    return sorted(
+        (
+            rental.cat.name,
+            rental.cat.breed.name,
+            rental.cat.breed.species.name,
+            rental.user.username,
+            rental.rental_date,
+            rental.return_date,
+            rental.status,
+        )
+        for rental in Rental.objects.select_related("cat__breed__species", "user")
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"format": "csv"},
+        {"format": "ndjson"},
+        pytest.param(
+            {"format": "csv", "copy": True},
+            marks=pytest.mark.skipif(
+                connection.vendor != "postgresql", reason="COPY is PostgreSQL specific"
+            ),
+        ),
+    ],
+    ids=["csv", "ndjson", "csv-copy"],
+)
+def test_export_and_import_catalog_round_trip(tmp_path, options):
+    """
+    Test if exported catalogue and rentals are imported back the same
+    """
+    call_command(
+        "seed_catalog", species=2, cats=10, rentals=60, users=3, seed=15, stdout=io.StringIO()
+    )
+    call_command("export_catalog", tmp_path, chunk_size=7, stdout=io.StringIO(), **options)
+    expected = catalog_snapshot()
+    Species.objects.all().delete()
+
+    call_command("import_catalog", tmp_path, chunk_size=7, stdout=io.StringIO(), **options)
+
+    assert catalog_snapshot() == expected
+    assert Cat.objects.count() == 10
+
+
+@pytest.mark.django_db
+def test_import_catalog_reuses_species_by_natural_key(tmp_path):
+    """
+    Test if species and breeds already in the database are not duplicated
+    """
+    cat = CatFactory()
+    call_command("export_catalog", tmp_path, stdout=io.StringIO())
+
+    call_command("import_catalog", tmp_path, stdout=io.StringIO())
+
+    assert Species.objects.get_by_natural_key(cat.breed.species.name) == cat.breed.species
+    assert Breed.objects.get_by_natural_key(*cat.breed.natural_key()) == cat.breed
+    assert Cat.objects.filter(breed=cat.breed).count() == 2
+
+
+def write_rentals_import(directory, rentals):
+    species = SpeciesFactory()
+    (directory / "species.csv").write_text(f"name,description\n{species.name},\n")
+    (directory / "breeds.csv").write_text(f"name,species,description\nShort,{species.name},\n")
+    (directory / "cats.csv").write_text(
+        f"id,name,breed,species,description\n7,Tom,Short,{species.name},\n"
+    )
+    (directory / "rentals.csv").write_text(
+        "cat,user,rental_date,return_date,status\n"
+        + "".join(f"7,partner,{start},{end},{status}\n" for start, end, status in rentals)
+    )
+
+
+@pytest.mark.django_db
+def test_import_catalog_aborts_on_overlapping_rentals(tmp_path):
+    """
+    Test if rentals overlapping each other abort the whole import
+    """
+    write_rentals_import(
+        tmp_path,
+        [("2030-01-01", "2030-01-10", Rental.ACTIVE), ("2030-01-05", "2030-01-06", Rental.ACTIVE)],
+    )
+
+    with pytest.raises(CommandError, match="rentals line 3: overlaps rental from line 2"):
+        call_command("import_catalog", tmp_path, create_users=True, stdout=io.StringIO())
+
+    assert not Cat.objects.filter(name="Tom").exists()
+
+
+@pytest.mark.django_db
+def test_import_catalog_skips_conflicting_rentals(tmp_path):
+    """
+    Test if overlapping rentals are skipped, checked within a chunk and across chunks
+    """
+    write_rentals_import(
+        tmp_path,
+        [
+            ("2030-01-01", "2030-01-10", Rental.ACTIVE),
+            # Cancelled rentals never conflict
+            ("2030-01-02", "2030-01-03", Rental.CANCELLED),
+            ("2030-01-10", "2030-01-12", Rental.PENDING),
+            ("2030-01-11", "2030-01-11", Rental.FINISHED),
+            ("2030-01-13", "2030-01-14", Rental.ACTIVE),
+        ],
+    )
+    errors = io.StringIO()
+
+    call_command(
+        "import_catalog",
+        tmp_path,
+        chunk_size=2,
+        create_users=True,
+        skip_conflicts=True,
+        stdout=io.StringIO(),
+        stderr=errors,
+    )
+
+    assert "line 4: overlaps existing rental" in errors.getvalue()
+    assert "line 5: overlaps rental from line 4" in errors.getvalue()
+    assert sorted(
+        Rental.objects.filter(cat__name="Tom").values_list("rental_date__day", "status")
+    ) == [(1, Rental.ACTIVE), (2, Rental.CANCELLED), (13, Rental.ACTIVE)]
+
+
+@pytest.mark.django_db
+def test_import_catalog_requires_known_users(tmp_path):
+    """
+    Test if rentals of unknown users are rejected unless users may be created
+    """
+    write_rentals_import(tmp_path, [("2030-01-01", "2030-01-10", Rental.ACTIVE)])
+
+    with pytest.raises(CommandError, match="unknown users partner"):
+        call_command("import_catalog", tmp_path, stdout=io.StringIO())
+
+
+@pytest.fixture()
+def without_overlaps_constraint(db):
+    """Lets a test write double-bookings, as in data saved before the constraint"""
+
+    with connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE cats_rental DROP CONSTRAINT exclude_overlapping_rentals")
+
+
+def test_audit_rentals_reports_overlaps(without_overlaps_constraint):
+    """
+    Test if "audit_rentals" reports every rental overlapping an earlier one of the same cat
+    """
+    today = datetime.date.today()
+    cat = CatFactory()
+    long = RentalFactory(
+        cat=cat,
+        rental_date=today,
+        return_date=today + datetime.timedelta(days=10),
+        status=Rental.FINISHED,
+    )
+    inside = RentalFactory(
+        cat=cat,
+        rental_date=today + datetime.timedelta(days=2),
+        return_date=today + datetime.timedelta(days=3),
+        status=Rental.ACTIVE,
+    )
+    unbounded = RentalFactory(
+        cat=cat,
+        rental_date=today + datetime.timedelta(days=20),
+        return_date=None,
+        status=Rental.PENDING,
+    )
+    late = RentalFactory(
+        cat=cat,
+        rental_date=today + datetime.timedelta(days=30),
+        return_date=today + datetime.timedelta(days=31),
+        status=Rental.ACTIVE,
+    )
+    RentalFactory(
+        cat=cat, rental_date=today, return_date=today, status=Rental.CANCELLED
+    )
+    RentalFactory(rental_date=today, return_date=today, status=Rental.ACTIVE)
+    output, errors = io.StringIO(), io.StringIO()
+
+    call_command("audit_rentals", stdout=output, stderr=errors)
+
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [(row["rental"], row["overlapped_rental"]) for row in rows] == [
+        (str(inside.pk), str(long.pk)),
+        (str(late.pk), str(unbounded.pk)),
+    ]
+    assert rows[0]["overlapped_return_date"] == long.return_date.isoformat()
+    assert "Found 2 overlapping rentals" in errors.getvalue()
+
+
+def test_audit_rentals_since(without_overlaps_constraint, tmp_path):
+    """
+    Test if "--since" reports only overlaps on that day or later, to a file
+    """
+    today = datetime.date.today()
+    cat = CatFactory()
+    for offset in [-10, -10, 5, 5]:
+        day = today + datetime.timedelta(days=offset)
+        RentalFactory(
+            cat=cat, rental_date=day, return_date=day, status=Rental.FINISHED
+        )
+    path = tmp_path / "conflicts.ndjson"
+
+    with pytest.raises(CommandError, match="Found 1 overlapping rentals"):
+        call_command(
+            "audit_rentals",
+            since=today,
+            format="ndjson",
+            output=str(path),
+            fail_on_conflicts=True,
+            stderr=io.StringIO(),
+        )
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    overlap_day = (today + datetime.timedelta(days=5)).isoformat()
+    assert [row["rental_date"] for row in rows] == [overlap_day]
+
+
+def test_benchmark_bookings_needs_bookings():
+    """
+    Test if a booking benchmark without any booking is refused before touching the database
+    """
+    with pytest.raises(CommandError, match="--bookings must be at least 1"):
+        call_command("benchmark_bookings", "--bookings=0")
@@ -0,0 +1,181 @@
+"""
+Query plans of the main Rental access paths
+
+Sequential scans are disabled for each test, so the planner falls back
+to them only if no index can serve the query.
+"""
+
+import datetime
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.contrib.postgres.search import SearchQuery
+
+from cats.models import SEARCH_CONFIG, Cat, Rental
+from cats.pagination import KeysetPaginator
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="Indexes are PostgreSQL specific"
+)
+
+TODAY = datetime.date.today()
+
+
+@pytest.fixture()
+def rentals(db):
+    call_command(
+        "seed_catalog",
+        species=2,
+        cats=50,
+        rentals=2000,
+        users=5,
+        seed=14,
+        stdout=io.StringIO(),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE cats_rental, cats_cat, cats_catrentalsummary")
+        # Lasts until the test transaction is rolled back
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    return Rental.objects.order_by("pk").first()
+
+
+def assert_uses_index(queryset, *index_names):
+    """Plan must read at least one of "index_names" and never scan the whole table"""
+
+    plan = queryset.explain()
+    assert any(index_name in plan for index_name in index_names), plan
+    assert "Seq Scan" not in plan, plan
+
+
+def test_cat_availability_uses_index(rentals):
+    """
+    Test if upcoming blocking rentals of a cat are read from an index
+    """
+    queryset = (
+        Rental.objects.blocking().overlapping(TODAY).filter(cat_id=rentals.cat_id)
+    )
+
+    # Which one wins depends on table statistics
+    assert_uses_index(
+        queryset,
+        "rental_cat_blocking_idx",
+        "rental_cat_id_idx",
+        "exclude_overlapping_rentals",
+    )
+
+
+def test_overlapping_rentals_use_exclusion_constraint_index(rentals):
+    """
+    Test if rentals overlapping a period are found with the exclusion constraint's GiST index
+    """
+    queryset = Rental.objects.blocking().overlapping(
+        TODAY, TODAY + datetime.timedelta(days=7)
+    )
+
+    assert_uses_index(queryset, "exclude_overlapping_rentals")
+
+
+def test_cat_last_rental_is_read_from_summary(rentals):
+    """
+    Test if last rental of a cat is read from its summary, not from rentals
+    """
+    queryset = Cat.objects.with_rental_summary().filter(pk=rentals.cat_id)
+
+    assert_uses_index(queryset, "cats_catrentalsummary_pkey")
+    assert "cats_rental " not in queryset.explain()
+
+
+@pytest.mark.parametrize(
+    "order_by, index_name",
+    [
+        ("-rental_summary__total_rentals", "cat_summary_popularity_idx"),
+        ("rental_summary__next_booked_date", "cat_summary_next_booked_idx"),
+    ],
+)
+def test_cats_are_sorted_through_summary_index(rentals, order_by, index_name):
+    """
+    Test if cats sorted by popularity or availability are read in summary index order
+    """
+    with connection.cursor() as cursor:
+        # Sorting 50 cats is cheaper than any index, no matter the statistics
+        cursor.execute("SET LOCAL enable_sort = off")
+    # Joined like in "CatChangeList"
+    queryset = Cat.objects.filter(rental_summary__isnull=False).order_by(
+        order_by, "-pk" if order_by[0] == "-" else "pk"
+    )[:20]
+
+    assert_uses_index(queryset, index_name)
+    assert "Sort" not in queryset.explain()
+
+
+@pytest.mark.parametrize("next_page", [False, True])
+def test_user_history_is_read_in_index_order(rentals, next_page):
+    """
+    Test if user's rentals history pages are read from the index without sorting
+    """
+    paginator = KeysetPaginator(
+        Rental.objects.filter(user_id=rentals.user_id),
+        "rental_date",
+        50,
+        descending=True,
+    )
+    queryset = paginator._ordered()
+    if next_page:
+        queryset = queryset.filter(paginator._after((TODAY, rentals.pk)))
+    plan = queryset[:51].explain()
+
+    assert "rental_user_history_idx" in plan, plan
+    assert "Sort" not in plan, plan
+
+
+@pytest.mark.parametrize(
+    "lookups",
+    [
+        {"status": Rental.ACTIVE, "rental_date__gte": TODAY},
+        {"status": Rental.FINISHED, "return_date__lt": TODAY},
+    ],
+)
+def test_admin_status_and_date_filters_use_index(rentals, lookups):
+    """
+    Test if admin filters by status and a date are served by composite indexes
+    """
+    assert_uses_index(
+        Rental.objects.filter(**lookups),
+        "rental_status_rental_idx",
+        "rental_status_return_idx",
+    )
+
+
+@pytest.fixture()
+def analyzed_cats(rentals):
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE cats_cat")
+    return Cat.objects.order_by("pk").first()
+
+
+def test_cats_words_search_uses_search_vector_index(analyzed_cats):
+    """
+    Test if full-text search on cats reads the GIN index of their search vectors
+    """
+    queryset = Cat.objects.filter(
+        search_vector=SearchQuery(analyzed_cats.name, config=SEARCH_CONFIG)
+    )
+
+    assert_uses_index(queryset, "cat_search_vector_idx")
+
+
+def test_cats_search_uses_search_indexes(analyzed_cats):
+    """
+    Test if cats search combines the search vector and the name trigram indexes
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'cat_name_trgm_idx'")
+        if cursor.fetchone() is None:
+            pytest.skip("pg_trgm extension is not available")
+
+    plan = Cat.objects.search(analyzed_cats.name[:4]).explain()
+
+    assert "cat_search_vector_idx" in plan and "cat_name_trgm_idx" in plan, plan
+    assert "Seq Scan" not in plan, plan
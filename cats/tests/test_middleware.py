@@ -0,0 +1,145 @@
+import datetime
+import json
+import logging
+
+import pytest
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from cat_rental.routers import replica_reads
+from cats.middleware import PRIMARY_PIN_COOKIE, QueryStats, ReplicaReadsMiddleware
+from cats.models import Cat, Rental, Species
+from cats.tests.factories import CatFactory, SpeciesFactory, UserFactory
+
+
+@pytest.fixture()
+def timing_client(settings):
+    settings.QUERY_TIMING_ENABLED = True
+    settings.REPEATED_QUERY_THRESHOLD = 3
+    return Client()
+
+
+@pytest.mark.django_db
+def test_server_timing_header(timing_client):
+    """
+    Test if responses report SQL time and number of queries
+    """
+    SpeciesFactory()
+
+    response = timing_client.get(reverse("cats:species"))
+
+    timing = response["Server-Timing"]
+    assert "total;dur=" in timing
+    assert 'desc="1 queries"' in timing
+    assert 'n1;desc="0 repeated query shapes"' in timing
+
+
+@pytest.mark.django_db
+def test_slow_requests_are_logged(timing_client, settings, caplog):
+    """
+    Test if slow requests are logged with view name and queries
+    """
+    settings.SLOW_REQUEST_THRESHOLD_MS = 0
+    cat = CatFactory()
+
+    with caplog.at_level(logging.WARNING, logger="cats.performance"):
+        timing_client.get(reverse("cats:details", args=[cat.id]))
+
+    record = json.loads(caplog.records[-1].args[0])
+    assert record["view"] == "cats:details"
+    assert record["status"] == 200
+    assert record["queries"] == 1
+
+
+@pytest.mark.django_db
+def test_repeated_query_shapes():
+    """
+    Test if the same query run for different objects is detected as repeated
+    """
+    species = [SpeciesFactory() for _ in range(4)]
+    stats = QueryStats()
+
+    with connection.execute_wrapper(stats):
+        for one_species in species:
+            Species.objects.get(pk=one_species.pk)
+        Species.objects.count()
+
+    assert stats.count == 5
+    [(sql, count)] = stats.repeated(threshold=3)
+    assert count == 4
+    assert "WHERE" in sql
+
+
+def test_middleware_is_off_by_default(client):
+    """
+    Test if nothing is added to responses unless enabled in settings
+    """
+    response = client.get(reverse("cats:about"))
+
+    assert "Server-Timing" not in response
+
+
+def test_replica_router():
+    """
+    Test if only reads inside "replica_reads" go to a replica, and never for sessions and users
+    """
+    assert router.db_for_read(Cat) == "default"
+    with replica_reads("replica_1"):
+        assert router.db_for_read(Cat) == "replica_1"
+        assert router.db_for_read(Session) == "default"
+        assert router.db_for_read(User) == "default"
+        assert router.db_for_write(Cat) == "default"
+    assert router.db_for_read(Cat) == "default"
+
+
+@pytest.mark.parametrize(
+    "path, pinned, expected",
+    [
+        ("/species/", False, "replica_1"),
+        ("/cat/1/", False, "replica_1"),
+        ("/cat/1/", True, "default"),
+        ("/cat/1/rental_dates/", False, "default"),
+        ("/no-such-page/", False, "default"),
+    ],
+)
+def test_replica_reads_middleware(settings, path, pinned, expected):
+    """
+    Test if listed views read from a replica, unless the user has just booked a cat
+    """
+    settings.DATABASE_REPLICAS = ["replica_1"]
+    routed_to = []
+
+    def view(request):
+        routed_to.append(router.db_for_read(Cat))
+        return HttpResponse()
+
+    request = RequestFactory().get(path)
+    if pinned:
+        request.COOKIES[PRIMARY_PIN_COOKIE] = "1"
+    ReplicaReadsMiddleware(view)(request)
+
+    assert routed_to == [expected]
+
+
+@pytest.mark.django_db
+def test_booking_pins_reads_to_primary(client, settings):
+    """
+    Test if the user's reads stay on the primary for a while after booking
+    """
+    settings.DATABASE_REPLICAS = ["replica_1"]
+    settings.REPLICA_PIN_SECONDS = 30
+    client.force_login(UserFactory())
+    rental_date = datetime.date.today() + datetime.timedelta(days=3)
+
+    response = client.post(
+        reverse("cats:rental_dates", args=[CatFactory().pk]),
+        {"rental_date": rental_date.isoformat(), "return_date": rental_date.isoformat()},
+    )
+
+    assert response.status_code == 302
+    assert Rental.objects.exists()
+    assert response.cookies[PRIMARY_PIN_COOKIE]["max-age"] == 30
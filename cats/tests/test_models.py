@@ -1,6 +1,9 @@
 import datetime
 
-from cats.models import Rental
+import pytest
+
+from cats.models import Cat, Rental
+from cats.tests.factories import BreedFactory, CatFactory
 
 
 def test_rental_has_user_assigned(db, rental_factory_fixture):
@@ -49,3 +52,38 @@ def test_rental_dates_are_date_types(db, rental_factory_fixture):
             type(rental.rental_date) is datetime.date
             and type(rental.return_date) is datetime.date
         )
+
+
+@pytest.mark.django_db
+def test_cats_search():
+    """
+    Test if cats are found by words of name, breed, species and description, or part of the name
+    """
+    breed = BreedFactory(name="Maine Coon", species__name="Domestic cat")
+    fluffy = CatFactory(
+        name="Fluffy", breed=breed, description="Loves sleeping on laps"
+    )
+    CatFactory(name="Tom", description="Hunts mice")
+
+    for phrase in ["fluffy", "luff", "coon", "domestic", "sleeps", "maine -tom"]:
+        assert list(Cat.objects.search(phrase)) == [fluffy], phrase
+    # The search vector is only used in the database
+    assert Cat.objects.search("fluffy").get().get_deferred_fields() == {"search_vector"}
+    assert not Cat.objects.search("dog").exists()
+    assert Cat.objects.search("  ").count() == 2
+
+
+@pytest.mark.django_db
+def test_cats_search_follows_renamed_breed_and_species():
+    """
+    Test if search vectors of cats are refreshed when their breed or species is renamed
+    """
+    cat = CatFactory()
+    breed = cat.breed
+    breed.name = "Sphynx"
+    breed.save()
+    species = breed.species
+    species.name = "Hairless"
+    species.save()
+
+    assert list(Cat.objects.search("sphynx hairless")) == [cat]
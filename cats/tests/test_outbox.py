@@ -0,0 +1,105 @@
+import datetime
+import io
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from cats.models import OutboxEmail, Rental
+from cats.tests.factories import CatFactory, UserFactory
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP server is down")
+
+
+class UnreachableBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+
+@pytest.fixture()
+def booking(client):
+    """Rents a cat through the rental form"""
+    user = UserFactory()
+    cat = CatFactory()
+    client.force_login(user)
+    today = datetime.date.today()
+    response = client.post(
+        reverse("cats:rental_dates", args=[cat.id]),
+        {"cat": cat.id, "user": user.id, "rental_date": today, "return_date": today},
+    )
+    assert response.status_code == 302
+    return Rental.objects.get(cat=cat)
+
+
+@pytest.mark.django_db
+def test_rental_queues_confirmation_without_sending(booking):
+    """
+    Test if renting a cat only queues the confirmation e-mail
+    """
+    email = OutboxEmail.objects.get(rental=booking)
+
+    assert email.status == OutboxEmail.PENDING
+    assert email.recipient == booking.user.email
+    assert booking.cat.name in email.body
+    assert mail.outbox == []
+
+
+@pytest.mark.django_db
+def test_send_outbox_sends_queued_emails(booking):
+    """
+    Test if "send_outbox" command delivers queued e-mails once
+    """
+    call_command("send_outbox")
+    call_command("send_outbox")
+
+    email = OutboxEmail.objects.get(rental=booking)
+    assert email.status == OutboxEmail.SENT
+    assert [message.to for message in mail.outbox] == [[booking.user.email]]
+
+
+@pytest.mark.django_db
+def test_send_outbox_retries_with_backoff(booking):
+    """
+    Test if failed e-mails are postponed and finally marked as failed
+    """
+    backend = "cats.tests.test_outbox.FailingBackend"
+
+    call_command("send_outbox", backend=backend, max_attempts=2)
+    email = OutboxEmail.objects.get(rental=booking)
+    assert email.status == OutboxEmail.PENDING
+    assert email.attempts == 1
+    assert "SMTP server is down" in email.last_error
+
+    # Not due yet - nothing happens
+    call_command("send_outbox", backend=backend, max_attempts=2)
+    assert OutboxEmail.objects.get(pk=email.pk).attempts == 1
+
+    OutboxEmail.objects.update(next_attempt_at=email.created_at)
+    call_command("send_outbox", backend=backend, max_attempts=2)
+    assert OutboxEmail.objects.get(pk=email.pk).status == OutboxEmail.FAILED
+
+
+@pytest.mark.django_db
+def test_send_outbox_backs_off_when_server_is_unreachable(booking):
+    """
+    Test if e-mails get a failed attempt when the mail server can't be connected to
+    """
+    output = io.StringIO()
+
+    call_command(
+        "send_outbox", backend="cats.tests.test_outbox.UnreachableBackend", stdout=output
+    )
+
+    assert output.getvalue() == "Sent 0 e-mails, 1 failed\n"
+    email = OutboxEmail.objects.get(rental=booking)
+    assert email.status == OutboxEmail.PENDING
+    assert email.attempts == 1
+    assert email.next_attempt_at > timezone.now()
+    assert "Connection refused" in email.last_error
+    assert mail.outbox == []
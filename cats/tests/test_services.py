@@ -0,0 +1,66 @@
+import datetime
+import threading
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+from cats.models import Rental
+from cats.services import book_cat
+from cats.tests.factories import CatFactory, UserFactory
+
+TODAY = datetime.date.today()
+
+
+@pytest.mark.django_db
+def test_book_cat_rejects_overlapping_booking():
+    """
+    Test if a cat can't be booked twice for overlapping dates
+    """
+    cat = CatFactory()
+    user = UserFactory()
+    book_cat(cat.pk, user, TODAY, TODAY + datetime.timedelta(days=3))
+
+    with pytest.raises(ValidationError):
+        book_cat(
+            cat.pk,
+            user,
+            TODAY + datetime.timedelta(days=3),
+            TODAY + datetime.timedelta(days=5),
+        )
+
+    book_cat(
+        cat.pk,
+        user,
+        TODAY + datetime.timedelta(days=4),
+        TODAY + datetime.timedelta(days=5),
+    )
+    assert Rental.objects.filter(cat=cat).count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_bookings_of_one_cat():
+    """
+    Test if only one of many concurrent bookings of the same cat and dates succeeds
+    """
+    cat = CatFactory()
+    user = UserFactory()
+    outcomes = []
+
+    def book():
+        try:
+            book_cat(cat.pk, user, TODAY, TODAY)
+            outcomes.append("booked")
+        except ValidationError:
+            outcomes.append("conflict")
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=book) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == ["booked"] + ["conflict"] * 4
+    assert Rental.objects.filter(cat=cat).count() == 1
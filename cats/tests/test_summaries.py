@@ -0,0 +1,133 @@
+import datetime
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from cats.models import Cat, CatRentalSummary, Rental
+from cats.services import update_rentals_status
+from cats.tests.factories import CatFactory, RentalFactory
+
+TODAY = datetime.date.today()
+
+
+def days(offset):
+    return TODAY + datetime.timedelta(days=offset)
+
+
+def summary(cat):
+    return CatRentalSummary.objects.values(
+        "total_rentals",
+        "active_rentals",
+        "last_rental_date",
+        "last_return_date",
+        "next_booked_date",
+    ).get(cat=cat)
+
+
+@pytest.mark.django_db
+def test_summary_follows_rental_changes():
+    """
+    Test if cat's summary is created with it and follows inserted, updated and deleted rentals
+    """
+    cat = CatFactory()
+    assert summary(cat) == {
+        "total_rentals": 0,
+        "active_rentals": 0,
+        "last_rental_date": None,
+        "last_return_date": None,
+        "next_booked_date": None,
+    }
+
+    upcoming = RentalFactory(
+        cat=cat, rental_date=days(5), return_date=days(6), status=Rental.PENDING
+    )
+    RentalFactory(cat=cat, rental_date=days(-9), return_date=days(-8), status=Rental.ACTIVE)
+    assert summary(cat) == {
+        "total_rentals": 2,
+        "active_rentals": 1,
+        "last_rental_date": days(-9),
+        "last_return_date": days(-8),
+        "next_booked_date": days(5),
+    }
+
+    # Rented now
+    Rental.objects.filter(pk=upcoming.pk).update(rental_date=days(-1))
+    assert summary(cat)["next_booked_date"] == TODAY
+
+    update_rentals_status(Rental.objects.filter(cat=cat), Rental.CANCELLED)
+    assert summary(cat)["active_rentals"] == 0
+    assert summary(cat)["next_booked_date"] is None
+
+    upcoming.delete()
+    assert summary(cat)["total_rentals"] == 1
+
+
+@pytest.mark.django_db
+def test_moved_rental_updates_both_cats():
+    """
+    Test if a rental moved to another cat updates summaries of both cats
+    """
+    rental = RentalFactory(rental_date=days(1), return_date=days(2), status=Rental.ACTIVE)
+    old_cat, new_cat = rental.cat, CatFactory()
+
+    rental.cat = new_cat
+    rental.save()
+
+    assert summary(old_cat)["total_rentals"] == 0
+    assert summary(new_cat)["total_rentals"] == 1
+    assert summary(new_cat)["next_booked_date"] == days(1)
+
+
+@pytest.mark.django_db
+def test_deleted_cat_leaves_no_summary():
+    """
+    Test if deleting a cat with rentals deletes its summary too
+    """
+    cat = RentalFactory().cat
+
+    cat.delete()
+
+    assert not CatRentalSummary.objects.filter(cat_id=cat.pk).exists()
+
+
+@pytest.mark.django_db
+def test_refresh_passed_next_booked_dates():
+    """
+    Test if daily refresh recomputes only summaries whose next booked date has passed
+    """
+    passed = RentalFactory(rental_date=days(0), return_date=days(3), status=Rental.ACTIVE).cat
+    upcoming = RentalFactory(rental_date=days(1), return_date=days(3), status=Rental.ACTIVE).cat
+    # As if computed on earlier days
+    CatRentalSummary.objects.filter(cat=passed).update(next_booked_date=days(-2))
+    CatRentalSummary.objects.filter(cat=upcoming).update(total_rentals=7)
+    output = io.StringIO()
+
+    call_command("refresh_rental_summaries", stdout=output)
+
+    assert output.getvalue() == "Refreshed 1 summaries\n"
+    assert summary(passed)["next_booked_date"] == TODAY
+    assert summary(upcoming)["total_rentals"] == 7
+
+
+@pytest.mark.django_db
+def test_check_and_rebuild_summaries():
+    """
+    Test if "--check" reports missing and wrong summaries and "--all" fixes them
+    """
+    wrong, missing = CatFactory(), CatFactory()
+    RentalFactory(cat=wrong)
+    CatRentalSummary.objects.filter(cat=wrong).update(total_rentals=5)
+    CatRentalSummary.objects.filter(cat=missing).delete()
+
+    with pytest.raises(
+        CommandError, match=f"2 summaries out of date, of cats: {wrong.pk}, {missing.pk}"
+    ):
+        call_command("refresh_rental_summaries", check=True, batch_size=1)
+
+    call_command("refresh_rental_summaries", all=True, batch_size=1, stdout=io.StringIO())
+
+    output = io.StringIO()
+    call_command("refresh_rental_summaries", check=True, stdout=output)
+    assert "All summaries are up to date" in output.getvalue()
+    assert CatRentalSummary.objects.count() == Cat.objects.count()
@@ -0,0 +1,261 @@
+import datetime
+import io
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cats.models import (
+    BreedDayUtilization,
+    CatDayUtilization,
+    Rental,
+    UtilizationChange,
+)
+from cats.services import archive_rentals, update_rentals_status
+from cats.tests.factories import BreedFactory, CatFactory, RentalFactory
+from cats.utilization import merge_periods, refresh_utilization, utilization_report
+
+TODAY = datetime.date.today()
+
+
+def days(offset):
+    return TODAY + datetime.timedelta(days=offset)
+
+
+@pytest.fixture(autouse=True)
+def no_logged_changes(db):
+    """
+    Data committed by other test modules (e.g. benchmarks) leaves its changes in the log
+    """
+    UtilizationChange.objects.all().delete()
+
+
+def rollups(cat):
+    """Cat's {(day offset, status): rentals} after applying logged changes"""
+
+    refresh_utilization()
+    return {
+        ((row.day - TODAY).days, row.status): row.rentals
+        for row in CatDayUtilization.objects.filter(cat=cat)
+    }
+
+
+def test_merge_periods():
+    """
+    Test if overlapping and adjacent periods of a cat are merged, other cats' kept apart
+    """
+    changes = [
+        (1, days(5), days(6)),
+        (2, days(0), days(1)),
+        (1, days(0), days(4)),
+        (1, days(8), days(9)),
+    ]
+
+    assert merge_periods(changes) == [
+        (1, days(0), days(6)),
+        (1, days(8), days(9)),
+        (2, days(0), days(1)),
+    ]
+
+
+@pytest.mark.django_db
+def test_rollups_follow_rental_changes():
+    """
+    Test if inserted, updated and deleted rentals are rolled up into cat's days
+    """
+    rental = RentalFactory(
+        rental_date=days(1), return_date=days(3), status=Rental.ACTIVE
+    )
+    RentalFactory(
+        cat=rental.cat,
+        rental_date=days(2),
+        return_date=days(2),
+        status=Rental.CANCELLED,
+    )
+    assert rollups(rental.cat) == {
+        (1, Rental.ACTIVE): 1,
+        (2, Rental.ACTIVE): 1,
+        (2, Rental.CANCELLED): 1,
+        (3, Rental.ACTIVE): 1,
+    }
+
+    Rental.objects.filter(pk=rental.pk).update(
+        return_date=days(1), status=Rental.PENDING
+    )
+    assert rollups(rental.cat) == {(1, Rental.PENDING): 1, (2, Rental.CANCELLED): 1}
+
+    rental.delete()
+    assert rollups(rental.cat) == {(2, Rental.CANCELLED): 1}
+    assert not UtilizationChange.objects.exists()
+
+
+@pytest.mark.django_db
+def test_breed_rollups_follow_cats():
+    """
+    Test if breed rollups follow rentals of its cats, cats moved to another breed and deleted
+    """
+    first, second = BreedFactory(), BreedFactory()
+    moved = RentalFactory(
+        cat=CatFactory(breed=first),
+        rental_date=days(0),
+        return_date=days(1),
+        status=Rental.ACTIVE,
+    ).cat
+    deleted = RentalFactory(
+        cat=CatFactory(breed=first),
+        rental_date=days(1),
+        return_date=days(1),
+        status=Rental.ACTIVE,
+    ).cat
+
+    def breed_rollups():
+        refresh_utilization()
+        return {
+            (row.breed_id, (row.day - TODAY).days): (row.cats, row.rentals)
+            for row in BreedDayUtilization.objects.filter(status=Rental.ACTIVE)
+        }
+
+    assert breed_rollups() == {(first.pk, 0): (1, 1), (first.pk, 1): (2, 2)}
+
+    moved.breed = second
+    moved.save()
+    deleted.delete()
+    assert breed_rollups() == {(second.pk, 0): (1, 1), (second.pk, 1): (1, 1)}
+
+
+@pytest.mark.django_db
+def test_archived_rentals_stay_rolled_up():
+    """
+    Test if archiving leaves rollups as they are, and archived rentals follow cat's breed
+    """
+    first, second = BreedFactory(), BreedFactory()
+    cat = RentalFactory(
+        cat=CatFactory(breed=first),
+        rental_date=days(-9),
+        return_date=days(-8),
+        status=Rental.FINISHED,
+    ).cat
+    assert rollups(cat) == {(-9, Rental.FINISHED): 1, (-8, Rental.FINISHED): 1}
+
+    archive_rentals(TODAY)
+    assert not UtilizationChange.objects.exists()
+    assert rollups(cat) == {(-9, Rental.FINISHED): 1, (-8, Rental.FINISHED): 1}
+
+    cat.breed = second
+    cat.save()
+    refresh_utilization()
+    breeds = BreedDayUtilization.objects.filter(breed__in=[first, second])
+    assert set(breeds.values_list("breed_id", "rentals")) == {(second.pk, 1)}
+
+
+@pytest.mark.django_db
+def test_rollups_follow_bulk_status_updates():
+    """
+    Test if rentals updated in chunks are logged once per statement and cat
+    """
+    cat = CatFactory()
+    for offset in range(0, 10, 2):
+        RentalFactory(
+            cat=cat,
+            rental_date=days(offset),
+            return_date=days(offset),
+            status=Rental.ACTIVE,
+        )
+    refresh_utilization()
+
+    update_rentals_status(Rental.objects.filter(cat=cat), Rental.FINISHED, chunk_size=2)
+
+    assert UtilizationChange.objects.count() == 3
+    assert rollups(cat) == {(offset, Rental.FINISHED): 1 for offset in range(0, 10, 2)}
+
+
+@pytest.mark.django_db
+def test_refresh_in_batches():
+    """
+    Test if a refresh stops after "max_batches" and the next one applies the rest
+    """
+    rentals = [
+        RentalFactory(rental_date=days(1), return_date=days(1)) for _ in range(3)
+    ]
+
+    assert refresh_utilization(batch_size=2, max_batches=1) == 2
+    assert refresh_utilization(batch_size=2) == 1
+    assert CatDayUtilization.objects.count() == len(rentals)
+
+
+@pytest.mark.django_db
+def test_refresh_command_rebuilds_rollups():
+    """
+    Test if "--rebuild" drops rollups and rebuilds them from all rentals
+    """
+    rental = RentalFactory(
+        rental_date=days(1), return_date=days(2), status=Rental.ACTIVE
+    )
+    refresh_utilization()
+    CatDayUtilization.objects.update(rentals=5)
+    output = io.StringIO()
+
+    call_command("refresh_utilization", rebuild=True, stdout=output)
+
+    assert "Applied 1 changes" in output.getvalue()
+    assert rollups(rental.cat) == {(1, Rental.ACTIVE): 1, (2, Rental.ACTIVE): 1}
+
+
+@pytest.mark.django_db
+def test_report_reads_only_rollups():
+    """
+    Test if the report groups occupancy by breed without reading rentals
+    """
+    busy, idle = BreedFactory(name="Busy"), BreedFactory(name="Idle")
+    for cat in [CatFactory(breed=busy), CatFactory(breed=busy)]:
+        RentalFactory(
+            cat=cat, rental_date=days(0), return_date=days(4), status=Rental.ACTIVE
+        )
+    RentalFactory(
+        cat=CatFactory(breed=idle),
+        rental_date=days(0),
+        return_date=days(9),
+        status=Rental.CANCELLED,
+    )
+    refresh_utilization()
+
+    with CaptureQueriesContext(connection) as captured:
+        report = utilization_report(days(0), days(9), "breed")
+
+    assert all("cats_rental" not in query["sql"] for query in captured.captured_queries)
+    assert [
+        (row["name"], row["cats"], row["occupied"], row["occupancy"]) for row in report
+    ] == [
+        ("Busy", 2, 10, 0.5),
+        ("Idle", 1, 0, 0),
+    ]
+    assert report[1]["days"]["Cancelled"] == 10
+
+
+@pytest.mark.django_db
+def test_report_view_is_for_staff(client):
+    """
+    Test if only staff sees the utilization report
+    """
+    RentalFactory(rental_date=days(0), return_date=days(1), status=Rental.ACTIVE)
+    refresh_utilization()
+    url = reverse("cats:utilization_report")
+    data = {
+        "date_from": days(0).isoformat(),
+        "date_to": days(6).isoformat(),
+        "group": "cat",
+    }
+
+    assert client.get(url, data).status_code == 302
+
+    client.force_login(
+        User.objects.create_user("staff", password="password", is_staff=True)
+    )
+    response = client.get(url, data)
+
+    assert response.status_code == 200
+    assert len(response.context["rows"]) == 1
+    assert response.context["rows"][0]["occupied"] == 2
@@ -0,0 +1,242 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cats.models import ArchivedRental, Rental
+from cats.pagination import encode_cursor
+from cats.services import archive_rentals
+from cats.tests.factories import BreedFactory, CatFactory, RentalFactory, UserFactory
+
+TODAY = datetime.date.today()
+
+
+def search_data(date_from=TODAY, date_to=TODAY):
+    return {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+
+
+def assert_same_queries_for_bigger_list(client, url, breed, django_assert_num_queries):
+    """Renders a list, doubles the cats and checks the number of queries didn't change"""
+    for _ in range(3):
+        RentalFactory(cat=CatFactory(breed=breed))
+    # Both renders miss the availability cache
+    cache.clear()
+    with CaptureQueriesContext(connection) as captured:
+        client.post(url, search_data())
+    queries = len(captured)
+
+    for _ in range(6):
+        RentalFactory(cat=CatFactory(breed=breed))
+    cache.clear()
+    with django_assert_num_queries(queries):
+        response = client.post(url, search_data())
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_explore_list_queries_dont_depend_on_cats_number(client, django_assert_num_queries):
+    """
+    Test if explore list renders in a constant number of queries
+    """
+    assert_same_queries_for_bigger_list(
+        client, reverse("cats:explore_list"), BreedFactory(), django_assert_num_queries
+    )
+
+
+@pytest.mark.django_db
+def test_species_cats_list_queries_dont_depend_on_cats_number(
+    client, django_assert_num_queries
+):
+    """
+    Test if species cats list renders in a constant number of queries
+    """
+    breed = BreedFactory()
+    assert_same_queries_for_bigger_list(
+        client,
+        reverse("cats:cats_list", args=[breed.species_id]),
+        breed,
+        django_assert_num_queries,
+    )
+
+
+@pytest.mark.django_db
+def test_cats_list_shows_last_rental(client):
+    """
+    Test if cats list shows dates of the last cat's rental
+    """
+    rental = RentalFactory()
+    last_rental = RentalFactory(
+        cat=rental.cat,
+        rental_date=rental.return_date + datetime.timedelta(days=1),
+        return_date=rental.return_date + datetime.timedelta(days=3),
+    )
+
+    response = client.post(reverse("cats:explore_list"), search_data())
+
+    cats = list(response.context["cats_filtered"])
+    assert cats[0].last_rental_date == last_rental.rental_date
+    assert cats[0].last_return_date == last_rental.return_date
+
+
+@pytest.mark.django_db
+def test_explore_list_search_phrase_with_dates(client):
+    """
+    Test if the search phrase is combined with searched dates
+    """
+    breed = BreedFactory(name="Persian")
+    free = CatFactory(breed=breed)
+    RentalFactory(cat=CatFactory(breed=breed), rental_date=TODAY, status=Rental.ACTIVE)
+    CatFactory()
+
+    response = client.post(
+        reverse("cats:explore_list"), {**search_data(), "query": "persian"}
+    )
+
+    assert list(response.context["cats_filtered"]) == [free]
+
+
+@pytest.mark.django_db
+def test_explore_list_pages_keep_search_dates(client, settings):
+    """
+    Test if following "next page" cursors walks through all cats by name, keeping searched dates
+    """
+    settings.CATS_PAGE_SIZE = 2
+    breed = BreedFactory()
+    cats = [CatFactory(breed=breed, name=name) for name in ["b", "a", "c", "a", "d"]]
+    busy = RentalFactory(
+        cat=CatFactory(breed=breed, name="aa"), rental_date=TODAY, status=Rental.ACTIVE
+    )
+    date_to = TODAY + datetime.timedelta(days=1)
+
+    response = client.post(reverse("cats:explore_list"), search_data(TODAY, date_to))
+    seen = list(response.context["cats_filtered"])
+    while response.context["page"].has_next:
+        cursor = response.context["page"].next_cursor
+        response = client.get(reverse("cats:explore_list"), {"cursor": cursor})
+        seen.extend(response.context["cats_filtered"])
+
+    assert busy.cat not in seen
+    assert seen == sorted(cats, key=lambda cat: (cat.name, cat.pk))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", ["earliest", "all"])
+def test_flexible_search_lists_free_windows(client, settings, mode):
+    """
+    Test if flexible search lists free windows of cats and leaves out fully booked ones
+    """
+    settings.CATS_PAGE_SIZE = 1
+
+    def day(offset):
+        return TODAY + datetime.timedelta(days=offset)
+
+    breed = BreedFactory()
+    free = CatFactory(breed=breed, name="a")
+    split = CatFactory(breed=breed, name="b")
+    for start, end in [(day(2), day(3)), (day(6), day(7))]:
+        RentalFactory(cat=split, rental_date=start, return_date=end, status=Rental.ACTIVE)
+    busy = CatFactory(breed=breed, name="c")
+    RentalFactory(cat=busy, rental_date=day(1), return_date=day(8), status=Rental.PENDING)
+    # Cancelled rentals don't block
+    RentalFactory(cat=free, rental_date=day(0), return_date=day(9), status=Rental.CANCELLED)
+
+    data = {"duration": 2, "horizon": 10, "mode": mode}
+    with CaptureQueriesContext(connection) as captured:
+        response = client.post(reverse("cats:flexible_list"), data)
+    queries = len(captured)
+    seen = list(response.context["cats_filtered"])
+    cursor = response.context["page"].next_cursor
+    response = client.get(reverse("cats:flexible_list"), {"cursor": cursor})
+    seen.extend(response.context["cats_filtered"])
+
+    # Free windows of all cats are found in one query, cats page is another one
+    assert queries == 2
+    assert [cat.name for cat in seen] == ["a", "b"]
+    expected = [(day(0), day(1)), (day(4), day(5)), (day(8), day(9))]
+    assert seen[0].free_gaps == [(day(0), day(9))]
+    assert seen[1].free_gaps == (expected[:1] if mode == "earliest" else expected)
+
+
+@pytest.mark.django_db
+def test_rentals_history_pages(client, settings):
+    """
+    Test if rentals history is paged from the newest rental, rentals without dates last
+    """
+    settings.CATS_PAGE_SIZE = 2
+    user = UserFactory()
+    rentals = [
+        RentalFactory(user=user, rental_date=TODAY + datetime.timedelta(days=offset))
+        for offset in [3, 1, 3, 2]
+    ]
+    undated = RentalFactory(user=user, rental_date=None, return_date=None)
+    RentalFactory()
+    client.force_login(user)
+
+    response = client.get(reverse("cats:rentals_history"))
+    seen = list(response.context["user_rentals"])
+    while response.context["page"].has_next:
+        cursor = response.context["page"].next_cursor
+        response = client.get(reverse("cats:rentals_history"), {"cursor": cursor})
+        seen.extend(response.context["user_rentals"])
+
+    expected = sorted(rentals, key=lambda rental: (rental.rental_date, rental.pk), reverse=True)
+    assert seen == expected + [undated]
+
+
+@pytest.mark.django_db
+def test_rentals_history_includes_archived_rentals(client, settings):
+    """
+    Test if archived rentals are paged together with the rest of user's rentals
+    """
+    settings.CATS_PAGE_SIZE = 2
+    user = UserFactory()
+    rentals = [
+        RentalFactory(
+            user=user,
+            rental_date=TODAY - datetime.timedelta(days=offset),
+            return_date=TODAY - datetime.timedelta(days=offset),
+            status=Rental.FINISHED,
+        )
+        for offset in [1, 20, 2, 30, 10]
+    ]
+    archive_rentals(TODAY - datetime.timedelta(days=5))
+    client.force_login(user)
+
+    response = client.get(reverse("cats:rentals_history"))
+    seen = [(rental.pk, rental.cat.name) for rental in response.context["user_rentals"]]
+    while response.context["page"].has_next:
+        cursor = response.context["page"].next_cursor
+        response = client.get(reverse("cats:rentals_history"), {"cursor": cursor})
+        seen.extend((rental.pk, rental.cat.name) for rental in response.context["user_rentals"])
+
+    expected = sorted(rentals, key=lambda rental: rental.rental_date, reverse=True)
+    assert seen == [(rental.pk, rental.cat.name) for rental in expected]
+    assert ArchivedRental.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_invalid_cursor(client):
+    """
+    Test if a tampered cursor isn't accepted
+    """
+    response = client.get(reverse("cats:explore_list"), {"cursor": "forged"})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cursor_of_another_list(client):
+    """
+    Test if a cursor of cats searched by name isn't accepted by rentals history, and vice versa
+    """
+    client.force_login(UserFactory())
+    cats_cursor = encode_cursor("name", ("Tom", 1), {"date_from": TODAY.isoformat()})
+    rentals_cursor = encode_cursor("rental_date", (TODAY, 1))
+
+    response = client.get(reverse("cats:rentals_history"), {"cursor": cats_cursor})
+    assert response.status_code == 404
+    response = client.get(reverse("cats:explore_list"), {"cursor": rentals_cursor})
+    assert response.status_code == 404
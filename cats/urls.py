@@ -4,16 +4,22 @@ Urls for cats app
 
 from django.urls import path
 
+from cats import async_views
 from cats.views import (
     rental_congrats_view,
+    availability_api_view,
+    species_availability_api_view,
     IndexView,
     AboutView,
     SpeciesListView,
     CatDetailView,
+    CatCalendarView,
     RentalFormView,
     RentalListView,
     CatFormView,
     ExploreFormView,
+    FlexibleSearchFormView,
+    UtilizationReportView,
 )
 
 app_name = "cats"
@@ -23,9 +29,32 @@ urlpatterns = [
     path("about/", AboutView.as_view(), name="about"),
     path("species/", SpeciesListView.as_view(), name="species"),
     path("explore/", ExploreFormView.as_view(), name="explore_list"),
+    path("explore/flexible/", FlexibleSearchFormView.as_view(), name="flexible_list"),
     path("species/<int:species_id>/", CatFormView.as_view(), name="cats_list"),
     path("cat/<int:pk>/", CatDetailView.as_view(), name="details"),
+    path("cat/<int:pk>/calendar/", CatCalendarView.as_view(), name="calendar"),
+    path(
+        "cat/<int:pk>/calendar/<int:year>/<int:month>/",
+        CatCalendarView.as_view(),
+        name="calendar_month",
+    ),
     path("cat/<int:cat_id>/rental_dates/", RentalFormView.as_view(), name="rental_dates"),
     path("cat/<int:cat_id>/rental_dates/congrats/", rental_congrats_view, name="congrats_mail"),
     path("cat/rentals/", RentalListView.as_view(), name="rentals_history"),
+    path("api/availability/", availability_api_view, name="availability_api"),
+    path(
+        "api/species/<int:species_id>/availability/<int:year>/<int:month>/",
+        species_availability_api_view,
+        name="species_availability_api",
+    ),
+    path("reports/utilization/", UtilizationReportView.as_view(), name="utilization_report"),
+    # Async variants, for deployments served under ASGI
+    path("async/explore/", async_views.explore_view, name="async_explore_list"),
+    path("async/species/<int:species_id>/", async_views.cats_list_view, name="async_cats_list"),
+    path("async/cat/<int:pk>/", async_views.cat_details_view, name="async_details"),
+    path(
+        "async/cat/<int:cat_id>/rental_dates/",
+        async_views.rental_form_view,
+        name="async_rental_dates",
+    ),
 ]
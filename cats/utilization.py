@@ -0,0 +1,233 @@
+"""
+Daily utilization rollups of rentals
+
+"CatDayUtilization" holds, per cat, day and status, the number of rentals
+covering that day, "BreedDayUtilization" sums it up per breed. Triggers on
+rentals and cats log periods of cats' days touched by every change
+("UtilizationChange"), and "refresh_utilization" recomputes only those
+periods, expanding the cats' rentals into days with generate_series.
+Archived rentals are rolled up too (read via "cats_rental_history" view).
+Reports aggregate the rollups and never read rentals.
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from cats.models import (
+    BreedDayUtilization,
+    Cat,
+    CatDayUtilization,
+    Rental,
+    UtilizationChange,
+)
+
+# Key of the advisory lock serializing refreshes, which would otherwise
+# both insert the same rollup rows
+REFRESH_LOCK_KEY = 7_020_001
+
+CAT_PERIODS = "unnest(%s::bigint[], %s::date[], %s::date[]) AS periods (cat_id, date_from, date_to)"
+BREED_PERIODS = (
+    "unnest(%s::bigint[], %s::date[], %s::date[]) AS periods (breed_id, date_from, date_to)"
+)
+
+CLEAR_CATS_SQL = f"""
+DELETE FROM cats_catdayutilization utilization
+USING {CAT_PERIODS}
+WHERE utilization.cat_id = periods.cat_id
+AND utilization.day BETWEEN periods.date_from AND periods.date_to
+"""
+
+# Rentals overlapping each period of a cat, expanded into their days within it
+ROLLUP_CATS_SQL = f"""
+INSERT INTO cats_catdayutilization (cat_id, day, status, rentals)
+SELECT rental.cat_id, day::date, rental.status, count(*)
+FROM {CAT_PERIODS}
+JOIN cats_rental_history rental
+    ON rental.cat_id = periods.cat_id
+    AND rental.rental_date <= periods.date_to
+    AND rental.return_date >= periods.date_from
+CROSS JOIN LATERAL generate_series(
+    GREATEST(rental.rental_date, periods.date_from),
+    LEAST(rental.return_date, periods.date_to),
+    interval '1 day'
+) AS day
+GROUP BY rental.cat_id, day, rental.status
+"""
+
+CLEAR_BREEDS_SQL = f"""
+DELETE FROM cats_breeddayutilization utilization
+USING {BREED_PERIODS}
+WHERE utilization.breed_id = periods.breed_id
+AND utilization.day BETWEEN periods.date_from AND periods.date_to
+"""
+
+# Rollups of the breed's current cats within each period
+ROLLUP_BREEDS_SQL = f"""
+INSERT INTO cats_breeddayutilization (breed_id, day, status, cats, rentals)
+SELECT periods.breed_id, utilization.day, utilization.status, count(*), sum(utilization.rentals)
+FROM {BREED_PERIODS}
+JOIN cats_cat cat ON cat.breed_id = periods.breed_id
+JOIN cats_catdayutilization utilization
+    ON utilization.cat_id = cat.id
+    AND utilization.day BETWEEN periods.date_from AND periods.date_to
+GROUP BY periods.breed_id, utilization.day, utilization.status
+"""
+
+QUEUE_ALL_SQL = """
+INSERT INTO cats_utilizationchange (cat_id, breed_id, date_from, date_to)
+SELECT rental.cat_id, cat.breed_id, min(rental.rental_date), max(rental.return_date)
+FROM cats_rental_history rental
+JOIN cats_cat cat ON cat.id = rental.cat_id
+WHERE rental.rental_date IS NOT NULL AND rental.return_date IS NOT NULL
+GROUP BY rental.cat_id, cat.breed_id
+"""
+
+# Report groups: (id, name) lookups from a breed rollup row
+GROUPS = {
+    "species": ("breed__species_id", "breed__species__name"),
+    "breed": ("breed_id", "breed__name"),
+}
+
+
+def merge_periods(changes):
+    """Merges (key, date_from, date_to) changes into disjoint periods per key (cat or breed)"""
+
+    periods = []
+    for key, date_from, date_to in sorted(changes):
+        last = periods[-1] if periods else None
+        if last and last[0] == key and date_from <= last[2] + datetime.timedelta(days=1):
+            last[2] = max(last[2], date_to)
+        else:
+            periods.append([key, date_from, date_to])
+    return [tuple(period) for period in periods]
+
+
+def recompute(changes):
+    """
+    Replaces rollups of cats' and breeds' days within periods of given
+    (cat_id, breed_id, date_from, date_to) changes
+    """
+
+    cat_periods = merge_periods(
+        (cat_id, date_from, date_to) for cat_id, _breed_id, date_from, date_to in changes
+    )
+    breed_periods = merge_periods(
+        (breed_id, date_from, date_to)
+        for _cat_id, breed_id, date_from, date_to in changes
+        if breed_id is not None
+    )
+    with connection.cursor() as cursor:
+        for periods, clear_sql, rollup_sql in [
+            (cat_periods, CLEAR_CATS_SQL, ROLLUP_CATS_SQL),
+            # Breeds are rolled up from already recomputed cats
+            (breed_periods, CLEAR_BREEDS_SQL, ROLLUP_BREEDS_SQL),
+        ]:
+            if periods:
+                params = [list(column) for column in zip(*periods)]
+                cursor.execute(clear_sql, params)
+                cursor.execute(rollup_sql, params)
+
+
+def refresh_utilization(batch_size=1000, max_batches=None):
+    """
+    Applies rental changes logged since the last run to the rollups.
+
+    Takes logged changes in batches of "batch_size", each batch with its
+    rollups recomputed in one short transaction. Changes committed while it
+    runs are picked up by this or the next run. Returns the number of
+    applied changes.
+    """
+
+    applied = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [REFRESH_LOCK_KEY])
+            changes = list(
+                UtilizationChange.objects.order_by("pk").values_list(
+                    "pk", "cat_id", "breed_id", "date_from", "date_to"
+                )[:batch_size]
+            )
+            if not changes:
+                break
+            UtilizationChange.objects.filter(pk__in=[pk for pk, *_change in changes]).delete()
+            recompute([change for _pk, *change in changes])
+        applied += len(changes)
+        batches += 1
+    return applied
+
+
+def queue_all_rentals():
+    """Logs all rentals as changed, so the next refresh rebuilds every rollup"""
+
+    with transaction.atomic():
+        UtilizationChange.objects.all().delete()
+        CatDayUtilization.objects.all().delete()
+        BreedDayUtilization.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(QUEUE_ALL_SQL)
+            return cursor.rowcount
+
+
+def utilization_report(date_from, date_to, group="species", limit=None):
+    """
+    Utilization of cats grouped by species, breed or cat within [date_from, date_to].
+
+    Returns dicts with group's "id", "name", number of "cats", "days" rented
+    in each status, "occupied" cat-days (blocking statuses) and "occupancy"
+    (occupied share of all cat-days), most occupied first. Species and breeds
+    are all listed, cats only if they have any rentals in the period.
+    Species and breeds are read from breed rollups, cats from cat rollups.
+    """
+
+    statuses = {
+        f"status_{status}": Sum("rentals", filter=Q(status=status))
+        for status, _label in Rental.STATUS
+    }
+    blocking = Q(status__in=Rental.BLOCKING_STATUSES)
+    if group == "cat":
+        id_field, name_field = "cat_id", "cat__name"
+        rollups = (
+            CatDayUtilization.objects.filter(day__range=(date_from, date_to))
+            .values(id_field, name_field)
+            .annotate(occupied=Count("pk", filter=blocking), **statuses)
+            .order_by("-occupied", id_field)[:limit]
+        )
+    else:
+        id_field, name_field = GROUPS[group]
+        rollups = (
+            BreedDayUtilization.objects.filter(day__range=(date_from, date_to))
+            .values(id_field, name_field)
+            .annotate(occupied=Sum("cats", filter=blocking), **statuses)
+        )
+
+    rows = {
+        row[id_field]: {
+            "id": row[id_field],
+            "name": row[name_field],
+            "cats": 1 if group == "cat" else 0,
+            "occupied": row["occupied"] or 0,
+            "days": {label: row[f"status_{status}"] or 0 for status, label in Rental.STATUS},
+        }
+        for row in rollups
+    }
+    if group != "cat":
+        # Groups without rentals are listed too
+        for count in Cat.objects.values(id_field, name_field).annotate(cats=Count("pk")):
+            row = rows.setdefault(
+                count[id_field],
+                {
+                    "id": count[id_field],
+                    "name": count[name_field],
+                    "occupied": 0,
+                    "days": {label: 0 for _status, label in Rental.STATUS},
+                },
+            )
+            row["cats"] = count["cats"]
+
+    days = (date_to - date_from).days + 1
+    for row in rows.values():
+        row["occupancy"] = row["occupied"] / (row["cats"] * days) if row["cats"] else 0
+    report = sorted(rows.values(), key=lambda row: (-row["occupied"], row["id"]))
+    return report[:limit] if limit else report
@@ -3,22 +3,45 @@ Views used in cat app
 """
 
 import datetime
+import json
 
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.mail import send_mail
-from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView
 from django.views.generic.edit import FormView, FormMixin
 from django.views.generic.list import MultipleObjectMixin
 
-from cats.forms import RentalForm, SearchForm
-from cats.models import Cat, Species, Breed, Rental
+from cats import cache
+from cats.availability import free_gaps
+from cats.calendars import busy_days, month_bounds, month_grid
+from cats.forms import (
+    AvailabilityFilterForm,
+    FlexibleSearchForm,
+    RentalForm,
+    SearchForm,
+    UtilizationReportForm,
+)
+from cats.middleware import pin_primary
+from cats.models import ArchivedRental, Cat, Species, Breed, Rental
+from cats.pagination import (
+    InvalidCursor,
+    KeysetPaginator,
+    MergedKeysetPaginator,
+    decode_cursor,
+    form_state,
+)
+from cats.services import book_cat
+from cats.utilization import utilization_report
 
 
 class IndexView(TemplateView):
@@ -38,9 +61,51 @@ class SpeciesListView(ListView):
 
     model = Species
     template_name = "cats/species.html"
+    context_object_name = "species_list"
 
+    def get_queryset(self):
+        return cache.cached(
+            cache.species_list_key(),
+            lambda: list(Species.objects.using(DEFAULT_DB_ALIAS).order_by("pk")),
+        )
+
+
+# Searched cats are paged by name
+CATS_CURSOR_KEY = "name"
+
+
+class CursorSearchMixin:
+    """
+    Pages search results with keyset cursors.
+
+    Search is POSTed, following pages are GET "?cursor=..." links.
+    Cursor tokens carry the search form data, so the filters survive paging.
+    """
+
+    cursor_position = None
+
+    def get(self, request, *args, **kwargs):
+        token = request.GET.get("cursor")
+        if token is None:
+            return super().get(request, *args, **kwargs)
+        try:
+            self.cursor_position, data = decode_cursor(CATS_CURSOR_KEY, token)
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+
+        form = self.form_class(data=data)
+        if form.is_valid():
+            return self.form_valid(form)
+        return self.form_invalid(form)
 
-class ExploreFormView(FormView):
+    def paginate_cats(self, queryset, form):
+        """Returns a page of cats ordered by name"""
+
+        paginator = KeysetPaginator(queryset, CATS_CURSOR_KEY, settings.CATS_PAGE_SIZE)
+        return paginator.page(self.cursor_position, state=form_state(form))
+
+
+class ExploreFormView(CursorSearchMixin, FormView):
     model = Cat
     queryset = Cat.objects.order_by("-name")
     template_name = "cats/explore_list.html"
@@ -50,12 +115,47 @@ class ExploreFormView(FormView):
         context = super().get_context_data()
         date_from = form.cleaned_data["date_from"]
         date_to = form.cleaned_data["date_to"]
-        cats_filtered = self.model.objects.get_available_cats(date_from, date_to)
-        context["cats_filtered"] = cats_filtered
+        cats_filtered = (
+            self.model.objects.search(form.cleaned_data["query"])
+            .get_available_cats(date_from, date_to)
+            .with_rental_summary()
+        )
+        page = self.paginate_cats(cats_filtered, form)
+        context["cats_filtered"] = page
+        context["page"] = page
         return render(self.request, self.template_name, context)
 
 
-class CatFormView(FormView):
+class FlexibleSearchFormView(CursorSearchMixin, FormView):
+    """
+    Cats free for a number of days anytime within a horizon, with their free windows.
+
+    Free windows of all cats come from a single sweep over blocking rentals in
+    the horizon, fully booked cats are left out of the list.
+    """
+
+    model = Cat
+    template_name = "cats/flexible_list.html"
+    form_class = FlexibleSearchForm
+
+    def form_valid(self, form):
+        context = super().get_context_data()
+        date_from, date_to = form.period()
+        gaps = free_gaps(date_from, date_to, form.cleaned_data["duration"])
+        busy_cat_ids = {cat_id for cat_id, cat_gaps in gaps.items() if not cat_gaps}
+        cats_filtered = self.model.objects.exclude(pk__in=busy_cat_ids).select_related("breed")
+
+        page = self.paginate_cats(cats_filtered, form)
+        for cat in page:
+            cat.free_gaps = gaps.get(cat.pk, [(date_from, date_to)])
+            if form.cleaned_data["mode"] == "earliest":
+                cat.free_gaps = cat.free_gaps[:1]
+        context["cats_filtered"] = page
+        context["page"] = page
+        return render(self.request, self.template_name, context)
+
+
+class CatFormView(CursorSearchMixin, FormView):
     model = Cat
     template_name = "cats/cat_list.html"
     form_class = SearchForm
@@ -79,22 +179,92 @@ class CatFormView(FormView):
 
         # Filter out only cats with chosen species_id
         species = Species.objects.get(id=self.kwargs["species_id"])
-        species_cats = Cat.objects.filter(breed__species=species)
-        cats_filtered = species_cats.get_available_cats(date_from, date_to)
+        species_cats = Cat.objects.filter(breed__species=species).search(
+            form.cleaned_data["query"]
+        )
+        cats_filtered = species_cats.get_available_cats(
+            date_from, date_to, species.pk
+        ).with_rental_summary()
 
+        page = self.paginate_cats(cats_filtered, form)
         context["species"] = species
-        context["cats_filtered"] = cats_filtered
+        context["cats_filtered"] = page
+        context["page"] = page
         return render(self.request, self.template_name, context)
 
 
+def cached_cat(pk):
+    """
+    Cat with its breed and species, through the catalogue cache.
+
+    Built from the primary, also in views reading from replicas: a lagging
+    replica would cache the cat as it was before its (already invalidated) change.
+    """
+
+    return cache.cached(
+        cache.cat_key(pk),
+        lambda: get_object_or_404(
+            Cat.objects.using(DEFAULT_DB_ALIAS).select_related("breed__species"), pk=pk
+        ),
+    )
+
+
 class CatDetailView(DetailView):
     """Detail view for a Cat"""
 
     model = Cat
     template_name = "cats/details.html"
 
+    def get_object(self, queryset=None):
+        return cached_cat(self.kwargs["pk"])
+
+
+def month_or_404(year, month):
+    """
+    First day of a month from URL arguments.
+
+    Months of the first and last supported year have no previous or next
+    month to link to, so they aren't shown at all.
+    """
+
+    if not datetime.MINYEAR < year < datetime.MAXYEAR:
+        raise Http404("Invalid month")
+    try:
+        return datetime.date(year, month, 1)
+    except ValueError:
+        raise Http404("Invalid month")
+
+
+class CatCalendarView(TemplateView):
+    """
+    Month grid of a cat's busy and free days, linked from its details.
+
+    Read from precomputed availability bitmaps (see cats.calendars), in the
+    same number of queries for any month. Shows the current month by default.
+    """
+
+    template_name = "cats/calendar.html"
 
-class RentalFormView(FormView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        pk = self.kwargs["pk"]
+        first = (
+            month_or_404(self.kwargs["year"], self.kwargs["month"])
+            if "year" in self.kwargs
+            else datetime.date.today().replace(day=1)
+        )
+        _first, last = month_bounds(first.year, first.month)
+        cat = cached_cat(pk)
+        busy = busy_days(Cat.objects.filter(pk=pk), first.year, first.month)
+        context["cat"] = cat
+        context["month"] = first
+        context["weeks"] = month_grid(first.year, first.month, busy.get(pk, [False] * last.day))
+        context["previous_month"] = first - datetime.timedelta(days=1)
+        context["next_month"] = last + datetime.timedelta(days=1)
+        return context
+
+
+class RentalFormView(LoginRequiredMixin, FormView):
     """
     View to let user Rent a Cat, picking proper dates from a RentalForm.
 
@@ -103,58 +273,211 @@ class RentalFormView(FormView):
 
     Picked dates are validated below, but the clean method (dates logic check and availability check)
     is directly in Rental model (works every time, even from admin).
+    The rental itself is created by "book_cat" service, which is safe against concurrent bookings.
     """
 
     model = Rental
     template_name = "cats/rental_form.html"
     form_class = RentalForm
 
+    @cached_property
+    def cat(self):
+        return get_object_or_404(Cat, pk=self.kwargs["cat_id"])
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["instance"] = Rental(cat=self.cat, user=self.request.user)
+        return kwargs
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cat = get_object_or_404(Cat, pk=self.kwargs["cat_id"])
-        form = RentalForm(
-            initial={"cat": cat, "user": self.request.user},
-            data=self.request.POST or None,
-        )
-        context["cat"] = cat
-        context["form"] = form
+        context["cat"] = self.cat
         return context
 
     def form_valid(self, form):
-        cat = get_object_or_404(Cat, pk=self.kwargs["cat_id"])
-        form.initial = {"cat": cat, "user": self.request.user}
-        form.data = self.request.POST or None
-        form.save()
-        return redirect(reverse("cats:congrats_mail", args=[self.kwargs["cat_id"]]))
+        try:
+            book_cat(
+                self.cat.pk,
+                self.request.user,
+                form.cleaned_data["rental_date"],
+                form.cleaned_data["return_date"],
+            )
+        except ValidationError as error:
+            form.add_error(None, error)
+            return self.form_invalid(form)
+        pin_primary(self.request)
+        return redirect(reverse("cats:congrats_mail", args=[self.cat.pk]))
 
 
 class RentalListView(LoginRequiredMixin, ListView):
-    """View to show all user's rentals"""
+    """View to show all user's rentals, archived ones included"""
 
     model = Rental
     template_name = "cats/rental_list.html"
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_rentals = Rental.objects.filter(user=self.request.user).order_by(
-            "-rental_date"
+        position = None
+        if "cursor" in self.request.GET:
+            try:
+                position, _state = decode_cursor("rental_date", self.request.GET["cursor"])
+            except InvalidCursor:
+                raise Http404("Invalid cursor")
+
+        user_rentals = [
+            model.objects.filter(user=self.request.user).select_related("cat")
+            for model in (Rental, ArchivedRental)
+        ]
+        paginator = MergedKeysetPaginator(
+            user_rentals, "rental_date", settings.CATS_PAGE_SIZE, descending=True
         )
-        context["user_rentals"] = user_rentals
+        page = paginator.page(position)
+        context["user_rentals"] = page
+        context["page"] = page
+        return context
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class UtilizationReportView(TemplateView):
+    """
+    Read-only utilization report for staff, grouped by species, breed or cat.
+
+    Built from daily rollups kept by "refresh_utilization" command, so it
+    never reads rentals themselves. Up to UTILIZATION_REPORT_CATS most
+    occupied cats are listed.
+    """
+
+    template_name = "cats/utilization.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.GET:
+            form = UtilizationReportForm(data=self.request.GET)
+        else:
+            today = datetime.date.today()
+            form = UtilizationReportForm(
+                initial={
+                    "date_from": today - datetime.timedelta(days=29),
+                    "date_to": today,
+                }
+            )
+        context["form"] = form
+        if form.is_bound and form.is_valid():
+            group = form.cleaned_data["group"]
+            context["rows"] = utilization_report(
+                form.cleaned_data["date_from"],
+                form.cleaned_data["date_to"],
+                group,
+                limit=settings.UTILIZATION_REPORT_CATS if group == "cat" else None,
+            )
+            context["statuses"] = [label for _status, label in Rental.STATUS]
         return context
 
 
 @login_required
 def rental_congrats_view(request, cat_id):
-    """View to send confirmation mail to the user and show him congrats info"""
+    """
+    View to show congrats info to the user.
+
+    Confirmation mail is queued together with the rental (see "book_cat" service)
+    and sent by "send_outbox" command, so this view doesn't wait for the mail server.
+    """
     cat = get_object_or_404(Cat, pk=cat_id)
-    congrats_template = render_to_string(
-        "cats/congrats_mail_template.html", {"cat": cat}
+    return render(request, "cats/congrats.html", {"cat": cat})
+
+
+def availability_api_view(request):
+    """
+    Streams cats available between "date_from" and "date_to" GET parameters.
+
+    Optional "species" and "breed" ids and "query" search phrase narrow down
+    the results. Rows are read through a server-side cursor and written out
+    one by one as NDJSON (default) or a JSON array ("format=json"), so memory
+    use doesn't depend on the number of cats.
+    """
+    form = AvailabilityFilterForm(data=request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    cats = Cat.objects.exclude_rented(
+        form.cleaned_data["date_from"], form.cleaned_data["date_to"]
     )
-    send_mail(
-        "Congrats, cat rented!",
-        congrats_template,
-        "",
-        [request.user.email],
-        fail_silently=False,
+    if form.cleaned_data["species"] is not None:
+        cats = cats.filter(breed__species_id=form.cleaned_data["species"])
+    if form.cleaned_data["breed"] is not None:
+        cats = cats.filter(breed_id=form.cleaned_data["breed"])
+    cats = cats.search(form.cleaned_data["query"])
+    rows = (
+        cats.order_by("pk")
+        .values(
+            "id",
+            "name",
+            "breed_id",
+            "breed__name",
+            "breed__species_id",
+            "breed__species__name",
+        )
+        .iterator(chunk_size=settings.AVAILABILITY_API_CHUNK_SIZE)
+    )
+
+    def serialize(row):
+        return json.dumps(
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "breed": {"id": row["breed_id"], "name": row["breed__name"]},
+                "species": {
+                    "id": row["breed__species_id"],
+                    "name": row["breed__species__name"],
+                },
+            }
+        )
+
+    def ndjson():
+        for row in rows:
+            yield serialize(row) + "\n"
+
+    def json_array():
+        yield "["
+        separator = ""
+        for row in rows:
+            yield separator + serialize(row)
+            separator = ","
+        yield "]\n"
+
+    if form.cleaned_data["format"] == "json":
+        return StreamingHttpResponse(json_array(), content_type="application/json")
+    return StreamingHttpResponse(ndjson(), content_type="application/x-ndjson")
+
+
+def species_availability_api_view(request, species_id, year, month):
+    """
+    Heatmap of a species' cats in a month, as JSON.
+
+    Lists every cat of the species with its busy days ("1") and free days
+    ("0") as a string with a character per day, and the number of busy cats
+    on each day. Read from precomputed availability bitmaps in a fixed number
+    of queries, whatever the number of cats.
+    """
+    first = month_or_404(year, month)
+    _first, last = month_bounds(first.year, first.month)
+    species = get_object_or_404(Species, pk=species_id)
+    cats = Cat.objects.filter(breed__species=species)
+    busy = busy_days(cats, first.year, first.month)
+    free = [False] * last.day
+
+    return JsonResponse(
+        {
+            "species": {"id": species.pk, "name": species.name},
+            "month": first.strftime("%Y-%m"),
+            "busy_cats": [sum(day) for day in zip(free, *busy.values())],
+            "cats": [
+                {
+                    "id": cat_id,
+                    "name": name,
+                    "busy_days": "".join("1" if day else "0" for day in busy.get(cat_id, free)),
+                }
+                for cat_id, name in cats.order_by("pk").values_list("pk", "name")
+            ],
+        }
     )
-    return render(request, "cats/congrats.html", {"cat": cat})